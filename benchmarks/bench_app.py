@@ -0,0 +1,272 @@
+# Benchmarks for the Streamlit app (streamlit/urban-butcher.py)
+#
+# For every data scale (1 = real data, 10/100/1000 = synthetic.py) a fresh
+# worker process measures:
+#
+#   load       cold load of every frame (csv/feather + conversions), and the merge
+#   build      building the Altair chart objects, summed over all sidebar states
+#   serialize  chart.to_dict() (incl. schema validation) and json encoding
+#   reruns     the app script driven headlessly with AppTest through the whole
+#              widget state space (is_animal x is_plant x impact types x slide),
+#              with the time to the first chart (first paint) of the first run and
+#              the time of the section a fragment rerun would run
+#   memory     tracemalloc peak of one cold load + build of all charts
+#
+# Run from the repo root:
+#
+#     python benchmarks/bench_app.py                            # scales 1 10 100
+#     python benchmarks/bench_app.py --scales 1 1000 --no-app   # skip the AppTest reruns
+#     python benchmarks/bench_app.py --output now.json --baseline before.json
+
+import argparse
+import itertools
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+STREAMLIT_DIR = ROOT / 'streamlit'
+APP = STREAMLIT_DIR / 'urban-butcher.py'
+
+IMPACT_TYPES = ['Emissions', 'Land Use', 'Water Use']
+
+# tabs of the app
+IMPACT_TAB = 'Impact der Lebensmittel'
+MEAT_TAB = 'Fleischkonsum'
+
+
+# ---------------------------------------------------- #
+# worker: runs in its own process, data directory from URBAN_BUTCHER_DATA
+
+def widget_states():
+    # every combination of the sidebar checkboxes, the impact types and the slide slider
+    impact_subsets = [list(c) for n in range(len(IMPACT_TYPES) + 1)
+                      for c in itertools.combinations(IMPACT_TYPES, n)]
+    return list(itertools.product([False, True], [False, True], impact_subsets, range(1, 5)))
+
+
+def _timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def measure_load():
+    import pandas as pd
+    import data_loader
+
+    result = {}
+    for name, loader in data_loader.LOADERS.items():
+        data_loader.clear_cache()
+        _, result[name] = _timed(loader)
+
+    # the merge alone, on the already loaded frames
+    consumption, founded = data_loader.load_consumption(), data_loader.load_founded()
+    _, result['merge only'] = _timed(lambda: pd.merge(consumption, founded, left_on='Year', right_on='Year Founded'))
+    return result
+
+
+def measure_charts():
+    # per chart: summed over all of its states
+    import chart_cache
+    import charts
+
+    result = {}
+    for name, (builder, _) in charts.CHARTS.items():
+        timings = {'states': 0, 'build': 0.0, 'to_dict': 0.0, 'json': 0.0, 'bytes': 0}
+        for state in charts.states(name):
+            chart, seconds = _timed(builder, *state)
+            timings['states'] += 1
+            timings['build'] += seconds
+            if chart is None:
+                continue
+            spec, seconds = _timed(chart_cache.to_spec, chart, charts.THEMES.get(name, 'none'))
+            timings['to_dict'] += seconds
+            text, seconds = _timed(json.dumps, spec)
+            timings['json'] += seconds
+            timings['bytes'] = max(timings['bytes'], len(text.encode()))
+        result[name] = timings
+    return result
+
+
+def measure_memory():
+    import chart_cache
+    import charts
+    import data_loader
+
+    data_loader.clear_cache()
+    chart_cache.clear_cache()
+    tracemalloc.start()
+    for name in charts.CHARTS:
+        for state in charts.states(name):
+            chart_cache.get(name, *state)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def measure_reruns(timeout):
+    # the impact types are changed on the impact tab, the slide on the meat tab;
+    # AppTest does not keep the open tab between runs, so it is set before every run
+    from streamlit.testing.v1 import AppTest
+    import chart_cache
+    import data_loader
+    import metrics
+
+    data_loader.clear_cache()
+    chart_cache.clear_cache()
+
+    at = AppTest.from_file(str(APP), default_timeout=timeout)
+    _, first = _timed(at.run)
+    if at.exception:
+        raise RuntimeError(at.exception[0].message)
+    first_paint = metrics.history()[0].get('first paint')
+
+    reruns, fragments = [], []
+
+    def run(tab, section):
+        at.session_state['section'] = tab
+        _, seconds = _timed(at.run)
+        if at.exception:
+            raise RuntimeError(at.exception[0].message)
+        reruns.append(seconds)
+        # what a rerun of the fragment alone costs
+        fragments.append(metrics.history()[0]['sections'][section]['seconds'])
+
+    for is_animal, is_plant, impact_types, slide in widget_states():
+        at.sidebar.checkbox[0].set_value(is_animal)
+        at.sidebar.checkbox[1].set_value(is_plant)
+        at.session_state['impact_types'] = impact_types
+        run(IMPACT_TAB, 'Environmental Impact per weight')
+        at.session_state['slide'] = slide
+        run(MEAT_TAB, 'Meat Consumption')
+
+    reruns.sort()
+    return {'first run': first, 'first paint': first_paint, 'reruns': len(reruns),
+            'p50': statistics.median(reruns), 'p95': reruns[int(0.95 * (len(reruns) - 1))], 'max': reruns[-1],
+            'fragment p50': statistics.median(fragments)}
+
+
+def worker(result_file, app, timeout):
+    # the app resolves images/ relative to the working directory
+    os.chdir(STREAMLIT_DIR)
+    sys.path.insert(0, str(STREAMLIT_DIR))
+
+    result = {'load': measure_load(), 'charts': measure_charts(), 'memory peak': measure_memory()}
+    if app:
+        result['app'] = measure_reruns(timeout)
+    with open(result_file, 'w') as f:
+        json.dump(result, f)
+
+
+# ---------------------------------------------------- #
+# driver
+
+def run_scale(scale, app, timeout):
+    import synthetic
+
+    with tempfile.TemporaryDirectory() as data_dir, tempfile.TemporaryDirectory() as out_dir:
+        rows = synthetic.write(data_dir, scale)
+        result_file = Path(out_dir) / 'result.json'
+        command = [sys.executable, __file__, '--worker', str(result_file), '--timeout', str(timeout)]
+        if not app:
+            command.append('--no-app')
+
+        env = dict(os.environ, URBAN_BUTCHER_DATA=data_dir)
+        try:
+            subprocess.run(command, env=env, check=True, timeout=timeout * 10,
+                           stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+        except subprocess.TimeoutExpired:
+            return {'rows': rows, 'error': f'timeout after {timeout * 10}s'}
+        except subprocess.CalledProcessError as e:
+            return {'rows': rows, 'error': e.stderr.strip().splitlines()[-1]}
+
+        with open(result_file) as f:
+            return dict(json.load(f), rows=rows)
+
+
+def _ms(seconds):
+    return f'{seconds * 1000:9.1f}'
+
+
+def print_result(scale, result):
+    print(f'\n=== scale {scale}x  (rows: {sum(result["rows"].values())})')
+    if 'error' in result:
+        print(f'  failed: {result["error"]}')
+        return
+
+    print('  load (ms)    ' + '  '.join(f'{name}={seconds * 1000:.1f}' for name, seconds in result['load'].items()))
+    print(f'  {"chart":<8} {"states":>6} {"build ms":>9} {"to_dict ms":>10} {"json ms":>9} {"max bytes":>10}')
+    for name, t in result['charts'].items():
+        print(f'  {name:<8} {t["states"]:>6} {_ms(t["build"])} {_ms(t["to_dict"]):>10} {_ms(t["json"])} {t["bytes"]:>10}')
+    print(f'  memory peak  {result["memory peak"] / 2**20:.1f} MiB')
+    if 'app' in result:
+        app = result['app']
+        print(f'  app          first run {app["first run"]:.2f}s (first paint {app["first paint"] * 1000:.0f} ms),'
+              f' {app["reruns"]} reruns: p50 {app["p50"] * 1000:.1f} ms, p95 {app["p95"] * 1000:.1f} ms,'
+              f' max {app["max"] * 1000:.1f} ms, fragment p50 {app["fragment p50"] * 1000:.1f} ms')
+
+
+def _totals(result):
+    # the numbers compared against a baseline
+    if 'error' in result:
+        return {}
+    totals = {'load': sum(result['load'].values()),
+              'build + serialize': sum(t['build'] + t['to_dict'] + t['json'] for t in result['charts'].values())}
+    if 'app' in result:
+        totals['rerun p50'] = result['app']['p50']
+    return totals
+
+
+def compare(results, baseline, tolerance):
+    # returns the regressions: slower than the baseline by more than `tolerance`
+    regressions = []
+    for scale, result in results.items():
+        before = _totals(baseline.get(scale, {}))
+        for name, seconds in _totals(result).items():
+            if name in before and seconds > before[name] * (1 + tolerance):
+                regressions.append(f'scale {scale}x {name}: {before[name] * 1000:.1f} ms -> {seconds * 1000:.1f} ms')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark data loading, chart building and reruns of the app.')
+    parser.add_argument('--scales', type=int, nargs='+', default=[1, 10, 100], help='data scales (default: 1 10 100)')
+    parser.add_argument('--no-app', dest='app', action='store_false', help='skip the AppTest reruns')
+    parser.add_argument('--timeout', type=int, default=120, help='seconds per app run (default: 120)')
+    parser.add_argument('--output', help='write the results to this json file')
+    parser.add_argument('--baseline', help='json file of an earlier run, report regressions')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed slowdown vs. baseline (default: 0.2)')
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        worker(args.worker, args.app, args.timeout)
+        return
+
+    results = {}
+    for scale in args.scales:
+        results[str(scale)] = run_scale(scale, args.app, args.timeout)
+        print_result(scale, results[str(scale)])
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        print('\nregressions:' if regressions else '\nno regressions')
+        for line in regressions:
+            print('  ' + line)
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,382 @@
+# Load test of the app (streamlit/urban-butcher.py) with many sessions at once
+#
+# Starts `streamlit run` on a local port and opens N sessions at the same time,
+# each over its own websocket like a browser: the same BackMsg (rerun with the
+# widget states) and ForwardMsg (deltas, script_finished) protobufs. Every
+# session goes through the app like a viewer would, with a think time between
+# the steps:
+#
+#   open       first run of the script (new session)
+#   animal     'Tierische Produkte' on/off (sidebar, full rerun)
+#   plant      'Pflanzliche Produkte' on/off (sidebar, full rerun)
+#   impact     another selection in the impact multiselect (fragment rerun)
+#   tab        the 'Fleischkonsum' tab and back (full rerun)
+#   slide      the slide slider 1 -> 4 (fragment reruns)
+#
+# The latency of a step is the time from sending the rerun to its
+# script_finished. Per number of sessions (--sessions, a ramp) the result has
+# throughput (reruns per second), p50/p95/p99/max of the latency, the CPU of the
+# server process (cores, from /proc) and its highest RSS. The load generator
+# runs in this process; on a machine with few cores it takes CPU from the
+# server, so compare results of the same machine only.
+#
+# Run from the repo root (needs the websockets package, Linux for CPU/RSS):
+#
+#     python benchmarks/load_test.py                                # 1 10 50 sessions
+#     python benchmarks/load_test.py --sessions 1 50 200 --rounds 3 --output now.json
+#     python benchmarks/load_test.py --baseline before.json         # exit code 1 on a regression
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+STREAMLIT_DIR = ROOT / 'streamlit'
+APP = STREAMLIT_DIR / 'urban-butcher.py'
+
+IMPACT_TYPES = ['Emissions', 'Land Use', 'Water Use']
+
+# tabs of the app
+IMPACT_TAB = 'Impact der Lebensmittel'
+MEAT_TAB = 'Fleischkonsum'
+
+STARTUP_TIMEOUT = 60
+CLOCK_TICKS = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+
+
+# ---------------------------------------------------- #
+# server
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(port, data_dir=None):
+    # `streamlit run` in streamlit/ (the app reads images/ relative to it), ready when /_stcore/health answers
+    env = dict(os.environ)
+    if data_dir:
+        env['URBAN_BUTCHER_DATA'] = str(data_dir)
+    command = [sys.executable, '-m', 'streamlit', 'run', APP.name, '--server.headless', 'true',
+               '--server.port', str(port), '--server.address', '127.0.0.1',
+               '--browser.gatherUsageStats', 'false', '--server.fileWatcherType', 'none']
+    server = subprocess.Popen(command, cwd=STREAMLIT_DIR, env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError('streamlit exited: ' + server.stderr.read().strip()[-500:])
+        try:
+            with urllib.request.urlopen(f'http://127.0.0.1:{port}/_stcore/health', timeout=1) as response:
+                if response.status == 200:
+                    return server
+        except OSError:
+            time.sleep(0.2)
+    server.kill()
+    raise RuntimeError(f'streamlit did not answer within {STARTUP_TIMEOUT}s')
+
+
+def cpu_seconds(pid):
+    # user + system time of the process (Linux), None elsewhere
+    try:
+        fields = Path(f'/proc/{pid}/stat').read_text().rsplit(')', 1)[1].split()
+    except OSError:
+        return None
+    return (int(fields[11]) + int(fields[12])) / CLOCK_TICKS
+
+
+def rss_bytes(pid):
+    try:
+        for line in Path(f'/proc/{pid}/status').read_text().splitlines():
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+# ---------------------------------------------------- #
+# one session, like a browser tab
+
+def _key(widget_id):
+    # '$$ID-<hash>-<key>' -> key ('None' for a widget without a key)
+    return widget_id.split('-', 2)[-1]
+
+
+class Session:
+
+    def __init__(self, url, origin):
+        self.url, self.origin = url, origin
+        self.websocket = None
+        self.widgets = {}       # widget id -> WidgetState of the values set by this session
+        self.ids = {}           # label or key -> widget id
+        self.fragments = {}     # widget id -> id of the fragment it is in ('' = none)
+        self.latencies = []     # (step, seconds)
+
+    async def connect(self):
+        import websockets
+        self.websocket = await websockets.connect(self.url, subprotocols=['streamlit'], origin=self.origin,
+                                                  max_size=None)
+
+    async def close(self):
+        if self.websocket is not None:
+            await self.websocket.close()
+
+    def _widget(self, delta):
+        # remember the id (by label and by key) and the fragment of every widget
+        element = delta.new_element
+        kind = element.WhichOneof('type')
+        if kind in ('checkbox', 'multiselect', 'slider'):
+            widget = getattr(element, kind)
+            self.ids[widget.label] = widget.id
+            self.ids[_key(widget.id)] = widget.id
+            self.fragments[widget.id] = delta.fragment_id
+
+    def _block(self, delta):
+        block = delta.add_block
+        if block.WhichOneof('type') == 'tab_container':
+            widget_id = block.tab_container.id
+            self.ids[_key(widget_id)] = widget_id
+            self.fragments[widget_id] = delta.fragment_id
+
+    async def rerun(self, step, fragment_id=''):
+        # sends a rerun with all widget values, waits for script_finished
+        from streamlit.proto.BackMsg_pb2 import BackMsg
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+        message = BackMsg()
+        message.rerun_script.query_string = ''
+        message.rerun_script.page_script_hash = ''
+        message.rerun_script.fragment_id = fragment_id
+        message.rerun_script.widget_states.widgets.extend(self.widgets.values())
+
+        start = time.perf_counter()
+        await self.websocket.send(message.SerializeToString())
+        while True:
+            forward = ForwardMsg()
+            forward.ParseFromString(await self.websocket.recv())
+            kind = forward.WhichOneof('type')
+            if kind == 'delta':
+                delta_kind = forward.delta.WhichOneof('type')
+                if delta_kind == 'new_element':
+                    self._widget(forward.delta)
+                elif delta_kind == 'add_block':
+                    self._block(forward.delta)
+            elif kind == 'script_finished':
+                if forward.script_finished == ForwardMsg.FINISHED_WITH_COMPILE_ERROR:
+                    raise RuntimeError('the script did not compile')
+                break
+        self.latencies.append((step, time.perf_counter() - start))
+
+    async def set(self, step, name, **value):
+        # sets one widget (by label or key), reruns its fragment or the whole script
+        from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+        widget_id = self.ids[name]
+        state = WidgetState(id=widget_id)
+        for field, content in value.items():
+            if field.endswith('_array_value'):
+                getattr(state, field).data.extend(content)
+            else:
+                setattr(state, field, content)
+        self.widgets[widget_id] = state
+        await self.rerun(step, self.fragments.get(widget_id, ''))
+
+
+async def viewer(session, rounds, think, rng):
+    # the steps of one viewer; think: mean seconds between two steps
+    async def pause():
+        await asyncio.sleep(rng.expovariate(1 / think) if think > 0 else 0)
+
+    await session.connect()
+    await session.rerun('open')
+    for _ in range(rounds):
+        for label in ['Tierische Produkte', 'Pflanzliche Produkte']:
+            for checked in [True, False]:
+                await pause()
+                await session.set('animal' if label.startswith('Tierische') else 'plant', label, bool_value=checked)
+        for _ in range(3):
+            await pause()
+            selected = [t for t in IMPACT_TYPES if rng.random() < 0.5]
+            await session.set('impact', 'impact_types', string_array_value=selected)
+        await pause()
+        await session.set('tab', 'section', string_value=MEAT_TAB)
+        for slide in range(1, 5):
+            await pause()
+            await session.set('slide', 'slide', double_array_value=[slide])
+        await pause()
+        await session.set('tab', 'section', string_value=IMPACT_TAB)
+
+
+# ---------------------------------------------------- #
+# one level of the ramp
+
+def _percentile(values, q):
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def summarize(latencies):
+    values = sorted(seconds for _, seconds in latencies)
+    if not values:
+        return {}
+    return {'p50': statistics.median(values), 'p95': _percentile(values, 0.95), 'p99': _percentile(values, 0.99),
+            'max': values[-1]}
+
+
+async def _sample(pid, samples, interval=0.2):
+    while True:
+        samples.append(rss_bytes(pid) or 0)
+        await asyncio.sleep(interval)
+
+
+async def run_level(port, pid, sessions, rounds, think, seed):
+    url, origin = f'ws://127.0.0.1:{port}/_stcore/stream', f'http://127.0.0.1:{port}'
+    clients = [Session(url, origin) for _ in range(sessions)]
+    rss = []
+    sampler = asyncio.create_task(_sample(pid, rss))
+    cpu_before, start = cpu_seconds(pid), time.perf_counter()
+    try:
+        outcomes = await asyncio.gather(*[viewer(client, rounds, think, random.Random(seed + i))
+                                          for i, client in enumerate(clients)], return_exceptions=True)
+    finally:
+        seconds = time.perf_counter() - start
+        cpu_after = cpu_seconds(pid)
+        sampler.cancel()
+        await asyncio.gather(*[client.close() for client in clients], return_exceptions=True)
+
+    errors = [f'{type(e).__name__}: {e}' for e in outcomes if isinstance(e, BaseException)]
+    latencies = [latency for client in clients for latency in client.latencies]
+    steps = sorted({step for step, _ in latencies})
+    result = {'sessions': sessions, 'reruns': len(latencies), 'errors': len(errors), 'seconds': seconds,
+              'throughput': len(latencies) / seconds,
+              **summarize([latency for latency in latencies if latency[0] != 'open']),
+              'open': summarize([latency for latency in latencies if latency[0] == 'open']),
+              'steps': {step: summarize([latency for latency in latencies if latency[0] == step]) for step in steps},
+              'rss': max(rss, default=0)}
+    if cpu_before is not None and cpu_after is not None:
+        result['cpu'] = (cpu_after - cpu_before) / seconds
+    if errors:
+        result['first error'] = errors[0]
+    return result
+
+
+def run(levels, rounds, think, scale=1, seed=0):
+    # {'meta': ..., 'levels': {sessions: result}}; one server for the whole ramp
+    import streamlit
+    import synthetic
+
+    meta = {'scale': scale, 'rounds': rounds, 'think': think, 'cpus': os.cpu_count(),
+            'python': platform.python_version(), 'streamlit': streamlit.__version__}
+    try:
+        meta['commit'] = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                                        text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        pass
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        if scale != 1:
+            synthetic.write(data_dir, scale)
+        port = _free_port()
+        server = start_server(port, data_dir if scale != 1 else None)
+        try:
+            # one session first, so the ramp does not measure the imports of the first run
+            asyncio.run(run_level(port, server.pid, 1, 0, 0, seed))
+            meta['rss idle'] = rss_bytes(server.pid)
+            results = {}
+            for sessions in levels:
+                results[str(sessions)] = asyncio.run(run_level(port, server.pid, sessions, rounds, think, seed))
+                print_level(results[str(sessions)])
+        finally:
+            server.terminate()
+            server.wait(10)
+    return {'meta': meta, 'levels': results}
+
+
+# ---------------------------------------------------- #
+# output
+
+def _ms(seconds):
+    return f'{seconds * 1000:8.0f}' if seconds is not None else f'{"-":>8}'
+
+
+def print_header():
+    print(f'{"sessions":>8} {"reruns":>7} {"errors":>6} {"rerun/s":>8} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8}'
+          f' {"max ms":>8} {"open p95":>8} {"cpu":>5} {"rss MiB":>8}')
+
+
+def print_level(result):
+    cpu = f'{result["cpu"]:5.2f}' if 'cpu' in result else f'{"-":>5}'
+    print(f'{result["sessions"]:>8} {result["reruns"]:>7} {result["errors"]:>6} {result["throughput"]:8.1f}'
+          f' {_ms(result.get("p50"))} {_ms(result.get("p95"))} {_ms(result.get("p99"))} {_ms(result.get("max"))}'
+          f' {_ms(result["open"].get("p95"))} {cpu} {result["rss"] / 2**20:8.1f}')
+    if 'first error' in result:
+        print(f'         first error: {result["first error"]}')
+
+
+def compare(result, baseline, tolerance):
+    # returns the regressions per number of sessions: latency, RSS or errors up, throughput down
+    regressions = []
+    for sessions, now in result['levels'].items():
+        before = baseline.get('levels', {}).get(sessions)
+        if before is None:
+            continue
+        for name in ['p50', 'p95', 'p99']:
+            if name in before and name in now and now[name] > before[name] * (1 + tolerance):
+                regressions.append(f'{sessions} sessions {name}: {before[name] * 1000:.0f} ms -> {now[name] * 1000:.0f} ms')
+        if now['throughput'] < before['throughput'] * (1 - tolerance):
+            regressions.append(f'{sessions} sessions throughput: {before["throughput"]:.1f} -> {now["throughput"]:.1f} reruns/s')
+        if now['rss'] > before['rss'] * (1 + tolerance):
+            regressions.append(f'{sessions} sessions rss: {before["rss"] / 2**20:.0f} -> {now["rss"] / 2**20:.0f} MiB')
+        if now['errors'] > before['errors']:
+            regressions.append(f'{sessions} sessions errors: {before["errors"]} -> {now["errors"]}')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test of the app with many websocket sessions at once.')
+    parser.add_argument('--sessions', type=int, nargs='+', default=[1, 10, 50],
+                        help='concurrent sessions per level (default: 1 10 50)')
+    parser.add_argument('--rounds', type=int, default=2, help='rounds of the steps per session (default: 2)')
+    parser.add_argument('--think', type=float, default=0.5, help='mean seconds between two steps (default: 0.5)')
+    parser.add_argument('--scale', type=int, default=1, help='data scale, see synthetic.py (default: 1)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write the results to this json file')
+    parser.add_argument('--baseline', help='json file of an earlier run, report regressions')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed change vs. baseline (default: 0.2)')
+    args = parser.parse_args()
+
+    try:
+        import websockets  # noqa: F401
+    except ImportError:
+        sys.exit('the load test needs the websockets package (pip install websockets)')
+
+    print_header()
+    result = run(args.sessions, args.rounds, args.think, args.scale, args.seed)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(result, json.load(f), args.tolerance)
+        print('\nregressions:' if regressions else '\nno regressions')
+        for line in regressions:
+            print('  ' + line)
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,147 @@
+# Startup profile of the app (streamlit/urban-butcher.py)
+#
+# What a fresh process (e.g. a new replica) pays before the first chart:
+#
+#   imports    python -X importtime of the modules the app imports, on top of
+#              streamlit itself (the server has imported it before the script
+#              runs), per module of the app and per package it pulls in
+#   first run  a fresh process runs the app once (AppTest): time from the top of
+#              the script to the first chart (metrics 'first paint') and which of
+#              the heavy packages were imported by then
+#
+# Run from the repo root:
+#
+#     python benchmarks/startup_profile.py
+#     python benchmarks/startup_profile.py --output now.json --baseline before.json
+
+import argparse
+import ast
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+STREAMLIT_DIR = ROOT / 'streamlit'
+APP = STREAMLIT_DIR / 'urban-butcher.py'
+
+# packages a chart needs at the latest; the fewer of them before the first chart, the better
+HEAVY = ['numpy', 'pandas', 'pyarrow', 'altair', 'jsonschema']
+
+FIRST_RUN = f'''
+import json, sys
+from streamlit.testing.v1 import AppTest
+import metrics
+at = AppTest.from_file({str(APP)!r}, default_timeout=120)
+at.run()
+if at.exception:
+    raise SystemExit(at.exception[0].message)
+rerun = metrics.history()[0]
+print(json.dumps({{'first paint': rerun.get('first paint'), 'seconds': rerun['seconds'],
+                  'imported': [name for name in {HEAVY!r} if name in sys.modules]}}))
+'''
+
+
+def app_imports():
+    # the modules urban-butcher.py imports (also the ones in the middle of the script)
+    tree = ast.parse(APP.read_text())
+    names = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names += [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.module:
+            names.append(node.module)
+    return [name for name in dict.fromkeys(names) if name.split('.')[0] != 'streamlit']
+
+
+def _python(*args):
+    # in streamlit/, like `streamlit run`
+    result = subprocess.run([sys.executable, *args], cwd=STREAMLIT_DIR, capture_output=True, text=True,
+                            env=dict(os.environ, PYTHONPATH=str(STREAMLIT_DIR)))
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    return result
+
+
+def measure_imports():
+    # the imports after `import streamlit`: seconds per module of the app (incl.
+    # everything it imports) and per package it pulls in (numpy, pandas, ...)
+    code = 'import streamlit; import ' + ', '.join(app_imports())
+    stderr = _python('-X', 'importtime', '-c', code).stderr.splitlines()
+
+    modules, packages, after_streamlit = {}, {}, False
+    for line in stderr:
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        name, seconds = name.strip(), int(cumulative) / 1e6
+        if not after_streamlit:
+            # everything up to the streamlit line is imported by streamlit itself
+            after_streamlit = name == 'streamlit' and depth == 0
+            continue
+        if depth == 0:
+            modules[name] = seconds
+        if '.' not in name and not (STREAMLIT_DIR / (name + '.py')).exists():
+            packages[name] = seconds
+    return {'modules': modules, 'packages': packages, 'total': sum(modules.values())}
+
+
+def measure_first_run():
+    return json.loads(_python('-c', FIRST_RUN).stdout.strip().splitlines()[-1])
+
+
+def print_result(result, top):
+    imports = result['imports']
+    print(f'imports of the app: {imports["total"] * 1000:.0f} ms')
+    for module, seconds in imports['modules'].items():
+        print(f'  {module:<24} {seconds * 1000:8.1f} ms')
+    print('packages:')
+    for package, seconds in sorted(imports['packages'].items(), key=lambda item: -item[1])[:top]:
+        print(f'  {package:<24} {seconds * 1000:8.1f} ms')
+    first = result['first run']
+    print(f'first run: first chart after {first["first paint"] * 1000:.0f} ms, script {first["seconds"] * 1000:.0f} ms')
+    print(f'  imported by then: {", ".join(first["imported"]) or "-"}')
+
+
+def compare(result, baseline, tolerance):
+    # returns the regressions: slower than the baseline by more than `tolerance`
+    numbers = {'imports': lambda r: r['imports']['total'], 'first paint': lambda r: r['first run']['first paint']}
+    regressions = []
+    for name, number in numbers.items():
+        before, now = number(baseline), number(result)
+        if now > before * (1 + tolerance):
+            regressions.append(f'{name}: {before * 1000:.0f} ms -> {now * 1000:.0f} ms')
+    new = set(result['first run']['imported']) - set(baseline['first run']['imported'])
+    if new:
+        regressions.append('imported before the first chart: ' + ', '.join(sorted(new)))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Import times and time to the first chart of a fresh app process.')
+    parser.add_argument('--top', type=int, default=15, help='number of packages shown (default: 15)')
+    parser.add_argument('--output', help='write the result to this json file')
+    parser.add_argument('--baseline', help='json file of an earlier run, report regressions')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed slowdown vs. baseline (default: 0.2)')
+    args = parser.parse_args()
+
+    result = {'imports': measure_imports(), 'first run': measure_first_run()}
+    print_result(result, args.top)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(result, json.load(f), args.tolerance)
+        print('\nregressions:' if regressions else '\nno regressions')
+        for line in regressions:
+            print('  ' + line)
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,186 @@
+# Synthetic versions of code/cleaned-data, scaled up to see where the app breaks down
+#
+# scale=10 means 10x the products (impact and nu tables), 10x the points in
+# time (meat consumption + founded companies) and 10x the countries. The copies
+# are the real rows with a suffix in the name and some noise on the values, so
+# the charts keep their shape. The files are written like the pipeline writes
+# them (csv + typed feather copy), the app reads them via URBAN_BUTCHER_DATA.
+# The company table (explorer page) gets scale x the companies.
+
+import shutil
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parent.parent
+CLEANED_DATA = ROOT / 'code' / 'cleaned-data'
+
+sys.path.insert(0, str(ROOT / 'code'))
+from pipeline.runner import write_output
+from pipeline.stages import STAGES
+
+# files read by the app (see streamlit/data_loader.py)
+APP_FILES = ['environmental-impact-food.csv', 'environmental-impact-streamlit.csv', 'environmental-impact-weight.csv',
+             'environmental-impact-nu.csv', 'environmental-impact-catalogue.csv', 'environmental-impact-distribution.csv',
+             'versorgungsbilanz-fleisch.csv', 'alt-protein-founded.csv', 'alt-protein-country.csv', 'alt-protein-overall.csv']
+
+
+def _copies(df, column, scale, rng, value_columns):
+    # copy 0 is the original, copy k gets ' #k' in `column` and noise on the values
+    frames = [df]
+    for k in range(1, scale):
+        copy = df.copy()
+        copy[column] = copy[column].astype(str) + f' #{k}'
+        noise = rng.lognormal(0, 0.2, size=(len(copy), len(value_columns)))
+        copy[value_columns] = (copy[value_columns].to_numpy() * noise).round(2)
+        frames.append(copy)
+    return pd.concat(frames, ignore_index=True)
+
+
+def _impact(scale, rng, file):
+    df = pd.read_csv(CLEANED_DATA / file)
+    return _copies(df, 'Product', scale, rng, ['Impact'])
+
+
+def _nu(scale, rng):
+    df = pd.read_csv(CLEANED_DATA / 'environmental-impact-nu.csv')
+    df = _copies(df, 'Product', scale, rng, ['5th pctl', '10th pctl', 'Mean', 'Median', '90th pctl', '95th pctl'])
+    df.loc[df['Product'].str.contains(' #'), 'Compare'] = 'No'
+    return df
+
+
+def _dates(scale):
+    # the real (yearly) dates plus about scale-1 points in time between two years
+    years = pd.to_datetime(pd.read_csv(CLEANED_DATA / 'versorgungsbilanz-fleisch.csv')['Year'])
+    extra = pd.date_range(years.min(), years.max() + pd.DateOffset(years=1), periods=len(years) * scale + 1)[:-1]
+    return pd.DatetimeIndex(sorted(set(years) | set(extra)))
+
+
+def _interpolated(df, time_column, dates, value_columns, rng):
+    # values of the real years, linear in between, with some noise
+    df = df.set_index(time_column)[value_columns].sort_index()
+    df = df.reindex(df.index.union(dates)).interpolate(method='time').ffill().loc[dates]
+    df = df * rng.normal(1, 0.01, size=df.shape)
+    return df.rename_axis(time_column).reset_index()
+
+
+def _consumption(dates, rng):
+    df = pd.read_csv(CLEANED_DATA / 'versorgungsbilanz-fleisch.csv', parse_dates=['Year'])
+    df = _interpolated(df, 'Year', dates, ['Consumption per Person'], rng).sort_values('Year', ascending=False)
+    df['Consumption per Person'] = df['Consumption per Person'].round(2)
+    df['MaxConsumption'] = df['Consumption per Person'].max()
+    df['MinConsumption'] = df['Consumption per Person'].min()
+    return df
+
+
+def _founded(dates, rng):
+    df = pd.read_csv(CLEANED_DATA / 'alt-protein-founded.csv', parse_dates=['Year Founded'])
+    df = _interpolated(df, 'Year Founded', dates, ['Number of Companies Founded'], rng)
+    df['Number of Companies Founded'] = df['Number of Companies Founded'].round().astype(int)
+    df['Year_int'] = df['Year Founded'].dt.year
+    return df
+
+
+def _country(scale, rng):
+    df = pd.read_csv(CLEANED_DATA / 'alt-protein-country.csv')
+    df = _copies(df, 'name', scale, rng, ['Number of Companies per Country'])
+    df['Number of Companies per Country'] = df['Number of Companies per Country'].round().astype(int)
+    return df
+
+
+def overall(scale, rng):
+    # copies of every company with ' #k' in the name and the years founded shuffled
+    df = pd.read_csv(CLEANED_DATA / 'alt-protein-overall.csv')
+    frames = [df]
+    for k in range(1, scale):
+        copy = df.copy()
+        copy['Company'] = copy['Company'] + f' #{k}'
+        copy['Year Founded'] = rng.permutation(copy['Year Founded'].to_numpy())
+        frames.append(copy)
+    return pd.concat(frames, ignore_index=True)
+
+
+def _distribution(scale, rng):
+    df = pd.read_csv(CLEANED_DATA / 'environmental-impact-distribution.csv')
+    return _copies(df, 'Product', scale, rng, ['5th pctl', '10th pctl', 'Mean', 'Median', '90th pctl', '95th pctl'])
+
+
+def catalogue(scale, rng):
+    # scale x the products of the full catalogue (streamlit/catalogue.py)
+    return _impact(scale, rng, 'environmental-impact-catalogue.csv')
+
+
+def topology(columns, rows, points, rng):
+    # a world-110m like TopoJSON (streamlit/geometry.py): a grid of columns x rows
+    # countries with ids 1, 2, ..., borders of `points` points each, shared by
+    # the neighbours; quantized and delta-encoded like topojson writes it
+    quantization = 100000
+    lon = np.linspace(-180, 180, columns + 1)
+    lat = np.linspace(80, -60, rows + 1)
+
+    def border(start, end):
+        # a wiggly line from start to end, in quantized coordinates
+        t = np.linspace(0, 1, points)[:, None]
+        line = start + (end - start) * t
+        normal = np.array([start[1] - end[1], end[0] - start[0]])
+        wiggle = rng.normal(0, 0.01, size=(points, 1)).cumsum(axis=0)
+        wiggle -= t * wiggle[-1]
+        line = line + wiggle * normal
+        quantized = np.round((line + [180, 90]) / [360, 180] * (quantization - 1)).astype(int)
+        return np.vstack([quantized[:1], np.diff(quantized, axis=0)]).tolist()
+
+    arcs, horizontal, vertical = [], {}, {}
+    for i in range(rows + 1):
+        for j in range(columns):
+            horizontal[i, j] = len(arcs)
+            arcs.append(border(np.array([lon[j], lat[i]]), np.array([lon[j + 1], lat[i]])))
+    for i in range(rows):
+        for j in range(columns + 1):
+            vertical[i, j] = len(arcs)
+            arcs.append(border(np.array([lon[j], lat[i]]), np.array([lon[j], lat[i + 1]])))
+
+    # clockwise in lon/lat: top, right, bottom and left border; ~k is arc k reversed
+    geometries = [{'type': 'Polygon', 'id': i * columns + j + 1,
+                   'arcs': [[horizontal[i, j], vertical[i, j + 1], ~horizontal[i + 1, j], ~vertical[i, j]]]}
+                  for i in range(rows) for j in range(columns)]
+    return {'type': 'Topology',
+            'transform': {'scale': [360 / (quantization - 1), 180 / (quantization - 1)], 'translate': [-180, -90]},
+            'objects': {'countries': {'type': 'GeometryCollection', 'geometries': geometries}},
+            'arcs': arcs}
+
+
+def write(target, scale, seed=0):
+    # writes every file the app reads into `target`, returns {file: rows}
+    target = Path(target)
+    target.mkdir(parents=True, exist_ok=True)
+    if scale == 1:
+        # 1x is the real data
+        for file in APP_FILES:
+            for path in [CLEANED_DATA / file, (CLEANED_DATA / file).with_suffix('.feather')]:
+                if path.exists():
+                    shutil.copy(path, target)
+        return {file: len(pd.read_csv(CLEANED_DATA / file)) for file in APP_FILES}
+
+    rng = np.random.default_rng(seed)
+    dates = _dates(scale)
+
+    frames = {
+        'environmental-impact-streamlit.csv': _impact(scale, rng, 'environmental-impact-streamlit.csv'),
+        'environmental-impact-weight.csv': _impact(scale, rng, 'environmental-impact-weight.csv'),
+        'environmental-impact-nu.csv': _nu(scale, rng),
+        'environmental-impact-catalogue.csv': catalogue(scale, rng),
+        'environmental-impact-distribution.csv': _distribution(scale, rng),
+        'versorgungsbilanz-fleisch.csv': _consumption(dates, rng),
+        'alt-protein-founded.csv': _founded(dates, rng),
+        'alt-protein-country.csv': _country(scale, rng),
+        'alt-protein-overall.csv': overall(scale, rng),
+    }
+    for file, frame in frames.items():
+        write_output(frame, target / file, STAGES[file].categories)
+
+    # the pie chart data is not scaled
+    shutil.copy(CLEANED_DATA / 'environmental-impact-food.csv', target)
+    shutil.copy(CLEANED_DATA / 'environmental-impact-food.feather', target)
+    return {file: len(frame) for file, frame in frames.items()}
@@ -0,0 +1,12 @@
+# ETL pipeline for the files in code/cleaned-data
+#
+# Replaces hand-running the three notebooks. Every file in cleaned-data is
+# produced by exactly one stage (see stages.py); the runner (runner.py) only
+# rebuilds a stage if the content of one of its inputs or its own code changed,
+# and runs independent stages in parallel.
+#
+# Run from the code/ directory:
+#
+#     python -m pipeline                  # rebuild what changed
+#     python -m pipeline --force          # rebuild everything
+#     python -m pipeline versorgungsbilanz-fleisch.csv   # only this output (+ what it needs)
@@ -0,0 +1,17 @@
+# python -m pipeline [output ...] [--force] [--jobs N] [--dry-run]
+
+import argparse
+
+from pipeline.runner import run
+from pipeline.stages import STAGES
+
+
+parser = argparse.ArgumentParser(prog='python -m pipeline', description='Build the files in cleaned-data.')
+parser.add_argument('outputs', nargs='*', metavar='output',
+                    help='only build these outputs (and what they need), one of: ' + ', '.join(STAGES))
+parser.add_argument('--force', action='store_true', help='rebuild even if nothing changed')
+parser.add_argument('--jobs', type=int, default=None, help='number of worker processes (default: all cores, 1 = no workers)')
+parser.add_argument('--dry-run', action='store_true', help='only show which outputs are outdated')
+args = parser.parse_args()
+
+run(args.outputs, force=args.force, jobs=args.jobs, dry_run=args.dry_run)
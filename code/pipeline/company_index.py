@@ -0,0 +1,130 @@
+# Bitmap index over the GFI alternative-protein company table
+#
+# Many columns of alt-protein.csv hold several comma-joined values
+# ("Cultivated,Plant-based", "Meat,Seafood", "Oat,Soy"). A filter like
+# df['Protein Category'] == 'Plant-based' only finds the companies with exactly
+# this one value. The index splits these columns once and keeps one bitmap per
+# value (one bit per company, packed into bytes), so a query is a few bitwise
+# ANDs/ORs instead of a scan over the frame:
+#
+#     index = company_index.build(df)
+#     mask = company_index.select(index, where={'Protein Category': 'Plant-based',
+#                                               'Operating Regions': ['Europe', 'Global']},
+#                                 years=(2010, 2021))
+#     company_index.count_by(index, 'Country/Region', mask)
+#
+# where: the company has the value (or one of the values) in the column
+# exact: the whole cell equals the value, like == in the notebook
+
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+MULTI_VALUED = ['Protein Category', 'Company Focus', 'Technology Focus', 'Product Type', 'Ingredient Type',
+                'Animal-Type Analog', 'Operating Regions']
+SINGLE_VALUED = ['Company type', 'Country/Region']
+YEAR = 'Year Founded'
+
+# size: number of companies
+# bitmaps: column -> {value: packed bitmap}, for the single values of every column
+# cells: column -> {whole cell: packed bitmap}, for exact filters
+# codes: column -> (labels, code per company, -1 = empty), for count_by
+# years: year founded per company (0 = unknown)
+CompanyIndex = namedtuple('CompanyIndex', ['size', 'bitmaps', 'cells', 'codes', 'years'])
+
+# number of set bits of every byte value
+_POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+def _bitmaps(codes, n_labels, size):
+    # one packed bitmap per label, from (company, label) pairs
+    companies, labels = codes
+    bits = np.zeros((n_labels, (size + 7) // 8), dtype=np.uint8)
+    # same bit order as np.packbits: the first company is the highest bit
+    np.bitwise_or.at(bits, (labels, companies >> 3), (128 >> (companies & 7)).astype(np.uint8))
+    return bits
+
+
+def build(df):
+    size = len(df)
+    bitmaps, cells, codes = {}, {}, {}
+
+    for column in MULTI_VALUED + SINGLE_VALUED:
+        if column not in df:
+            continue
+        values = df[column].astype('string').reset_index(drop=True)
+
+        # whole cells (sorted like astype('category'))
+        cell_codes, cell_labels = pd.factorize(values, sort=True)
+        codes[column] = (cell_labels.to_numpy(dtype=object), cell_codes)
+        present = cell_codes >= 0
+        cell_bits = _bitmaps((np.flatnonzero(present), cell_codes[present]), len(cell_labels), size)
+        cells[column] = dict(zip(cell_labels, cell_bits))
+
+        # single values: one row per (company, value) after splitting the cells
+        exploded = values.str.split(',').explode().str.strip().dropna()
+        exploded = exploded[exploded != '']
+        value_codes, value_labels = pd.factorize(exploded, sort=True)
+        value_bits = _bitmaps((exploded.index.to_numpy(), value_codes), len(value_labels), size)
+        bitmaps[column] = dict(zip(value_labels, value_bits))
+
+    years = df[YEAR].fillna(0).astype(int).to_numpy() if YEAR in df else np.zeros(size, dtype=int)
+    return CompanyIndex(size, bitmaps, cells, codes, years)
+
+
+def _any_of(bitmaps, values, size):
+    # OR of the bitmaps of `values` (a value or a list of values)
+    values = [values] if isinstance(values, str) else values
+    result = np.zeros((size + 7) // 8, dtype=np.uint8)
+    for value in values:
+        if value in bitmaps:
+            result |= bitmaps[value]
+    return result
+
+
+def all_companies(index):
+    return np.packbits(np.ones(index.size, dtype=bool))
+
+
+def select(index, where=None, exact=None, years=None):
+    # packed bitmap of the companies matching every filter (AND over the columns)
+    mask = all_companies(index)
+    for column, values in (where or {}).items():
+        mask &= _any_of(index.bitmaps[column], values, index.size)
+    for column, values in (exact or {}).items():
+        mask &= _any_of(index.cells[column], values, index.size)
+    if years is not None:
+        first, last = years
+        mask &= np.packbits((index.years >= first) & (index.years <= last))
+    return mask
+
+
+def positions(index, mask):
+    # row positions of the selected companies, e.g. for df.iloc
+    return np.flatnonzero(np.unpackbits(mask, count=index.size))
+
+
+def count(index, mask):
+    return int(_POPCOUNT[mask].sum(dtype=np.int64))
+
+
+def count_by(index, column, mask=None):
+    # number of selected companies per value of `column` (0 for values without
+    # selected companies); a company with several values counts for each of them
+    mask = all_companies(index) if mask is None else mask
+
+    if column == YEAR:
+        selected = index.years[positions(index, mask)]
+        labels, counts = np.unique(selected, return_counts=True)
+        return pd.Series(counts, index=pd.Index(labels, name=column), name='count')
+
+    if column in SINGLE_VALUED:
+        labels, codes = index.codes[column]
+        selected = codes[positions(index, mask)]
+        counts = np.bincount(selected[selected >= 0], minlength=len(labels))
+        return pd.Series(counts, index=pd.Index(labels, name=column), name='count')
+
+    bitmaps = index.bitmaps[column]
+    counts = [count(index, bitmap & mask) for bitmap in bitmaps.values()]
+    return pd.Series(counts, index=pd.Index(list(bitmaps), name=column), name='count')
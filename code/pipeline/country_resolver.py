@@ -0,0 +1,136 @@
+# Country names -> ISO 3166 codes, for joining company and market data to the map
+#
+# The sources spell countries their own way ("United States", "Mainland China",
+# "Hong Kong SAR", "Czech Republic", "Bavaria "), the map needs the ISO 3166-1
+# numeric code. Instead of fixing names by hand per source, a value is
+# normalized (case, accents, punctuation, spaces) and looked up in one hash
+# index over
+#
+#   - the ISO names, alpha-2, alpha-3 and numeric codes of the ISO table
+#     (code/reference-data/iso-3166-countries.csv, see streamlit/reference_data.py)
+#   - the aliases of code/reference-data/country-aliases.csv (alias -> alpha-3),
+#     also regions that count for their country (Scotland, Bavaria)
+#
+#     resolver = country_resolver.build(codes, country_resolver.read_aliases())
+#     country_resolver.resolve(resolver, df['Country/Region'])     # name, alpha-2, alpha-3, country-code per row
+#     country_resolver.unmatched(resolver, df['Country/Region'])   # value -> rows, of what is not resolved
+#
+# A column is resolved in one pass over its distinct values; every value seen
+# is cached in the resolver (raw value -> row of the ISO table), so the next
+# column with the same names only needs the lookups.
+#
+#     python -m pipeline.country_resolver      # unmatched values of the GFI company table
+
+import unicodedata
+from collections import namedtuple
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+REFERENCE_DATA = Path(__file__).resolve().parent.parent / 'reference-data'
+COUNTRY_CODES = REFERENCE_DATA / 'iso-3166-countries.csv'
+ALIASES = REFERENCE_DATA / 'country-aliases.csv'
+
+COLUMNS = ['name', 'alpha-2', 'alpha-3', 'country-code']
+
+# codes: the ISO table (COLUMNS), index: normalized key -> row of codes,
+# cache: raw value -> row of codes (-1 = not resolved)
+Resolver = namedtuple('Resolver', ['codes', 'index', 'cache'])
+
+
+def normalize(values):
+    # lower case, without accents, punctuation and repeated spaces; 'the' at the start is dropped
+    values = (pd.Series(values, dtype='string')
+              .str.replace('&', ' and ', regex=False)
+              .str.replace(r'[^\w\s]|_', ' ', regex=True))
+    values = values.map(lambda value: unicodedata.normalize('NFKD', value).encode('ascii', 'ignore').decode(),
+                        na_action='ignore').astype('string')
+    return (values.str.casefold()
+            .str.replace(r'\s+', ' ', regex=True)
+            .str.strip()
+            .str.replace(r'^the ', '', regex=True))
+
+
+def read_aliases(path=ALIASES):
+    # alias -> alpha-3
+    df = pd.read_csv(path, comment='#', dtype=str)
+    return dict(zip(df['alias'], df['alpha-3']))
+
+
+def build(codes, aliases=None):
+    # codes: the ISO table with (at least) COLUMNS, aliases: alias -> alpha-3
+    codes = codes[COLUMNS].reset_index(drop=True)
+    row = np.arange(len(codes))
+    keys = [
+        (codes['alpha-3'], row),
+        (codes['alpha-2'], row),
+        (codes['country-code'].astype(str), row),
+        (codes['country-code'].astype(str).str.zfill(3), row),
+    ]
+    if aliases:
+        by_alpha3 = dict(zip(codes['alpha-3'], row))
+        known = [(alias, by_alpha3[code]) for alias, code in aliases.items() if code in by_alpha3]
+        keys.append((pd.Series([alias for alias, _ in known], dtype='string'), np.array([i for _, i in known])))
+    # the ISO names last, an alias never hides an official name
+    keys.append((codes['name'], row))
+
+    index = {}
+    for values, rows in keys:
+        index.update(zip(normalize(values), rows.tolist()))
+    index.pop(pd.NA, None)
+    return Resolver(codes, index, {})
+
+
+def positions(resolver, values):
+    # row of the ISO table per value, -1 if it is not resolved
+    codes, uniques = pd.factorize(pd.Series(values, dtype='string'))
+    new = [value for value in uniques if value not in resolver.cache]
+    if new:
+        found = normalize(new).map(resolver.index)
+        resolver.cache.update(zip(new, found.fillna(-1).astype(int).tolist()))
+    rows = np.array([resolver.cache[value] for value in uniques] + [-1], dtype=np.int64)
+    # factorize gives -1 for missing values, the -1 appended above
+    return rows[codes]
+
+
+def resolve(resolver, values):
+    # COLUMNS of the ISO table per value, in the order of values (missing if not resolved)
+    rows = positions(resolver, values)
+    df = resolver.codes.reindex(rows).reset_index(drop=True)
+    df['country-code'] = df['country-code'].astype('Int64')
+    if isinstance(values, pd.Series):
+        df.index = values.index
+    return df
+
+
+def unmatched(resolver, values):
+    # value -> number of rows, of the values that are not resolved (without missing values)
+    values = pd.Series(values, dtype='string')
+    missed = values[(positions(resolver, values) < 0) & values.notna()]
+    return missed.value_counts()
+
+
+def load(codes_path=COUNTRY_CODES, aliases_path=ALIASES):
+    # resolver of the vendored ISO table and the aliases
+    return build(pd.read_csv(codes_path, usecols=COLUMNS, keep_default_na=False), read_aliases(aliases_path))
+
+
+# ---------------------------------------------------- #
+# unmatched values of the GFI company table
+
+def report():
+    from pipeline.stages import GFI_COMPANIES
+
+    resolver = load()
+    values = pd.read_csv(Path(__file__).resolve().parent.parent / GFI_COMPANIES, usecols=['Country/Region'])['Country/Region']
+    found = resolve(resolver, values)
+    print(f"{values.nunique()} values, {found['alpha-3'].notna().sum()} of {values.notna().sum()} rows resolved")
+    missed = unmatched(resolver, values)
+    print('unmatched:' if len(missed) else 'all values resolved')
+    for value, rows in missed.items():
+        print(f'  {value!r}: {rows} rows')
+
+
+if __name__ == '__main__':
+    report()
@@ -0,0 +1,93 @@
+# Reshaping of the Poore & Nemecek (2018) results sheets into one long table
+#
+# The 'Results - ...' sheets are wide: above the products there are three
+# header rows (data section, impact category, statistic) and every impact
+# category has 6 statistics (5th pctl ... 95th pctl). Instead of renaming the
+# columns one by one, the header rows are read as a MultiIndex and all values
+# are reshaped at once into a tidy frame:
+#
+#     Functional Unit | Product | Impact Category | Statistic | Value
+#
+# The cleaned environmental-impact-*.csv files are projections of it.
+
+import numpy as np
+import pandas as pd
+
+SHEETS = {'Retail Weight': 'Results - Retail Weight',
+          'Nutritional Units': 'Results - Nutritional Units'}
+
+# only the resampled data, the original study data only has Min/Max
+SECTION = 'Resampled, Randomized Data'
+
+# impact categories in the order of the sheets (same names as in the notebook)
+IMPACT_CATEGORIES = ['Land Use', 'GHG', 'GHG_old', 'Acid', 'Eutro', 'Freshwater', 'Water Use']
+
+TIDY_COLUMNS = ['Functional Unit', 'Product', 'Impact Category', 'Statistic', 'Value']
+
+# units per 1 kg / 1 l (retail weight) from the header of the sheet, without the methods;
+# 'Freshwater' are the freshwater withdrawals in litres, 'Water Use' is the
+# stress-weighted water use (litres weighted by the water scarcity where they are withdrawn)
+UNITS = {'Land Use': 'm²', 'GHG': 'kg CO2eq', 'GHG_old': 'kg CO2eq', 'Acid': 'g SO2eq', 'Eutro': 'g PO4eq',
+         'Freshwater': 'l', 'Water Use': 'l eq (stress-weighted)'}
+
+
+def read_results(path, sheet_name):
+    # wide sheet -> DataFrame with the products as index and a
+    # (impact category, statistic) MultiIndex as columns
+    raw = pd.read_excel(path, sheet_name=sheet_name, header=None)
+
+    # the last header row starts with 'Product', the two above are section and category
+    header_row = raw.index[raw[0] == 'Product'][0]
+    sections, categories, statistics = raw.iloc[header_row - 2:header_row + 1].ffill(axis=1).to_numpy()
+
+    columns = sections == SECTION
+    data = raw.iloc[header_row + 1:]
+    # the products end at the first empty row, below are notes and summary rows
+    data = data[~data[0].isna().cummax()]
+
+    # categories get the short names by their position, like the notebook prefixes
+    category_codes, _ = pd.factorize(categories[columns])
+    index = pd.MultiIndex.from_arrays([np.array(IMPACT_CATEGORIES)[category_codes], statistics[columns]],
+                                      names=['Impact Category', 'Statistic'])
+    return pd.DataFrame(data.loc[:, columns].to_numpy(dtype=float), index=pd.Index(data[0], name='Product'),
+                        columns=index)
+
+
+def tidy(path):
+    # every value of both results sheets as one row
+    frames = []
+    for unit, sheet_name in SHEETS.items():
+        results = read_results(path, sheet_name)
+        n_products, n_columns = results.shape
+        frames.append(pd.DataFrame({
+            'Functional Unit': unit,
+            'Product': np.repeat(results.index.to_numpy(), n_columns),
+            'Impact Category': np.tile(results.columns.get_level_values(0), n_products),
+            'Statistic': np.tile(results.columns.get_level_values(1), n_products),
+            'Value': results.to_numpy().ravel(),
+        }))
+    return pd.concat(frames, ignore_index=True)[TIDY_COLUMNS]
+
+
+def read_tidy(path):
+    # round_trip: the values are exactly the ones of the excel file
+    return pd.read_csv(path, float_precision='round_trip')
+
+
+def select(df, unit, products, impact_categories, statistics=None):
+    # rows of one functional unit, products in the order of the sheet
+    mask = ((df['Functional Unit'] == unit) & df['Product'].isin(products)
+            & df['Impact Category'].isin(impact_categories))
+    if statistics is not None:
+        mask &= df['Statistic'].isin(statistics)
+    return df[mask]
+
+
+def wide(df):
+    # long selection -> one row per product, one column per statistic (sheet order)
+    df = df.assign(Product=pd.Categorical(df['Product'], categories=df['Product'].unique()),
+                   Statistic=pd.Categorical(df['Statistic'], categories=df['Statistic'].unique()))
+    result = df.pivot(index='Product', columns='Statistic', values='Value')
+    result.columns = result.columns.astype(str)
+    result.columns.name = None
+    return result.reset_index()
@@ -0,0 +1,233 @@
+# Runner for the pipeline stages
+#
+# A stage is skipped if its key (hash of the stage code + content hash of every
+# input) is the same as in the manifest of the last run and its output was not
+# changed by hand. Stages whose inputs do not depend on each other are built in
+# parallel worker processes.
+
+import hashlib
+import inspect
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+
+import pandas as pd
+
+from pipeline.stages import STAGES
+
+
+CODE_DIR = Path(__file__).resolve().parent.parent
+MANIFEST = CODE_DIR / 'cleaned-data' / 'pipeline-manifest.json'
+
+_PACKAGE = __name__.split('.')[0]     # 'pipeline'
+
+
+# ---------------------------------------------------- #
+# hashing
+
+def file_hash(path):
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 16), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def _global_names(code):
+    # names used by a function, including the ones used in its lambdas
+    names = set(code.co_names)
+    for const in code.co_consts:
+        if inspect.iscode(const):
+            names |= _global_names(const)
+    return names
+
+
+def _code_fingerprint(func, seen=None):
+    # source of the build function and of every module level helper/constant it uses,
+    # so editing e.g. PRODUCTS_STREAMLIT only rebuilds the stages using it; helpers
+    # from other pipeline modules (e.g. versorgungsbilanz.py) are followed as well,
+    # also when they are used as attributes (poore_nemecek.UNITS)
+    seen = set() if seen is None else seen
+    parts = [inspect.getsource(func)]
+    names = _global_names(func.__code__)
+    for name in sorted(names):
+        if name not in func.__globals__:
+            continue
+        value = func.__globals__[name]
+        parts.append(_value_fingerprint(func.__module__, name, value, seen))
+        if inspect.ismodule(value) and value.__name__.startswith(_PACKAGE):
+            for attribute in sorted(names & set(vars(value))):
+                parts.append(_value_fingerprint(value.__name__, attribute, getattr(value, attribute), seen))
+    return '\n'.join(part for part in parts if part)
+
+
+def _value_fingerprint(module, name, value, seen):
+    # '' for values already seen and for the ones left out
+    if (module, name) in seen:
+        return ''
+    seen.add((module, name))
+    if inspect.isfunction(value) and value.__module__.startswith(_PACKAGE):
+        return _code_fingerprint(value, seen)
+    if not (inspect.ismodule(value) or inspect.isclass(value) or callable(value)
+            or isinstance(value, os.PathLike)):
+        # (paths are left out, they depend on where the repo is checked out)
+        return f'{name} = {value!r}'
+    return ''
+
+
+def stage_key(name):
+    stage = STAGES[name]
+    sha = hashlib.sha256(_code_fingerprint(stage.build).encode())
+    for path in stage.inputs:
+        sha.update(file_hash(CODE_DIR / path).encode())
+    return sha.hexdigest()
+
+
+# ---------------------------------------------------- #
+# dependencies
+
+def dependencies(name):
+    # stages producing one of the inputs of `name`
+    inputs = set(STAGES[name].inputs)
+    return [other for other, stage in STAGES.items() if stage.output in inputs]
+
+
+def _with_dependencies(targets):
+    selected = set()
+    todo = list(targets)
+    while todo:
+        name = todo.pop()
+        if name not in STAGES:
+            raise KeyError(f'unknown stage {name!r}, choose from: {", ".join(STAGES)}')
+        if name not in selected:
+            selected.add(name)
+            todo.extend(dependencies(name))
+    return selected
+
+
+# ---------------------------------------------------- #
+# building
+
+def typed_path(path):
+    # typed columnar copy next to the csv, e.g. versorgungsbilanz-fleisch.feather
+    return path.with_suffix('.feather')
+
+
+def _replace_atomic(write, path):
+    # write to a temp file first, readers never see a half written file
+    tmp = path.with_name(path.name + '.tmp')
+    write(tmp)
+    os.replace(tmp, path)
+
+
+def write_output(frame, path, categories=()):
+    # returns the written files
+    # CRLF like the files the notebooks wrote, so unchanged data gives unchanged files
+    _replace_atomic(lambda tmp: frame.to_csv(tmp, index=False, lineterminator='\r\n'), path)
+
+    try:
+        import pyarrow.feather as feather
+    except ImportError:
+        # optional: without pyarrow the app just reads the csv files
+        return [path]
+
+    # datetime columns stay datetimes, `categories` become categories, everything
+    # else is stored like read_csv would return it
+    typed = frame.reset_index(drop=True)
+    for column in typed.columns:
+        if column in categories:
+            # only the categories that occur, sorted, like astype('category') after read_csv
+            typed[column] = typed[column].astype(object).astype('category')
+        elif isinstance(typed[column].dtype, pd.CategoricalDtype):
+            typed[column] = typed[column].astype(object)
+
+    # uncompressed -> the file can be memory-mapped when loading
+    _replace_atomic(lambda tmp: feather.write_feather(typed, tmp, compression='uncompressed'), typed_path(path))
+    return [path, typed_path(path)]
+
+
+def build_stage(name):
+    # runs in a worker process, returns {written file: hash}
+    stage = STAGES[name]
+    start = time.perf_counter()
+    frame = stage.build(*[CODE_DIR / path for path in stage.inputs])
+    written = write_output(frame, CODE_DIR / stage.output, stage.categories)
+    hashes = {str(path.relative_to(CODE_DIR)): file_hash(path) for path in written}
+    return hashes, time.perf_counter() - start
+
+
+def _load_manifest():
+    if MANIFEST.exists():
+        with open(MANIFEST) as f:
+            return json.load(f)
+    return {}
+
+
+def _save_manifest(manifest):
+    tmp = MANIFEST.with_name(MANIFEST.name + '.tmp')
+    with open(tmp, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+        f.write('\n')
+    os.replace(tmp, MANIFEST)
+
+
+def _up_to_date(name, key, manifest):
+    entry = manifest.get(name)
+    if entry is None or entry['key'] != key:
+        return False
+    # rebuild if an output is missing or was changed by hand
+    return all((CODE_DIR / path).exists() and file_hash(CODE_DIR / path) == output_hash
+               for path, output_hash in entry['outputs'].items())
+
+
+def run(targets=None, force=False, jobs=None, dry_run=False):
+    # returns {stage name: 'skipped' | 'built' | 'outdated'}
+    selected = _with_dependencies(targets or STAGES)
+    pending = set(selected)
+    manifest = _load_manifest()
+    result = {}
+    jobs = jobs or os.cpu_count() or 1
+
+    executor = ProcessPoolExecutor(max_workers=jobs) if jobs > 1 and not dry_run else None
+    running = {}    # future -> (name, key)
+    try:
+        while pending or running:
+            # every stage whose upstream stages are finished can start now
+            ready = [name for name in sorted(pending)
+                     if all(dep in result for dep in dependencies(name))]
+            for name in ready:
+                pending.discard(name)
+                key = stage_key(name)
+                if not force and _up_to_date(name, key, manifest):
+                    result[name] = 'skipped'
+                    print(f'{name}: up to date')
+                elif dry_run:
+                    result[name] = 'outdated'
+                    print(f'{name}: would be rebuilt')
+                elif executor is None:
+                    outputs, seconds = build_stage(name)
+                    manifest[name] = {'key': key, 'outputs': outputs}
+                    result[name] = 'built'
+                    print(f'{name}: built in {seconds:.2f}s')
+                else:
+                    running[executor.submit(build_stage, name)] = (name, key)
+
+            if not running:
+                continue
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name, key = running.pop(future)
+                outputs, seconds = future.result()
+                manifest[name] = {'key': key, 'outputs': outputs}
+                result[name] = 'built'
+                print(f'{name}: built in {seconds:.2f}s')
+    finally:
+        if executor is not None:
+            executor.shutdown()
+        if not dry_run:
+            _save_manifest(manifest)
+
+    return result
@@ -0,0 +1,234 @@
+# Stages of the ETL pipeline, one per file in cleaned-data
+#
+# The cleaning steps are the ones from the notebooks (meat-consumption.ipynb,
+# environmental-impact.ipynb, alt-protein-companies.ipynb). Each stage gets the
+# paths of its inputs and returns the cleaned data frame; writing the output is
+# done by the runner.
+
+from collections import namedtuple
+
+import pandas as pd
+
+from pipeline import company_index, poore_nemecek
+from pipeline.versorgungsbilanz import consumption_per_person
+
+
+# inputs/output are relative to the code/ directory
+# categories: columns stored as category in the typed (feather) copy of the output
+Stage = namedtuple('Stage', ['output', 'inputs', 'build', 'categories'], defaults=[()])
+
+POORE_NEMECEK = 'original-data/aaq0216_datas2.xls'
+VERSORGUNGSBILANZ = 'original-data/versorgungsbilanz-fleisch.xlsx'
+GFI_COMPANIES = 'original-data/alt-protein.csv'
+IMPACT_TIDY = 'cleaned-data/environmental-impact-tidy.csv'
+
+# products shown in the app (streamlit) and in the presentation
+PRODUCTS_STREAMLIT = ['Rice', 'Potatoes', 'Wheat', 'Soymilk', 'Tofu', 'Bovine Meat (beef herd)', 'Bovine Meat (dairy herd)', 'Lamb & Mutton',
+                      'Tomatoes', 'Crustaceans (farmed)', 'Fish (farmed)', 'Peas', 'Olive Oil', 'Pig Meat', 'Poultry Meat', 'Milk', 'Cheese']
+PRODUCTS_PRESENTATION = ['Rice', 'Potatoes', 'Wheat', 'Soymilk', 'Tofu', 'Bovine Meat (beef herd)',
+                         'Bovine Meat (dairy herd)', 'Pig Meat', 'Poultry Meat', 'Milk', 'Cheese']
+
+ANIMAL_PRODUCTS_PRESENTATION = ['Bovine Meat (beef herd)', 'Bovine Meat (dairy herd)', 'Pig Meat', 'Poultry Meat', 'Cheese', 'Milk']
+ANIMAL_PRODUCTS = ANIMAL_PRODUCTS_PRESENTATION + ['Lamb & Mutton', 'Crustaceans (farmed)', 'Fish (farmed)']
+# the other animal products of the full catalogue
+ANIMAL_PRODUCTS_CATALOGUE = ANIMAL_PRODUCTS + ['Eggs']
+
+# impact categories of the full catalogue (GHG_old: the same emissions by IPCC 2007)
+CATALOGUE_CATEGORIES = ['Land Use', 'GHG', 'Acid', 'Eutro', 'Freshwater', 'Water Use']
+# impact categories of the assortment simulator
+SIMULATOR_CATEGORIES = ['GHG', 'Land Use', 'Freshwater']
+
+# highlighted products in the protein chart
+COMPARE = ['Bovine Meat (dairy herd)', 'Tofu']
+
+# ---------------------------------------------------- #
+# environmental-impact.ipynb
+
+def food():
+    # simple df for the pie chart, numbers from Poore & Nemecek, 2018
+    return pd.DataFrame({"Category": ['non-food', 'food'], "Percent": [74, 26],
+                         "Emissions": ['5,269.2 billion tons CO2eq', '13.7 billion tons CO2eq']})
+
+
+def impact_tidy(path):
+    # both results sheets as one long table, the other environmental-impact
+    # files are projections of it (see poore_nemecek.py)
+    return poore_nemecek.tidy(path)
+
+
+def _impact_per_weight(path, products, animal_products, impact_types):
+    # impact_types: new name -> impact category, only the median values are used
+    df = poore_nemecek.select(poore_nemecek.read_tidy(path), 'Retail Weight', products,
+                              list(impact_types.values()), ['Median'])
+
+    # one row per Impact Type and Product, in the order of impact_types and of the sheet
+    impact_type = pd.Categorical(df['Impact Category'].map({prefix: name for name, prefix in impact_types.items()}),
+                                 categories=list(impact_types))
+    df = pd.DataFrame({'Product': df['Product'].astype('category'), 'Impact Type': impact_type,
+                       'Impact': df['Value']}).sort_values('Impact Type', kind='stable')
+    df['Impact Type'] = df['Impact Type'].astype(str)
+
+    df['Product Type'] = df['Product'].apply(lambda x: 'Animal Products' if x in animal_products else 'Plants')
+    return df.reset_index(drop=True)
+
+
+def impact_weight(path):
+    # for the presentation
+    return _impact_per_weight(path, PRODUCTS_PRESENTATION, ANIMAL_PRODUCTS_PRESENTATION,
+                              {'Land Use': 'Land Use', 'Emissions': 'GHG'})
+
+
+def impact_streamlit(path):
+    # more products and water use for the streamlit page
+    return _impact_per_weight(path, PRODUCTS_STREAMLIT, ANIMAL_PRODUCTS,
+                              {'Land Use': 'Land Use', 'Emissions': 'GHG', 'Water Use': 'Water Use'})
+
+
+def impact_nu(path):
+    # only the GHG emissions per 100g protein (nutritional unit) are kept
+    df_nu = poore_nemecek.wide(poore_nemecek.select(poore_nemecek.read_tidy(path), 'Nutritional Units',
+                                                    PRODUCTS_STREAMLIT, ['GHG']))
+
+    df_nu['Product Type'] = df_nu['Product'].apply(lambda x: 'Animal Products' if x in ANIMAL_PRODUCTS else 'Plants')
+
+    # column 'Compare' to change the opacity of all the products that are "No" in the compare list
+    df_nu['Compare'] = df_nu['Product'].apply(lambda x: 'Yes' if x in COMPARE else 'No')
+
+    # rounding the median for the tooltip
+    df_nu['Median'] = df_nu['Median'].round(2)
+    return df_nu
+
+
+def impact_catalogue(path):
+    # every product of the sheet with the median of every impact category per
+    # 1kg / 1l, for the full catalogue in the app (streamlit/catalogue.py)
+    tidy = poore_nemecek.read_tidy(path)
+    df = poore_nemecek.select(tidy, 'Retail Weight', tidy['Product'].unique(), CATALOGUE_CATEGORIES, ['Median'])
+    df = pd.DataFrame({'Product': df['Product'], 'Impact Category': df['Impact Category'],
+                       'Impact': df['Value'], 'Unit': df['Impact Category'].map(poore_nemecek.UNITS)})
+    df['Product Type'] = df['Product'].apply(lambda x: 'Animal Products' if x in ANIMAL_PRODUCTS_CATALOGUE else 'Plants')
+    return df.reset_index(drop=True)
+
+
+def impact_distribution(path):
+    # all percentiles of GHG, land use and freshwater withdrawals per 1kg / 1l, one row per product
+    # and category (products in the order of the sheet), for streamlit/simulator.py
+    tidy = poore_nemecek.read_tidy(path)
+    df = poore_nemecek.select(tidy, 'Retail Weight', tidy['Product'].unique(), SIMULATOR_CATEGORIES)
+    df = df.assign(Product=pd.Categorical(df['Product'], categories=df['Product'].unique()),
+                   **{'Impact Category': pd.Categorical(df['Impact Category'], categories=SIMULATOR_CATEGORIES),
+                      'Statistic': pd.Categorical(df['Statistic'], categories=df['Statistic'].unique())})
+    df = df.pivot(index=['Product', 'Impact Category'], columns='Statistic', values='Value')
+    df.columns = df.columns.astype(str)
+    df.columns.name = None
+    df = df.reset_index()
+    df['Unit'] = df['Impact Category'].map(poore_nemecek.UNITS).astype(str)
+    df['Product Type'] = df['Product'].apply(lambda x: 'Animal Products' if x in ANIMAL_PRODUCTS_CATALOGUE else 'Plants')
+    return df
+
+
+# ---------------------------------------------------- #
+# meat-consumption.ipynb
+
+def consumption(path):
+    # the years are on different excel sheets, of each sheet only 'Fleisch insgesamt'
+    # in column 'Verzehr pro Kopf' is read (see versorgungsbilanz.py)
+    df_consumption = pd.DataFrame(consumption_per_person(path), columns=['Year', 'Consumption per Person'])
+
+    # Remove the first row (year 2022), because it is not fitted for a comparison with alt-protein-companies
+    df_consumption = df_consumption.iloc[1:].copy()
+
+    # converting Year to datetime and rounding the consumption per person to 2 decimals
+    df_consumption['Year'] = pd.to_datetime(df_consumption['Year'], format='%Y')
+    df_consumption['Consumption per Person'] = df_consumption['Consumption per Person'].round(2)
+
+    df_consumption['MaxConsumption'] = df_consumption['Consumption per Person'].max()
+    df_consumption['MinConsumption'] = df_consumption['Consumption per Person'].min()
+    return df_consumption
+
+
+# ---------------------------------------------------- #
+# alt-protein-companies.ipynb
+
+def _plant_based_companies(path):
+    df = pd.read_csv(path)
+
+    # dropping not interesting cloumns, e.g. website, founders, ...
+    df = df.drop(['Brief Description', 'Animal-Type Analog', 'State', 'City', 'Website', 'Founders', 'Logo'], axis=1)
+
+    LIST_CAT = ['Protein Category', 'Company Focus', 'Company type', 'Technology Focus',
+                'Product Type', 'Ingredient Type', 'Operating Regions', 'Country/Region']
+    for i in LIST_CAT:
+        df[i] = df[i].astype('category')
+
+    df['Year Founded'] = df['Year Founded'].fillna(0).astype(int)
+    df['Company'] = df['Company'].fillna(0).astype('string')
+
+    # Only Protein Category "Plant-based" is relevant for this analysis
+    return df[df['Protein Category'] == 'Plant-based']
+
+
+def companies_overall(path):
+    return _plant_based_companies(path)
+
+
+def _company_index(path):
+    # the counts below are queries on the bitmap index (see company_index.py)
+    return company_index.build(pd.read_csv(path))
+
+
+# exact cells like in the notebook: only companies with just 'Plant-based' as protein category
+PLANT_BASED = {'Protein Category': 'Plant-based'}
+
+
+def companies_founded(path):
+    index = _company_index(path)
+
+    # only companies that are specialized in alternative proteins (not Unilever, Nestle, etc.)
+    # 2010 - 2021, to compare with the meat consumption data
+    mask = company_index.select(index, exact={**PLANT_BASED, 'Company type': 'Specialized (focused on alternative proteins)'},
+                                years=(2010, 2021))
+    df_founded = company_index.count_by(index, 'Year Founded', mask).reset_index(name='Number of Companies Founded')
+
+    df_founded['Year Founded'] = pd.to_datetime(df_founded['Year Founded'], format='%Y')
+    df_founded['Year_int'] = df_founded['Year Founded'].dt.year
+    return df_founded
+
+
+def companies_country(path):
+    index = _company_index(path)
+
+    # every country of the database, also with 0 plant-based companies
+    df_country = company_index.count_by(index, 'Country/Region', company_index.select(index, exact=PLANT_BASED)).reset_index(
+        name='Number of Companies per Country')
+
+    # the names as in the GFI table, the map resolves them to ISO codes (country_resolver.py)
+    return df_country.rename(columns={"Country/Region": "name"})
+
+
+# ---------------------------------------------------- #
+# registry: stage name -> Stage
+
+STAGES = {
+    'environmental-impact-food.csv': Stage('cleaned-data/environmental-impact-food.csv', [], food,
+                                           ['Category']),
+    'environmental-impact-tidy.csv': Stage(IMPACT_TIDY, [POORE_NEMECEK], impact_tidy,
+                                           ['Functional Unit', 'Product', 'Impact Category', 'Statistic']),
+    'environmental-impact-weight.csv': Stage('cleaned-data/environmental-impact-weight.csv', [IMPACT_TIDY], impact_weight,
+                                             ['Product', 'Impact Type', 'Product Type']),
+    'environmental-impact-streamlit.csv': Stage('cleaned-data/environmental-impact-streamlit.csv', [IMPACT_TIDY], impact_streamlit,
+                                                ['Product', 'Impact Type', 'Product Type']),
+    'environmental-impact-nu.csv': Stage('cleaned-data/environmental-impact-nu.csv', [IMPACT_TIDY], impact_nu,
+                                         ['Product', 'Product Type', 'Compare']),
+    'environmental-impact-catalogue.csv': Stage('cleaned-data/environmental-impact-catalogue.csv', [IMPACT_TIDY],
+                                                impact_catalogue, ['Product', 'Impact Category', 'Unit', 'Product Type']),
+    'environmental-impact-distribution.csv': Stage('cleaned-data/environmental-impact-distribution.csv', [IMPACT_TIDY],
+                                                   impact_distribution,
+                                                   ['Product', 'Impact Category', 'Unit', 'Product Type']),
+    'versorgungsbilanz-fleisch.csv': Stage('cleaned-data/versorgungsbilanz-fleisch.csv', [VERSORGUNGSBILANZ], consumption),
+    'alt-protein-overall.csv': Stage('cleaned-data/alt-protein-overall.csv', [GFI_COMPANIES], companies_overall,
+                                     ['Protein Category', 'Company Focus', 'Company type', 'Technology Focus',
+                                      'Product Type', 'Ingredient Type', 'Operating Regions', 'Country/Region']),
+    'alt-protein-founded.csv': Stage('cleaned-data/alt-protein-founded.csv', [GFI_COMPANIES], companies_founded),
+    'alt-protein-country.csv': Stage('cleaned-data/alt-protein-country.csv', [GFI_COMPANIES], companies_country),
+}
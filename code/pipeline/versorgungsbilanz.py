@@ -0,0 +1,179 @@
+# Reader for the BMEL Versorgungsbilanz Fleisch workbook
+#
+# The workbook has one sheet per year (plus 'Dokumentation'), but of every year
+# sheet only one number is needed: 'Fleisch insgesamt' in the column
+# 'darunter menschlicher Verzehr kg/Kopf'. Instead of parsing every sheet with
+# read_excel, the xlsx file (a zip of xml files) is opened once and the xml of
+# each sheet is streamed until that row is found. Row and column are found by
+# their labels, not by position.
+#
+# The value of every sheet is cached, keyed by the hash of the sheet xml, so a
+# workbook with a new year only costs the new sheet. Sheets that are not in the
+# cache can be read in parallel worker processes (jobs > 1); for the current
+# workbook (~3 ms per sheet) starting the processes costs more than it saves.
+
+import hashlib
+import json
+import os
+import posixpath
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from xml.etree import ElementTree
+
+ROW_LABEL = 'Fleisch insgesamt'
+COLUMN_LABEL = ['Verzehr', 'kg/Kopf']       # all parts have to be in the column header
+SKIP_SHEETS = ['Dokumentation']
+
+CACHE = Path(__file__).resolve().parent.parent / 'cleaned-data' / 'pipeline-cache' / 'versorgungsbilanz.json'
+
+_MAIN = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+_RELATIONSHIPS = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+_PACKAGE = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+
+
+# ---------------------------------------------------- #
+# workbook structure
+
+def _sheet_members(book):
+    # sheet name -> xml file in the zip, in the order of the workbook
+    rels = ElementTree.fromstring(book.read('xl/_rels/workbook.xml.rels'))
+    targets = {rel.get('Id'): rel.get('Target') for rel in rels.iter(_PACKAGE + 'Relationship')}
+
+    workbook = ElementTree.fromstring(book.read('xl/workbook.xml'))
+    members = {}
+    for sheet in workbook.iter(_MAIN + 'sheet'):
+        target = targets[sheet.get(_RELATIONSHIPS + 'id')]
+        # targets are relative to xl/, or absolute within the zip
+        members[sheet.get('name')] = target.lstrip('/') if target.startswith('/') else posixpath.join('xl', target)
+    return members
+
+
+def _matches(text, label):
+    # labels have trailing blanks and line breaks in the workbook
+    text = ' '.join(text.split())
+    if isinstance(label, str):
+        return text == label
+    return all(part in text for part in label)
+
+
+def _label_indices(book):
+    # indices of the shared strings that are the row or the column label, the
+    # cells of the sheets only contain these indices
+    row_ids, column_ids = [], []
+    if 'xl/sharedStrings.xml' not in book.namelist():
+        return row_ids, column_ids
+
+    with book.open('xl/sharedStrings.xml') as f:
+        index = 0
+        for _, element in ElementTree.iterparse(f):
+            if element.tag == _MAIN + 'si':
+                text = ''.join(t.text or '' for t in element.iter(_MAIN + 't'))
+                if _matches(text, ROW_LABEL):
+                    row_ids.append(str(index))
+                if _matches(text, COLUMN_LABEL):
+                    column_ids.append(str(index))
+                index += 1
+                element.clear()
+    return row_ids, column_ids
+
+
+# ---------------------------------------------------- #
+# one sheet
+
+def _cell_column(cell, position):
+    # 'O17' -> 'O'; the reference is optional in xlsx, then the position counts
+    ref = cell.get('r')
+    return ref.rstrip('0123456789') if ref else position
+
+
+def _is_label(cell, shared_ids, label):
+    kind = cell.get('t')
+    if kind == 's':
+        value = cell.find(_MAIN + 'v')
+        return value is not None and value.text in shared_ids
+    if kind == 'inlineStr':
+        return _matches(''.join(t.text or '' for t in cell.iter(_MAIN + 't')), label)
+    if kind == 'str':
+        value = cell.find(_MAIN + 'v')
+        return value is not None and _matches(value.text or '', label)
+    return False
+
+
+def read_sheet(path, member, row_ids, column_ids):
+    # value of the labelled cell, stops reading as soon as it is found
+    column = None
+    with zipfile.ZipFile(path) as book, book.open(member) as f:
+        for _, row in ElementTree.iterparse(f):
+            if row.tag != _MAIN + 'row':
+                continue
+            cells = {_cell_column(cell, position): cell
+                     for position, cell in enumerate(row.iter(_MAIN + 'c'))}
+
+            if column is None:
+                column = next((key for key, cell in cells.items()
+                               if _is_label(cell, column_ids, COLUMN_LABEL)), None)
+            elif any(_is_label(cell, row_ids, ROW_LABEL) for cell in cells.values()):
+                value = cells[column].find(_MAIN + 'v') if column in cells else None
+                if value is None:
+                    raise ValueError(f'{member}: no value in the row {ROW_LABEL!r}')
+                return float(value.text)
+            row.clear()
+
+    raise ValueError(f'{member}: row {ROW_LABEL!r} or column {" ".join(COLUMN_LABEL)!r} not found')
+
+
+# ---------------------------------------------------- #
+# cache
+
+def _load_cache():
+    if CACHE.exists():
+        with open(CACHE) as f:
+            return json.load(f)
+    return {}
+
+
+def _save_cache(cache):
+    CACHE.parent.mkdir(exist_ok=True)
+    tmp = CACHE.with_name(CACHE.name + '.tmp')
+    with open(tmp, 'w') as f:
+        json.dump(cache, f, indent=2, sort_keys=True)
+        f.write('\n')
+    os.replace(tmp, CACHE)
+
+
+def _sheet_key(book, member, row_ids, column_ids):
+    # the cells only contain shared string indices, so they are part of the key
+    sha = hashlib.sha256(book.read(member))
+    sha.update(json.dumps([row_ids, column_ids]).encode())
+    return sha.hexdigest()
+
+
+# ---------------------------------------------------- #
+
+def consumption_per_person(path, jobs=1):
+    # [(sheet name, meat consumption per person in kg), ...] in workbook order
+    with zipfile.ZipFile(path) as book:
+        members = {name: member for name, member in _sheet_members(book).items()
+                   if name not in SKIP_SHEETS}
+        row_ids, column_ids = _label_indices(book)
+        keys = {name: _sheet_key(book, member, row_ids, column_ids) for name, member in members.items()}
+
+    cache = _load_cache()
+    values = {name: cache[key] for name, key in keys.items() if key in cache}
+    missing = [name for name in members if name not in values]
+
+    if missing:
+        jobs = min(jobs or os.cpu_count() or 1, len(missing))     # jobs=None: all cpus
+        arguments = [(path, members[name], row_ids, column_ids) for name in missing]
+        if jobs > 1:
+            with ProcessPoolExecutor(max_workers=jobs) as executor:
+                results = list(executor.map(read_sheet, *zip(*arguments)))
+        else:
+            results = [read_sheet(*args) for args in arguments]
+
+        values.update(zip(missing, results))
+        # only keep the sheets of the current workbook
+        _save_cache({keys[name]: values[name] for name in members})
+
+    return [(name, values[name]) for name in members]
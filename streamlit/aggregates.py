@@ -0,0 +1,18 @@
+# Pre-aggregation of the chart data in pandas
+#
+# Altair inlines the whole frame of every layer into the chart spec, and the
+# browser then runs the transforms/aggregates on it. The functions here compute
+# those values once on the server and return only the rows (and columns) a mark
+# really draws, so the spec stays small when the data gets finer (monthly,
+# regional, ...).
+
+
+def columns(df, *names):
+    # only the columns a mark encodes
+    return df[list(names)]
+
+
+def js_number(value):
+    # number -> text like JavaScript would show it (64.0 -> '64', 64.13 -> '64.13')
+    value = float(value)
+    return str(int(value)) if value.is_integer() else repr(value)
@@ -0,0 +1,209 @@
+# Full Poore & Nemecek catalogue for the impact section of the app
+#
+# The impact chart of the app (charts.impact_chart) shows a hand-picked list of
+# products as one facet row each. Every row is a Vega subplot with its own
+# scales, axes and header layout, so the chart gets slow with all 43 products
+# of the study, and unusable with regional variants. The catalogue mode shows
+# every product and all impact categories differently:
+#
+#   - one view: the products on the y axis, the impact categories side by side
+#     within a product (yOffset), one color per category
+#   - the categories have different units (m², kg CO2eq, l, ...), so a bar is
+#     the share of the highest product in its category; the tooltip has the
+#     value with its unit
+#   - search, sorting (top N of a category) and paging are done in pandas: the
+#     ordered product list of a search/sort is cached per content hash of the
+#     data, a page is a slice of it, and only the rows of that page are sent
+#   - like the explorer charts, the spec is built and validated once per
+#     highlight (opacity); a rerun only puts the page into its named dataset
+#
+#     python catalogue.py      # facet vs. grouped chart with 10/40/400 products
+
+import functools
+import json
+import math
+import sys
+import time
+from collections import namedtuple
+from pathlib import Path
+
+import chart_cache
+import data_loader
+
+SORT_NAME = 'Name'
+PAGE_SIZE = 15
+
+# categories: selected impact categories (empty = all), sort: SORT_NAME or an
+# impact category (highest first), page: 1, 2, ...
+Query = namedtuple('Query', ['categories', 'search', 'sort', 'page', 'page_size'],
+                   defaults=[(), '', SORT_NAME, 1, PAGE_SIZE])
+
+DATA = 'catalogue'
+
+# colors of the categories, the first three like in the impact chart
+COLORS = ['#982D4D', '#A1D6C6', '#6B68F9', '#9698B4', '#E0A458', '#4F7CAC']
+
+
+def current():
+    # content hash of the catalogue; part of every cache key below
+    return data_loader.content_hash('catalogue')
+
+
+def categories():
+    # the impact categories in the order of the sheet
+    return list(dict.fromkeys(data_loader.load_catalogue()['Impact Category']))
+
+
+# ---------------------------------------------------- #
+# selection
+
+@functools.lru_cache(maxsize=4)
+def _shares(content_hash):
+    # Impact as a share of the highest product in its category (0..1)
+    df = data_loader.load_catalogue()
+    highest = df.groupby('Impact Category', observed=True)['Impact'].transform('max')
+    return df.assign(Share=df['Impact'] / highest)
+
+
+@functools.lru_cache(maxsize=128)
+def _order(content_hash, search, sort):
+    # the matching products, in the order of the chart
+    df = _shares(content_hash)
+    if search:
+        df = df[df['Product'].str.contains(search, case=False, regex=False)]
+    if sort == SORT_NAME:
+        return tuple(sorted(df['Product'].unique()))
+    ranked = df[df['Impact Category'] == sort].sort_values('Impact', ascending=False, kind='stable')
+    return tuple(ranked['Product'])
+
+
+def page(query):
+    # {'rows': rows of the page, 'products': number of matching products, 'pages': ...}
+    content_hash = current()
+    products = _order(content_hash, query.search.strip(), query.sort)
+    pages = max(1, math.ceil(len(products) / query.page_size))
+    number = min(max(query.page, 1), pages)
+    shown = products[(number - 1) * query.page_size:number * query.page_size]
+
+    df = _shares(content_hash)
+    rows = df[df['Product'].isin(shown)]
+    if query.categories:
+        rows = rows[rows['Impact Category'].isin(query.categories)]
+    # the products in the order of the page, the categories in the order of the sheet
+    position = {product: i for i, product in enumerate(shown)}
+    rows = rows.assign(Rank=rows['Product'].map(position).astype(int)).sort_values('Rank', kind='stable')
+    columns = ['Product', 'Impact Category', 'Impact', 'Unit', 'Share', 'Product Type']
+    return {'rows': rows[columns].reset_index(drop=True), 'products': len(products), 'pages': pages, 'page': number}
+
+
+# ---------------------------------------------------- #
+# charts
+
+def grouped_chart(data, opacity, domain):
+    # one view for all products; data: a frame or alt.NamedData
+    import altair as alt
+
+    return alt.Chart(data).mark_bar(cornerRadiusTopRight=3, cornerRadiusBottomRight=3).encode(
+        x=alt.X('Share:Q', scale=alt.Scale(domain=[0, 1])).axis(
+            format='%',
+            labelAngle=0,
+            titleAnchor='start',
+            title='Median Impact per 1kg/ 1l, share of the highest product'),
+        # sort=None: the order of the rows (sorted in pandas)
+        y=alt.Y('Product:N', sort=None, title=None),
+        yOffset=alt.YOffset('Impact Category:N', sort=domain),
+        color=alt.Color('Impact Category:N', scale=alt.Scale(domain=domain, range=COLORS[:len(domain)])),
+        opacity=alt.Opacity('Product Type:N', legend=None,
+                            scale=alt.Scale(domain=['Animal Products', 'Plants'], range=list(opacity))),
+        tooltip=['Product:N', 'Impact Category:N', alt.Tooltip('Impact:Q', format=',.2f'), 'Unit:N'],
+    ).properties(
+        height=alt.Step(6)
+    )
+
+
+def facet_chart(df, opacity):
+    # the layout of charts.impact_chart (one facet row per product), for report()
+    import altair as alt
+
+    return alt.Chart(df).mark_bar(cornerRadiusTopRight=10, cornerRadiusBottomRight=10).encode(
+        x=alt.X('Impact:Q', scale=alt.Scale(domain=[df['Impact'].min(), df['Impact'].max()])).sort('-y').axis(
+            labelAngle=0,
+            titleAnchor='start',
+            title='Median Impact per 1kg/ 1l'),
+        y=alt.Y('Impact Category:N', title=None).axis(
+            labels=False,
+            titleAnchor='end',
+            grid=False),
+        opacity=alt.Opacity('Product Type:N', legend=None,
+                            scale=alt.Scale(domain=['Animal Products', 'Plants'], range=list(opacity))),
+        color=alt.Color('Impact Category:N')
+    ).facet(
+        row=alt.Row('Product:N', title=None, header=alt.Header(labelAngle=0, labelAlign='left')),
+        spacing=5,
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def _template(opacity, domain):
+    import altair as alt
+    return chart_cache.to_spec(grouped_chart(alt.NamedData(name=DATA), opacity, list(domain)))
+
+
+def spec(result, opacity):
+    # chart of a page (result of page()) with the highlight of the sidebar
+    return chart_cache.with_data(_template(opacity, tuple(categories())), DATA, result['rows'])
+
+
+def clear_cache():
+    for func in [_shares, _order, _template]:
+        func.cache_clear()
+
+
+# ---------------------------------------------------- #
+# facet vs. grouped chart
+
+def _measure(build):
+    # ms to build + validate the spec, kB of the spec, ms to render it (vl-convert)
+    start = time.perf_counter()
+    spec = chart_cache.to_spec(build())
+    seconds = time.perf_counter() - start
+    size = len(json.dumps(spec).encode())
+    try:
+        import vl_convert as vlc
+    except ImportError:
+        return seconds, size, None
+    start = time.perf_counter()
+    vlc.vegalite_to_svg(spec)
+    return seconds, size, time.perf_counter() - start
+
+
+def report(sizes=(10, 40, 400)):
+    # the real catalogue, more products than that are copies (benchmarks/synthetic.py)
+    import numpy as np
+
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'benchmarks'))
+    import synthetic
+
+    n_products = len(data_loader.load_catalogue()['Product'].unique())
+    df = synthetic.catalogue(math.ceil(max(sizes) / n_products), np.random.default_rng(0))
+    df['Share'] = df['Impact'] / df.groupby('Impact Category')['Impact'].transform('max')
+    products = list(dict.fromkeys(df['Product']))
+    domain, opacity = categories(), (1, 1)
+
+    # altair and vl-convert load on the first call
+    _measure(lambda: facet_chart(df.head(6), opacity))
+
+    print(f"{'products':>8} {'chart':<14} {'build ms':>9} {'spec kB':>8} {'render ms':>10}")
+    for n in sizes:
+        rows = df[df['Product'].isin(products[:n])]
+        first_page = df[df['Product'].isin(products[:min(n, PAGE_SIZE)])]
+        for name, build in [('facet', lambda: facet_chart(rows, opacity)),
+                            ('grouped', lambda: grouped_chart(rows, opacity, domain)),
+                            ('grouped page', lambda: grouped_chart(first_page, opacity, domain))]:
+            seconds, size, render = _measure(build)
+            render = f'{render * 1000:10.0f}' if render is not None else f"{'-':>10}"
+            print(f'{n:>8} {name:<14} {seconds * 1000:9.0f} {size / 1024:8.1f} {render}')
+
+
+if __name__ == '__main__':
+    report()
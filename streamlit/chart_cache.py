@@ -0,0 +1,280 @@
+# Cache for the Vega-Lite specs of the app charts
+#
+# The charts only depend on a handful of sidebar values (is_animal, is_plant,
+# selected_impact_types, slide). Each distinct combination is built and
+# serialized with Altair once per process; later reruns just look the spec up.
+# The key also contains the content hash of the datasets a chart uses, so a
+# changed CSV automatically leads to a fresh spec.
+#
+# If export.py has prebuilt a spec (exports/manifest.json) from the same data
+# and the same chart code, it is read from disk instead of built with Altair
+# (URBAN_BUTCHER_PREBUILT=0 to always build). A startup snapshot (snapshot.py)
+# fills the cache with all of them at once. Altair is only imported for a build.
+#
+#     python chart_cache.py      # payload (json bytes sent to the browser) per chart
+
+import functools
+import hashlib
+import importlib.metadata
+import json
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import charts
+import data_loader
+import metrics
+import reference_data
+
+
+MAX_SPECS = 64      # the app has 34 distinct chart states, so all fit
+
+_lock = threading.Lock()
+_build_lock = threading.Lock()     # the altair theme switch below is global
+_specs = OrderedDict()      # key -> spec dict (or None if the chart is empty)
+_building = {}              # key -> lock held while the spec is built
+_stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'prebuilt': 0}
+_warmed_up = False
+
+EXPORTS = Path(__file__).resolve().parent.parent / 'exports'
+PREBUILT = os.environ.get('URBAN_BUTCHER_PREBUILT', '1') != '0'
+
+# the specs are built from these files; if one changes, every prebuilt spec is stale
+SOURCES = [Path(__file__).with_name(f) for f in ['charts.py', 'deck_charts.py', 'chart_library.py', 'aggregates.py',
+                                                 'reference_data.py', 'geometry.py']] \
+    + [reference_data.COUNTRY_CODES_FILE, reference_data.WORLD_110M_FILE, reference_data.country_resolver.ALIASES,
+       Path(reference_data.country_resolver.__file__)]
+
+_MISSING = object()
+_manifest = {'signature': None, 'entries': {}}
+
+
+def _key(name, state):
+    _, datasets = charts.CHARTS[name]
+    return (name, state, tuple(data_loader.content_hash(d) for d in datasets))
+
+
+def _build(name, state):
+    builder, _ = charts.CHARTS[name]
+    if PREBUILT:
+        with metrics.part('prebuilt'):
+            spec = _prebuilt(name, state)
+        if spec is not _MISSING:
+            return spec
+    with metrics.part('altair'):
+        chart = builder(*state)
+    if chart is None:
+        return None
+    with metrics.part('validation'):
+        return to_spec(chart, charts.THEMES.get(name, 'none'))
+
+
+def to_spec(chart, theme='none'):
+    # 'none' is the same as st.altair_chart: no default altair theme (width/height defaults)
+    import altair as alt
+    import chart_library    # noqa: F401 (registers the themes of the charts)
+
+    # altair >= 5.5 renamed alt.themes to alt.theme
+    themes = getattr(alt, 'theme', None) or alt.themes
+    with _build_lock, themes.enable(theme):
+        return chart.to_dict()
+
+
+def with_data(template, name, df):
+    # a spec validated once with alt.NamedData(name), with the rows of this rerun;
+    # new top-level dict: streamlit moves the datasets out of the spec it gets
+    return {**template, 'datasets': {**template.get('datasets', {}), name: df}}
+
+
+def _lookup(key):
+    with _lock:
+        if key in _specs:
+            _specs.move_to_end(key)
+            _stats['hits'] += 1
+            return _specs[key]
+    return _MISSING
+
+
+def get(name, *state):
+    key = _key(name, state)
+    spec = _lookup(key)
+    if spec is not _MISSING:
+        return spec
+
+    with _lock:
+        building = _building.setdefault(key, threading.Lock())
+
+    # build outside _lock, other sessions can keep reading meanwhile; a second
+    # caller of the same key (e.g. every session after a data change) waits here
+    # and then gets the spec of the first one
+    with building:
+        spec = _lookup(key)
+        if spec is not _MISSING:
+            return spec
+        try:
+            spec = _build(name, state)
+        finally:
+            with _lock:
+                _building.pop(key, None)
+
+        with _lock:
+            _stats['misses'] += 1
+            _specs[key] = spec
+            _specs.move_to_end(key)
+            while len(_specs) > MAX_SPECS:
+                _specs.popitem(last=False)
+                _stats['evictions'] += 1
+    return spec
+
+
+def refresh(datasets):
+    # after a data change (live_reload.py): the chart states built so far that
+    # use one of the datasets are built again with the new data, then the specs
+    # of the old data are dropped. Returns the names of the charts rebuilt.
+    datasets = set(datasets)
+    with _lock:
+        old = [key for key in _specs if datasets & set(charts.CHARTS[key[0]][1])]
+    fresh = {_key(name, state) for name, state, _ in old}
+    for name, state in dict.fromkeys((name, state) for name, state, _ in old):
+        get(name, *state)
+    with _lock:
+        for key in old:
+            if key not in fresh:
+                _specs.pop(key, None)
+    return sorted({name for name, _, _ in old})
+
+
+def warm_up():
+    # prebuild every chart state once per process, e.g. at startup
+    global _warmed_up
+    if _warmed_up:
+        return
+    for name in charts.CHARTS:
+        for state in charts.states(name):
+            get(name, *state)
+    _warmed_up = True
+
+
+def cached():
+    # key -> spec of the chart states built so far
+    with _lock:
+        return dict(_specs)
+
+
+def cache_entries():
+    # key -> spec of every chart state, for the startup snapshot (snapshot.py)
+    warm_up()
+    return cached()
+
+
+def restore(specs):
+    # the keys contain the content hash of the data, specs of old data are never hit
+    with _lock:
+        for key, spec in specs.items():
+            _specs.setdefault(key, spec)
+
+
+def cache_stats():
+    with _lock:
+        return dict(_stats, size=len(_specs))
+
+
+def clear_cache():
+    global _warmed_up
+    with _lock:
+        _warmed_up = False
+        _specs.clear()
+        for key in _stats:
+            _stats[key] = 0
+
+
+# ---------------------------------------------------- #
+# prebuilt specs (written by export.py)
+
+@functools.lru_cache(maxsize=None)
+def code_fingerprint():
+    # altair version + content of the chart code and the reference data
+    # (the version from the package metadata, importing altair takes ~0.3s);
+    # every source is in git, a missing one would give keys no checkout has
+    sha = hashlib.sha256(importlib.metadata.version('altair').encode())
+    for path in SOURCES:
+        if not path.exists():
+            raise FileNotFoundError(f'{path} is missing (chart_cache.SOURCES), see reference_data.py')
+        sha.update(path.name.encode())
+        sha.update(path.read_bytes())
+    return sha.hexdigest()
+
+
+def _flat(state):
+    for value in state:
+        if isinstance(value, tuple):
+            yield from _flat(value)
+        else:
+            yield str(value).lower().replace(' ', '-')
+
+
+def export_name(name, state=()):
+    # file name of a chart state, e.g. ('impact', ((1, 0.2), ('Emissions',))) -> 'impact-1-0.2-emissions'
+    return '-'.join([name, *_flat(state)])
+
+
+def export_key(entry, datasets):
+    # changes with the chart code and the content of the datasets
+    data = [data_loader.content_hash(d) for d in datasets]
+    return hashlib.sha256(json.dumps([code_fingerprint(), entry, data]).encode()).hexdigest()
+
+
+def read_manifest():
+    # {entry: {'key': ..., 'spec': file or None, 'files': {file: sha256}}}, the files in git
+    path = EXPORTS / 'manifest.json'
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return {}
+    signature = (stat.st_mtime_ns, stat.st_size)
+    with _lock:
+        if _manifest['signature'] != signature:
+            with open(path) as f:
+                _manifest['entries'] = json.load(f)
+            _manifest['signature'] = signature
+        return _manifest['entries']
+
+
+def _prebuilt(name, state):
+    entry = 'app/' + export_name(name, state)
+    exported = read_manifest().get(entry)
+    if exported is None or exported['key'] != export_key(entry, charts.CHARTS[name][1]):
+        return _MISSING
+    with _lock:
+        _stats['prebuilt'] += 1
+    if exported['spec'] is None:
+        return None
+    with open(EXPORTS / exported['spec']) as f:
+        return json.load(f)
+
+
+# ---------------------------------------------------- #
+# payload size
+
+def payload_bytes(name, *state):
+    # size of the spec (incl. inlined data) as the browser receives it, 0 if empty
+    spec = get(name, *state)
+    return 0 if spec is None else len(json.dumps(spec).encode())
+
+
+def _data_rows(spec):
+    return sum(len(values) for values in (spec or {}).get('datasets', {}).values())
+
+
+def report():
+    print(f"{'chart':<8} {'states':>6} {'rows':>6} {'min bytes':>10} {'max bytes':>10}")
+    for name in charts.CHARTS:
+        states = charts.states(name)
+        sizes = [payload_bytes(name, *state) for state in states]
+        rows = max(_data_rows(get(name, *state)) for state in states)
+        print(f"{name:<8} {len(states):>6} {rows:>6} {min(sizes):>10} {max(sizes):>10}")
+
+
+if __name__ == '__main__':
+    report()
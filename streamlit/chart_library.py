@@ -0,0 +1,282 @@
+# Shared chart components of the app (charts.py) and the deck (deck_charts.py)
+#
+# - The look of the time series charts (no view border, Arial, grey titles) is
+#   the Altair theme THEME, registered once here instead of a
+#   configure_view/configure_title/configure_axis chain in every chart.
+#   chart_cache.to_spec(chart, THEME) applies it.
+# - A chart is alt.layer(*components, data=df): the line is drawn from the
+#   top-level dataset. Every other layer only gets the rows it draws, selected
+#   in pandas like in aggregates.py, so nothing is filtered or aggregated in
+#   the browser: a point or a value label gets the row of its year, a band the
+#   first and the last point in time. Reference lines and fixed labels get
+#   their values as datum encodings and one empty row (ONE_ROW), one mark.
+# - Components only depend on their (hashable) arguments and are memoized, so
+#   all slides of a chart share them; the rows are added per slide (rows()).
+
+import functools
+
+import altair as alt
+
+import aggregates
+
+# colors
+dark_grey = "#9698B4"
+sage_green = "#A1D6C6"
+dark_red = "#982D4D"
+blue_highlight = "#6B68F9"
+
+THEME = 'urban-butcher'             # for the app (no default width/height, like st.altair_chart)
+DECK_THEME = 'urban-butcher-deck'   # for the deck (on top of the default theme, like Jupyter)
+
+
+# ---------------------------------------------------- #
+# theme
+
+def _theme_config():
+    return {
+        'view': {'strokeWidth': 0},
+        'title': {'fontSize': 20, 'font': 'Arial', 'anchor': 'start', 'fontWeight': 'normal', 'color': 'grey'},
+        'axis': {'labelFont': 'Arial', 'titleFont': 'Arial', 'labelFontSize': 14, 'titleFontSize': 14,
+                 'titleFontWeight': 'normal', 'titleColor': 'grey'},
+    }
+
+
+def _urban_butcher():
+    return {'config': _theme_config()}
+
+
+def _urban_butcher_deck():
+    config = _theme_config()
+    # the view size of altair's default theme
+    config['view'].update(continuousWidth=300, continuousHeight=300)
+    return {'config': config}
+
+
+def _register(name, theme):
+    # altair >= 5.5 renamed alt.themes to alt.theme
+    if hasattr(alt, 'theme'):
+        alt.theme.register(name, enable=False)(theme)
+    else:
+        alt.themes.register(name, theme)
+
+
+_register(THEME, _urban_butcher)
+_register(DECK_THEME, _urban_butcher_deck)
+
+
+# ---------------------------------------------------- #
+# components (without data)
+
+def _year_axis():
+    return alt.Axis(
+        title="Year",
+        titleColor='grey',
+        titleAnchor='start',
+        labelAngle=0,
+        grid=False,
+        tickColor='grey',
+        format='%Y')
+
+
+@functools.lru_cache(maxsize=None)
+def time_line(x, y, y_title, color, y_domain=None, visible=True):
+    # the base line chart of a slide show; visible=False: only the axes (skeleton)
+    y_scale = alt.Scale(domain=y_domain) if y_domain else alt.Undefined
+    line = alt.Chart().mark_line(color=color).encode(
+        x=alt.X(x + ':T').axis(_year_axis()),
+        y=alt.Y(y + ':Q', scale=y_scale).axis(
+            title=y_title,
+            titleColor='grey',
+            titleAnchor='end',
+            grid=False,
+            tickColor='grey',
+        ),
+        strokeWidth=alt.value(2)
+    ).properties(
+        width=750,
+        height=400
+    )
+    if not visible:
+        line = line.encode(strokeOpacity=alt.value(0))
+    return line
+
+
+# data of a layer that only has datum encodings: one mark, no rows of the frame
+ONE_ROW = alt.Data(values=[{}])
+
+
+def rows(component, df, x, years=None, ends=False):
+    # the component with its own rows: the ones of `years`, or (ends) the first
+    # and the last point in time
+    if ends:
+        df = df.loc[[df[x].idxmin(), df[x].idxmax()], [x]]
+    else:
+        df = df[df[x].dt.year.isin(years)]
+    return component.properties(data=df.reset_index(drop=True))
+
+
+@functools.lru_cache(maxsize=None)
+def point(x, y, color):
+    # big dot on the line, at the rows it gets (rows())
+    return alt.Chart().mark_circle(opacity=1, size=200).encode(
+        x=alt.X(x + ':T'),
+        y=alt.Y(y + ':Q'),
+        color=alt.value(color)
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def dotted_line(value, color, y_domain=None):
+    # horizontal reference line
+    y_scale = alt.Scale(domain=y_domain) if y_domain else alt.Undefined
+    return alt.Chart(ONE_ROW).mark_rule(strokeDash=[12, 6], size=1).encode(
+        y=alt.YDatum(value, type='quantitative', scale=y_scale),
+        color=alt.value(color)
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def label(year, value, text, color, dx=20, dy=0, size=20):
+    # text at (year, value), e.g. '64.13 kg' next to the last point in time
+    return alt.Chart(ONE_ROW).mark_text(
+        align='left',
+        dx=dx,
+        dy=dy,
+        size=size,
+    ).encode(
+        x=alt.XDatum(alt.DateTime(year=year), type='temporal'),
+        y=alt.YDatum(value, type='quantitative'),
+        color=alt.value(color),
+        text=alt.value(text)
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def value_label(x, y, color, dx=0, size=20):
+    # the value of the line as text, at the rows it gets (rows())
+    return alt.Chart().mark_text(
+        align='left',
+        dx=dx,
+        size=size,
+    ).encode(
+        x=alt.X(x + ':T'),
+        y=alt.Y(y + ':Q'),
+        color=alt.value(color),
+        text=alt.Text(y + ':Q')
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def band(x, low, high, color):
+    # area between two reference values, over the time range of its rows (rows(..., ends=True))
+    return alt.Chart().mark_area(opacity=0.2, color=color).encode(
+        x=alt.X(x + ':T'),
+        y=alt.YDatum(low, type='quantitative'),
+        y2=alt.Y2Datum(high)
+    )
+
+
+# ---------------------------------------------------- #
+# charts
+
+# label positions (dx, dy): right of the last year (deck), inside the plot (app);
+# the max label of step 5 is grey in the deck and stays blue in the app
+LABEL_STYLES = {
+    'right': {'value': (20, 0), 'text': (20, -40), 'max color': dark_grey},
+    'inside': {'value': (-70, 18), 'text': (-115, -35), 'max color': blue_highlight},
+}
+
+CONSUMPTION_DOMAIN = (40, 75)
+
+
+def consumption_chart(df_consumption, step, labels='right'):
+    # slide show of the meat consumption in Germany
+    # step 0: skeleton, 1: line, 2: grey line + point 2011, 3: + max line,
+    # 4: + point 2021, 5: + min line, 6: area between min and max
+    x, y = 'Year', 'Consumption per Person'
+    df = aggregates.columns(df_consumption, x, y)
+
+    # reference values and label texts computed in pandas
+    latest = int(df_consumption[x].max().year)
+    high = float(df_consumption['MaxConsumption'].iloc[0])
+    low = float(df_consumption['MinConsumption'].iloc[0])
+    (value_dx, value_dy), (text_dx, text_dy) = LABEL_STYLES[labels]['value'], LABEL_STYLES[labels]['text']
+
+    def max_line(color):
+        return dotted_line(high, color, CONSUMPTION_DOMAIN)
+
+    def min_line(color):
+        return dotted_line(low, color, CONSUMPTION_DOMAIN)
+
+    def point_in(year, color):
+        return rows(point(x, y, color), df, x, [year])
+
+    # Max // adding +kg with the help of Copilot
+    def value(number, color):
+        return label(latest, number, aggregates.js_number(number) + ' kg', color, value_dx, value_dy)
+
+    line = time_line(x, y, 'Consumption per Person in kg', blue_highlight, CONSUMPTION_DOMAIN, step > 0)
+    if step <= 1:
+        return alt.layer(line, data=df)
+
+    line = time_line(x, y, 'Consumption per Person in kg', dark_grey, CONSUMPTION_DOMAIN)
+    layers = {
+        # line chart with grey line and blue point
+        2: [line, point_in(2011, blue_highlight)],
+        3: [line, point_in(2011, blue_highlight), max_line(blue_highlight), value(high, blue_highlight)],
+        # 2 points, max line grey
+        4: [line, point_in(2011, dark_grey), max_line(dark_grey), point_in(2021, blue_highlight),
+            value(high, dark_grey)],
+        5: [line, point_in(2011, dark_grey), max_line(dark_grey), point_in(2021, blue_highlight),
+            min_line(blue_highlight), value(high, LABEL_STYLES[labels]['max color']), value(low, blue_highlight)],
+        6: [line, rows(band(x, low, high, blue_highlight), df, x, ends=True), max_line(blue_highlight),
+            min_line(blue_highlight), label(latest, low, "- 7.34 kg", blue_highlight, text_dx, text_dy, 30)],
+    }
+    return alt.layer(*layers[step], data=df)
+
+
+def founded_chart(df_founded, step):
+    # step 1: line, 2: grey line + point and label for 2019 (most companies founded)
+    x, y = 'Year Founded', 'Number of Companies Founded'
+    df = aggregates.columns(df_founded, x, y)
+
+    if step == 1:
+        return alt.layer(time_line(x, y, y, blue_highlight), data=df)
+    return alt.layer(time_line(x, y, y, dark_grey), rows(point(x, y, blue_highlight), df, x, [2019]),
+                     rows(value_label(x, y, blue_highlight, dx=-55), df, x, [2019]), data=df)
+
+
+@functools.lru_cache(maxsize=None)
+def _trend_line(y, title, color, y_domain=None, title_angle=None, title_x=None):
+    y_scale = alt.Scale(domain=y_domain) if y_domain else alt.Undefined
+    return alt.Chart().mark_line(stroke=color).encode(
+        x=alt.X('Year:T').axis(
+            grid=False,
+            titleColor='grey',
+            titleAnchor='start'),
+        y=alt.Y(y + ':Q', scale=y_scale).axis(
+            title=title,
+            titleColor=color,
+            grid=False,
+            titleAnchor='end',
+            titleAngle=title_angle if title_angle is not None else alt.Undefined,
+            titleX=title_x if title_x is not None else alt.Undefined,
+        ),
+        strokeWidth=alt.value(2)
+    ).properties(
+        width=750,
+        height=400
+    )
+
+
+def trend_chart(df_merged, consumption_color, founded_color):
+    # double axis chart like https://altair-viz.github.io/gallery/layered_chart_with_dual_axis.html
+    df = aggregates.columns(df_merged, 'Year', 'Consumption per Person', 'Number of Companies Founded')
+
+    line_consumption = _trend_line('Consumption per Person', 'Consumption of Meat per Person in Germany (kg)',
+                                   consumption_color, CONSUMPTION_DOMAIN, 270, 50)
+    line_founded = _trend_line('Number of Companies Founded', 'Number of Companies Founded', founded_color)
+
+    return alt.layer(line_founded, line_consumption, data=df).resolve_scale(
+        y='independent'
+    )
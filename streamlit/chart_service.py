@@ -0,0 +1,361 @@
+# Local HTTP service for the charts of the app, without Streamlit
+#
+# Serves every chart of charts.CHARTS (the charts of urban-butcher.py) in every
+# state the app can show, as Vega-Lite JSON, SVG or PNG:
+#
+#     GET /charts                                          chart names and their parameters
+#     GET /chart/impact?product_type=plant&impact=Emissions,Land%20Use&format=svg
+#     GET /chart/nu?product_type=animal&format=png
+#     GET /chart/meat?slide=3
+#     GET /chart/map?format=svg
+#
+# product_type (animal, plant, all) is the sidebar highlight of the app, impact
+# the selected impact types, slide the slide of the meat chart.
+#
+# - The specs come from chart_cache (prebuilt by export.py or built once per
+#   process); images are rendered with vl-convert in a pool of WORKERS threads,
+#   the request threads only wait for them. Requests for the same image while it
+#   is rendered share one render.
+# - Every response is also written to a cache directory on disk, bounded to
+#   URBAN_BUTCHER_RENDER_CACHE_MB (least recently used files are removed first),
+#   so a restarted service does not render again.
+# - The ETag of a response is a hash of the chart code, the content of its
+#   datasets, the parameters and the format (chart_cache.export_key). Clients
+#   that send it back in If-None-Match get a 304 without anything being built;
+#   after a data change the ETag changes.
+# - Nothing is fetched from the network: the reference data comes from the
+#   store or its cached copy (reference_data.OFFLINE), and vl-convert may not
+#   load external data. Without code/reference-data/world-110m.json the map is
+#   only available as JSON.
+#
+#     python chart_service.py                  # http://127.0.0.1:8502
+#     python chart_service.py --port 9000 --workers 4
+
+import argparse
+import hashlib
+import importlib.metadata
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import chart_cache
+import charts
+import reference_data
+
+try:
+    import vl_convert as vlc
+except ImportError:
+    vlc = None
+
+FORMATS = {
+    'json': 'application/json',
+    'svg': 'image/svg+xml',
+    'png': 'image/png',
+}
+
+# parameters of the charts, the others have none
+PARAMETERS = {
+    'impact': ['product_type', 'impact'],
+    'nu': ['product_type'],
+    'meat': ['slide'],
+}
+
+# product_type -> (is_animal, is_plant) of the sidebar checkboxes
+PRODUCT_TYPES = {'all': (False, False), 'animal': (True, False), 'plant': (False, True)}
+
+WORKERS = int(os.environ.get('URBAN_BUTCHER_RENDER_WORKERS') or os.cpu_count() or 1)
+RENDER_CACHE = reference_data.CACHE_DIR / 'renders'
+MAX_CACHE_BYTES = int(float(os.environ.get('URBAN_BUTCHER_RENDER_CACHE_MB', '100')) * 1024 * 1024)
+
+_lock = threading.Lock()
+_rendering = {}        # etag -> future of the render in progress
+_pool = None
+_stats = {'requests': 0, 'not modified': 0, 'shared': 0, 'disk': 0, 'rendered': 0}
+
+
+class NotFound(Exception):
+    pass
+
+
+# ---------------------------------------------------- #
+# request -> chart state
+
+def _allowed(name):
+    # the parameters of a chart and their values, for the error messages
+    values = {'product_type': ', '.join(PRODUCT_TYPES),
+              'impact': ', '.join(charts.IMPACT_TYPES) + ' (comma separated, or none)',
+              'slide': f'1 to {len(charts.states("meat"))}'}
+    return '; '.join(f'{parameter}: {values[parameter]}' for parameter in PARAMETERS.get(name, [])) or 'none'
+
+
+def _single(query, key, default):
+    values = query.get(key, [default])
+    if len(values) != 1:
+        raise ValueError(f'{key} given more than once')
+    return values[0]
+
+
+def _impact_types(query):
+    # 'Emissions,Land Use', also repeated (impact=...&impact=...) and as 'land-use'
+    names = {t.lower(): t for t in charts.IMPACT_TYPES}
+    selected = set()
+    for value in query.get('impact', []):
+        for part in value.split(','):
+            name = part.strip().lower().replace('-', ' ')
+            if name not in names:
+                raise ValueError(f'impact: unknown impact type {part!r}, one of {", ".join(charts.IMPACT_TYPES)}')
+            selected.add(names[name])
+    # same order as in the app
+    return tuple(t for t in charts.IMPACT_TYPES if t in selected)
+
+
+def chart_state(name, query):
+    # the argument tuple of the chart builder; NotFound / ValueError for a bad request
+    if name not in charts.CHARTS:
+        raise NotFound(f'no chart {name!r}, one of {", ".join(charts.CHARTS)}')
+    unknown = set(query) - set(PARAMETERS.get(name, [])) - {'format'}
+    if unknown:
+        raise ValueError(f'{name} has no parameter {", ".join(sorted(unknown))} (parameters: {_allowed(name)})')
+
+    product_type = _single(query, 'product_type', 'all')
+    if product_type not in PRODUCT_TYPES:
+        raise ValueError(f'product_type must be one of {", ".join(PRODUCT_TYPES)}')
+    opacity = charts.opacity_range(*PRODUCT_TYPES[product_type])
+
+    if name == 'impact':
+        state = (opacity, _impact_types(query))
+    elif name == 'nu':
+        state = (opacity,)
+    elif name == 'meat':
+        try:
+            state = (int(_single(query, 'slide', '1')),)
+        except ValueError:
+            raise ValueError(f'slide must be a number from {_allowed(name)[len("slide: "):]}') from None
+        if state not in charts.states(name):
+            raise ValueError(f'slide must be between 1 and {len(charts.states(name))}')
+    else:
+        state = ()
+    if state not in charts.states(name):
+        # every parameter is checked above; this is a combination the app does not have
+        raise ValueError(f'{name} has no chart for these parameters ({_allowed(name)})')
+    return state
+
+
+def etag(name, state, fmt):
+    # strong ETag: chart code + data of the chart + parameters + format (+ renderer)
+    entry = 'app/' + chart_cache.export_name(name, state)
+    key = chart_cache.export_key(entry, charts.CHARTS[name][1]) + fmt
+    if fmt != 'json':
+        key += importlib.metadata.version('vl-convert-python')
+    return '"' + hashlib.sha256(key.encode()).hexdigest()[:32] + '"'
+
+
+# ---------------------------------------------------- #
+# disk cache
+
+def _cache_path(tag, fmt):
+    return RENDER_CACHE / (tag.strip('"') + '.' + fmt)
+
+
+def _cache_read(path):
+    try:
+        content = path.read_bytes()
+    except FileNotFoundError:
+        return None
+    # the access time decides what is removed first
+    os.utime(path)
+    return content
+
+
+def _cache_write(path, content):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f'{path.name}.{threading.get_ident()}.tmp')
+    tmp.write_bytes(content)
+    tmp.replace(path)
+
+    # least recently used files first, until the cache fits
+    files = []
+    for file in RENDER_CACHE.iterdir():
+        if file.suffix != '.tmp':
+            stat = file.stat()
+            files.append((stat.st_mtime_ns, stat.st_size, file))
+    size = sum(file_size for _, file_size, _ in files)
+    for _, file_size, file in sorted(files):
+        if size <= MAX_CACHE_BYTES:
+            break
+        file.unlink(missing_ok=True)
+        size -= file_size
+
+
+# ---------------------------------------------------- #
+# rendering
+
+def _render(name, state, fmt):
+    spec = chart_cache.get(name, *state)
+    if spec is None:
+        raise NotFound(f'not enough data for {name} with these parameters')
+    if fmt == 'json':
+        return json.dumps(spec).encode()
+    if vlc is None:
+        raise RuntimeError(f'no {fmt} without vl-convert-python (pip install vl-convert-python)')
+    # allowed_base_urls=[]: no data is loaded from the network
+    try:
+        if fmt == 'svg':
+            return vlc.vegalite_to_svg(spec, allowed_base_urls=[]).encode()
+        return vlc.vegalite_to_png(spec, scale=2, allowed_base_urls=[])
+    except ValueError as e:
+        # e.g. the map without world-110m.json, its data would be fetched by url
+        lines = str(e).splitlines()
+        reason = lines[1].strip() if len(lines) > 1 else str(e)
+        raise RuntimeError(f'{name} as {fmt} failed: {reason}') from None
+
+
+def _render_cached(name, state, fmt, tag):
+    path = _cache_path(tag, fmt)
+    content = _cache_read(path)
+    if content is not None:
+        _count('disk')
+        return content
+    content = _render(name, state, fmt)
+    _cache_write(path, content)
+    _count('rendered')
+    return content
+
+
+def _count(stat):
+    with _lock:
+        _stats[stat] += 1
+
+
+def render(name, state, fmt, tag):
+    # content of the chart; one render per etag at a time, in the pool
+    with _lock:
+        future = _rendering.get(tag)
+        if future is None:
+            future = _pool.submit(_render_cached, name, state, fmt, tag)
+            _rendering[tag] = future
+            future.add_done_callback(lambda _: _done(tag))
+        else:
+            _stats['shared'] += 1
+    return future.result()
+
+
+def _done(tag):
+    with _lock:
+        _rendering.pop(tag, None)
+
+
+def start(workers=WORKERS):
+    global _pool
+    reference_data.OFFLINE = True
+    _pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='render')
+
+
+def stats():
+    with _lock:
+        return dict(_stats)
+
+
+# ---------------------------------------------------- #
+# HTTP
+
+def catalogue():
+    return {name: {'parameters': PARAMETERS.get(name, []), 'states': len(charts.states(name)),
+                   'formats': list(FORMATS)} for name in charts.CHARTS}
+
+
+class Handler(BaseHTTPRequestHandler):
+    server_version = 'UrbanButcherCharts/1.0'
+
+    def do_HEAD(self):
+        self._respond(body=False)
+
+    def do_GET(self):
+        self._respond(body=True)
+
+    def _respond(self, body):
+        start_time = time.perf_counter()
+        _count('requests')
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        try:
+            if url.path == '/charts':
+                return self._send(HTTPStatus.OK, 'json', json.dumps(catalogue()).encode(), body=body)
+            if not url.path.startswith('/chart/'):
+                raise NotFound(f'no page {url.path}, see /charts')
+            name = url.path[len('/chart/'):]
+            state = chart_state(name, query)
+            fmt = _single(query, 'format', 'json')
+            if fmt not in FORMATS:
+                raise ValueError(f'format must be one of {", ".join(FORMATS)}')
+
+            tag = etag(name, state, fmt)
+            if tag in self._if_none_match():
+                _count('not modified')
+                return self._send(HTTPStatus.NOT_MODIFIED, fmt, b'', tag, body=False)
+            content = render(name, state, fmt, tag)
+            self._send(HTTPStatus.OK, fmt, content, tag, body=body)
+        except NotFound as e:
+            self._error(HTTPStatus.NOT_FOUND, e, body)
+        except ValueError as e:
+            self._error(HTTPStatus.BAD_REQUEST, e, body)
+        except Exception as e:
+            self._error(HTTPStatus.INTERNAL_SERVER_ERROR, e, body)
+        finally:
+            self.log_message('%s %.1f ms', self.path, (time.perf_counter() - start_time) * 1000)
+
+    def _if_none_match(self):
+        header = self.headers.get('If-None-Match', '')
+        return [tag.strip() for tag in header.split(',')]
+
+    def _send(self, status, fmt, content, tag=None, body=True):
+        self.send_response(status)
+        if status != HTTPStatus.NOT_MODIFIED:
+            self.send_header('Content-Type', FORMATS[fmt])
+            self.send_header('Content-Length', str(len(content)))
+        if tag:
+            self.send_header('ETag', tag)
+            # always ask again, the answer is a 304 as long as nothing changed
+            self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        if body:
+            self.wfile.write(content)
+
+    def _error(self, status, error, body):
+        message = str(error).splitlines()[0] if str(error) else type(error).__name__
+        self._send(status, 'json', json.dumps({'error': message}).encode(), body=body)
+
+    def log_request(self, code='-', size='-'):
+        # one line per request from _respond (with the time) instead
+        pass
+
+
+def serve(host='127.0.0.1', port=8502, workers=WORKERS):
+    start(workers)
+    server = ThreadingHTTPServer((host, port), Handler)
+    print(f'charts on http://{host}:{server.server_port}/charts ({workers} render workers, cache {RENDER_CACHE})')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        _pool.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='HTTP service for the charts of the app (json, svg, png).')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8502)
+    parser.add_argument('--workers', type=int, default=WORKERS, help=f'render threads (default: {WORKERS})')
+    args = parser.parse_args()
+    serve(args.host, args.port, args.workers)
+
+
+if __name__ == '__main__':
+    main()
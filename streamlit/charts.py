@@ -0,0 +1,261 @@
+# Chart definitions of the Streamlit app
+#
+# Every chart is built by a function that only depends on the loaded data and
+# on the sidebar state it needs. This lets chart_cache build each chart once
+# per distinct state instead of on every rerun.
+#
+# Altair and chart_library are imported inside the builders: with the prebuilt
+# specs (export.py, snapshot.py) the app never builds a chart, and a cold start
+# does not import Altair at all.
+
+import itertools
+
+import aggregates
+import data_loader
+import geometry
+import reference_data
+
+
+red_scale = ['#F9CEDB', '#C55979',  '#81072B']
+
+IMPACT_TYPES = ['Emissions', 'Land Use', 'Water Use']
+
+
+# opacity range for [Animal Products, Plants] based on the sidebar checkboxes
+def opacity_range(is_animal, is_plant):
+    if is_plant and not is_animal:
+        return (0.2, 1)
+    if is_animal and not is_plant:
+        return (1, 0.2)
+    return (1, 1)
+
+
+def _product_opacity(domain, opacity):
+    import altair as alt
+    return alt.Scale(domain=domain, range=list(opacity))
+
+
+# ---------------------------------------------------- #
+# Pie Chart GHG Emmisions of Food
+
+def pie_chart():
+    import altair as alt
+    from chart_library import blue_highlight, dark_grey
+
+    df_food = data_loader.load_food()
+
+    # Colors for food and non-food
+    GHG_TYPE = df_food['Category'].cat.categories.to_list()
+
+    colors = alt.Scale(
+        domain=GHG_TYPE,
+        range=[blue_highlight, dark_grey]
+    )
+
+    # Plot Pie Chart
+    pie_base = alt.Chart(df_food).encode(
+        alt.Theta("Percent:Q").stack(True),
+        alt.Color("Category:N", scale=colors).legend(None),
+        alt.Tooltip(['Category', 'Emissions'])
+    )
+
+    pie = pie_base.mark_arc(outerRadius=120)
+    pie_text = pie_base.mark_text(radius=160, size=16).encode(text="Category:N")
+
+    return pie + pie_text
+
+
+# --------------------------------------------------- #
+# Meat Consumption in Germany
+
+# slide of the app -> step of chart_library.consumption_chart
+MEAT_STEPS = {1: 1, 2: 3, 3: 5, 4: 6}
+
+
+def meat_chart(slide):
+    import chart_library
+    return chart_library.consumption_chart(data_loader.load_consumption(), MEAT_STEPS[slide], labels='inside')
+
+
+# -----------------------------------------------------------------------------------#
+# Environmental Impact of Food: Emissions and Land Use per weight
+
+def impact_chart(opacity, impact_types):
+    import altair as alt
+    from chart_library import blue_highlight, dark_red, sage_green
+
+    df_streamlit = data_loader.load_streamlit()
+
+    IMPACT_TYPE = df_streamlit['Impact Type'].cat.categories.to_list()
+
+    impact_colors = alt.Scale(
+        domain=IMPACT_TYPE,
+        range=[dark_red, sage_green, blue_highlight]
+    )
+
+    PRODUCT_TYPE = df_streamlit['Product Type'].cat.categories.to_list()
+    product_opacity = _product_opacity(PRODUCT_TYPE, opacity)
+
+    # Help from Copilot
+    if impact_types:
+        df_filtered = df_streamlit[df_streamlit['Impact Type'].isin(impact_types)]
+    else:
+        df_filtered = df_streamlit
+
+    # None -> the app shows "Not enough data to create chart."
+    if df_filtered['Impact'].nunique() <= 1:
+        return None
+
+    # Plotting Bar Chart
+    return alt.Chart(df_filtered).mark_bar(cornerRadiusTopRight=10, cornerRadiusBottomRight=10).encode(
+        x=alt.X('Impact:Q', scale=alt.Scale(domain=[df_filtered['Impact'].min(), df_filtered['Impact'].max()])).sort('-y').axis(
+            labelAngle=0,
+            titleAnchor='start',
+            title='Median Impact per 1kg/ 1l'),
+        y=alt.Y('Impact Type:N', title=None).axis(
+            labels=False,
+            titleAnchor='end',
+            grid=False),
+        opacity=alt.Opacity(
+            'Product Type:N', scale=product_opacity, legend=None),
+        color=alt.Color('Impact Type:N', scale=impact_colors)
+    ).facet(
+        row=alt.Row('Product:N', title=None, header=alt.Header(
+            labelAngle=0, labelAlign='left')),
+        spacing=5,  # Set facet label angle to 45 degrees
+    )
+
+
+# ----------------------------------------------------------------------------------#
+# Environmental Impact of Food: Emissions per 100g Protein
+
+def nu_chart(opacity):
+    import altair as alt
+    from chart_library import dark_red, sage_green
+
+    # only the columns the bars and points use (not 10th/90th pctl, Mean, Compare)
+    df_nu = aggregates.columns(data_loader.load_nu(), 'Product', 'Product Type', '5th pctl', '95th pctl', 'Median')
+
+    # defining color and opacity ranges
+    PRODUCT_TYPE_NU = df_nu['Product Type'].cat.categories.to_list()
+
+    product_colors = alt.Scale(
+        domain=PRODUCT_TYPE_NU,
+        range=[dark_red, sage_green]
+    )
+
+    product_opacity = _product_opacity(PRODUCT_TYPE_NU, opacity)
+
+    # points for mean value - highlighted for comparison
+    # for streamlit -> opacity is not set for cloumn 'Compare', but for 'Product Type' to match chart with weight
+    median_points_highlighted = alt.Chart(df_nu).mark_point(filled=False, color='black', size=200).encode(
+        x=alt.X('Median:Q'),
+        opacity=alt.Opacity('Product Type:N', scale=product_opacity, legend=None),
+        y=alt.Y('Product:N'),
+        tooltip=['Median:Q', 'Product:N']
+    )
+
+    # plotting range bar chart
+
+    # final -> product_colors and opacity are applied
+    bar_nu_final = alt.Chart(df_nu).mark_bar(cornerRadius=10, height=20).encode(
+        x=alt.X('5th pctl:Q').scale(domain=[0, 140]).title(
+            'GHG Emissions (kg CO2eq)'),
+        x2='95th pctl:Q',
+        y=alt.Y('Product:N', axis=alt.Axis(
+            title='Per 100g protein...', titleAngle=0, titleY=-5)),
+        color=alt.Color('Product Type:N', scale=product_colors),
+        opacity=alt.Opacity('Product Type:N', scale=product_opacity, legend=None)
+    ).properties(
+        width=720,
+        height=500
+    )
+
+    return bar_nu_final + median_points_highlighted
+
+
+# -------------------------------------------------#
+# Alternative Protein Companies
+
+def merged_chart():
+    import chart_library
+    return chart_library.trend_chart(data_loader.load_merged(), chart_library.blue_highlight, chart_library.dark_red)
+
+
+# -------------------------------------------------#
+# Alternative Protein Companies - COUNTRIES
+
+def map_chart():
+    import altair as alt
+
+    df_country = data_loader.load_country()
+
+    ## ----!!! Source: https://github.com/bast/altair-geographic-plots/blob/main/choropleth.ipynb  ---- ##
+
+    # country name -> ISO 3166-1 numeric -> number of companies, joined in pandas
+    # (reference data is vendored in code/reference-data, no download at runtime)
+    df_country_map = reference_data.company_counts_by_code(df_country)
+
+    # the countries of the view, projected and simplified in advance (geometry.py)
+    countries, projection = geometry.countries()
+
+    # one layer: countries without companies keep the background color
+    # (invalid=None: they are not filtered out after the lookup)
+    return (
+        alt.Chart(countries)
+        .mark_geoshape(invalid=None)
+        .transform_lookup(
+            lookup="id",
+            from_=alt.LookupData(data=df_country_map, key="id", fields=[
+                                 "name", "Number of Companies per Country"]),
+        )
+        .encode(
+            fill=alt.condition(
+                "!isValid(datum['Number of Companies per Country'])",
+                alt.value("lightgray"),
+                alt.Color(
+                    "Number of Companies per Country:Q",
+                    scale=alt.Scale(range=red_scale),
+                    title="Number of Companies"
+                )
+            ),
+            tooltip=[alt.Tooltip('name:N', title='Country'), alt.Tooltip(
+                'Number of Companies per Country:Q', title='Number of Companies')]
+        )
+        .properties(width=geometry.VIEW.width, height=geometry.VIEW.height)
+        .project(**projection)
+    )
+
+
+# ---------------------------------------------------- #
+# registry: chart name -> (builder, datasets it depends on)
+
+CHARTS = {
+    'pie': (pie_chart, ['food']),
+    'meat': (meat_chart, ['consumption']),
+    'impact': (impact_chart, ['streamlit']),
+    'nu': (nu_chart, ['nu']),
+    'merged': (merged_chart, ['merged']),
+    'map': (map_chart, ['country']),
+}
+
+# charts with the look of the slides (chart_library.THEME), the others have no theme
+THEMES = {
+    'meat': 'urban-butcher',
+    'merged': 'urban-butcher',
+}
+
+
+def states(name):
+    # every distinct argument tuple a chart can be built with
+    opacities = sorted({opacity_range(a, p) for a in (False, True) for p in (False, True)})
+    impact_subsets = [tuple(c) for n in range(len(IMPACT_TYPES) + 1)
+                      for c in itertools.combinations(IMPACT_TYPES, n)]
+
+    if name == 'meat':
+        return [(slide,) for slide in range(1, 5)]
+    if name == 'impact':
+        return [(opacity, subset) for opacity in opacities for subset in impact_subsets]
+    if name == 'nu':
+        return [(opacity,) for opacity in opacities]
+    return [()]
@@ -0,0 +1,379 @@
+# Data layer for the Streamlit app and the presentation
+#
+# Streamlit re-executes urban-butcher.py on every widget interaction, but
+# imported modules stay in memory. The frames loaded here are therefore kept
+# once per process and shared by all sessions. A file is only read again when
+# its mtime/size changes AND its content hash differs from the cached version.
+#
+# The pipeline (code/pipeline) writes a typed .feather copy next to every csv,
+# with the datetime and category columns already converted. It is preferred
+# (memory-mapped) if it is at least as new as the csv; otherwise, or without
+# pyarrow, the csv is read. The content hash is always the one of the csv, so
+# the keys derived from it (chart_cache, export.py, snapshot.py) do not change
+# when only the mtimes decide for the other file, e.g. after a git checkout.
+#
+# The frames are shared by all sessions and must never change: pandas runs in
+# copy-on-write mode, so a chart that filters or assigns to a frame gets its own
+# copy and the cached frame stays as it is. Numbers are stored in the smallest
+# type that holds every value exactly (float32, int8/int16, ...), repeated
+# strings as categories (memory.py: the bytes per frame and per session).
+#
+#     python data_loader.py      # load time and memory per frame, csv vs. feather
+
+import hashlib
+import os
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import metrics
+
+# shared frames are read-only for their users (pandas >= 1.5)
+pd.set_option('mode.copy_on_write', True)
+
+try:
+    import pyarrow.feather as feather
+except ImportError:
+    feather = None
+
+
+# paths are resolved relative to this file, not to the working directory;
+# URBAN_BUTCHER_DATA points to another directory, e.g. synthetic data of the benchmarks
+CLEANED_DATA = Path(os.environ.get('URBAN_BUTCHER_DATA')
+                    or Path(__file__).resolve().parent.parent / 'code' / 'cleaned-data')
+
+_lock = threading.Lock()
+_loading = {}      # name -> lock held while the frame is (re)built, so different frames load in parallel
+_cache = {}        # name -> {'files': ..., 'signature': ..., 'hash': ..., 'frame': ...}
+_stats = {'hits': 0, 'misses': 0, 'reads': 0}
+_prefer_typed = feather is not None     # False -> always read the csv files
+_compact = True                         # False -> keep the types as read (for the report)
+
+
+# ---------------------------------------------------- #
+# helpers
+
+def _signature(path):
+    # cheap check without reading the file
+    stat = path.stat()
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def _file_hash(path):
+    sha = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 16), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def _source(path):
+    # the typed copy of a csv, if there is an up to date one
+    typed_path = path.with_suffix('.feather')
+    if (_prefer_typed and typed_path.exists()
+            and typed_path.stat().st_mtime_ns >= path.stat().st_mtime_ns):
+        return typed_path
+    return path
+
+
+def _read(path):
+    if path.suffix == '.feather':
+        return feather.read_table(path, memory_map=True).to_pandas()
+    return pd.read_csv(path)
+
+
+def compact(df):
+    # lossless downcasts, in place: float64 -> float32 if every value survives the
+    # round trip, integers -> smallest integer type, repeated strings -> category
+    for column in df.columns:
+        values = df[column]
+        if pd.api.types.is_float_dtype(values) and values.dtype != np.float32:
+            small = values.astype(np.float32)
+            if np.array_equal(small.to_numpy(dtype=np.float64), values.to_numpy(dtype=np.float64), equal_nan=True):
+                df[column] = small
+        elif pd.api.types.is_integer_dtype(values) and not pd.api.types.is_bool_dtype(values):
+            df[column] = pd.to_numeric(values, downcast='integer')
+        elif values.dtype == object and values.nunique() < len(values) / 2:
+            df[column] = values.astype('category')
+    return df
+
+
+def _count(stat, n=1):
+    with _lock:
+        _stats[stat] += n
+
+
+def _current(files):
+    # the files read for a frame and their signature
+    paths = [_source(CLEANED_DATA / f) for f in files]
+    return paths, tuple(_signature(p) for p in paths)
+
+
+def _cached(name, files, prepare):
+    # return the frame for `name`, (re)building it with prepare() if one of the
+    # source files changed since the last call
+    paths, signature = _current(files)
+
+    with _lock:
+        loading = _loading.setdefault(name, threading.Lock())
+
+    # a second caller of the same frame waits here and then gets the cached frame
+    with loading:
+        entry = _cache.get(name)
+        if entry is not None and entry['signature'] == signature:
+            _count('hits')
+            return entry['frame']
+
+        # mtime changed -> only reload if the content really changed
+        content_hash = tuple(_file_hash(CLEANED_DATA / f) for f in files)
+        if entry is not None and entry['hash'] == content_hash:
+            entry['signature'] = signature
+            _count('hits')
+            return entry['frame']
+
+        _count('misses')
+        _count('reads', len(paths))
+        with metrics.part('pandas'):
+            frame = prepare(*paths)
+            if _compact:
+                frame = compact(frame)
+        with _lock:
+            _cache[name] = {'files': files, 'signature': signature,
+                            'hash': content_hash, 'frame': frame}
+        return frame
+
+
+# ---------------------------------------------------- #
+# frames used by urban-butcher.py and praesi.qmd
+# (the conversions are no-ops if the frame comes from a .feather file)
+
+def _prepare_food(path):
+    df = _read(path)
+    df['Category'] = df['Category'].astype('category')
+    return df
+
+
+def _prepare_consumption(path):
+    df = _read(path)
+    df['Year'] = pd.to_datetime(df['Year'], format='%Y-%m-%d')
+    return df
+
+
+def _prepare_impact(path):
+    df = _read(path)
+    df['Impact Type'] = df['Impact Type'].astype('category')
+    df['Product Type'] = df['Product Type'].astype('category')
+    return df
+
+
+def _prepare_nu(path):
+    df = _read(path)
+    df['Product'] = df['Product'].astype('category')
+    df['Product Type'] = df['Product Type'].astype('category')
+    df['Compare'] = df['Compare'].astype('category')
+    return df
+
+
+def _prepare_catalogue(path):
+    df = _read(path)
+    for column in ['Product', 'Impact Category', 'Unit', 'Product Type']:
+        df[column] = df[column].astype('category')
+    return df
+
+
+def _prepare_distribution(path):
+    df = _read(path)
+    for column in ['Product', 'Impact Category', 'Unit', 'Product Type']:
+        df[column] = df[column].astype('category')
+    return df
+
+
+def _prepare_founded(path):
+    df = _read(path)
+    df['Year Founded'] = pd.to_datetime(df['Year Founded'], format='%Y-%m-%d')
+    return df
+
+
+def _prepare_merged(consumption_path, founded_path):
+    # merge df_consumption and df_founded where "Year" == "Year Founded"
+    df_merged = pd.merge(_prepare_consumption(consumption_path), _prepare_founded(founded_path),
+                         left_on='Year', right_on='Year Founded')
+
+    # delete column Year Founded, otherwise it is double
+    return df_merged.drop('Year Founded', axis=1)
+
+
+def load_food():
+    return _cached('food', ['environmental-impact-food.csv'], _prepare_food)
+
+
+def load_consumption():
+    return _cached('consumption', ['versorgungsbilanz-fleisch.csv'], _prepare_consumption)
+
+
+def load_streamlit():
+    return _cached('streamlit', ['environmental-impact-streamlit.csv'], _prepare_impact)
+
+
+def load_weight():
+    return _cached('weight', ['environmental-impact-weight.csv'], _prepare_impact)
+
+
+def load_nu():
+    return _cached('nu', ['environmental-impact-nu.csv'], _prepare_nu)
+
+
+def load_catalogue():
+    # every product of Poore & Nemecek, all impact categories (catalogue.py)
+    return _cached('catalogue', ['environmental-impact-catalogue.csv'], _prepare_catalogue)
+
+
+def load_distribution():
+    # percentiles of GHG, land and water use per product (simulator.py)
+    return _cached('distribution', ['environmental-impact-distribution.csv'], _prepare_distribution)
+
+
+def load_founded():
+    return _cached('founded', ['alt-protein-founded.csv'], _prepare_founded)
+
+
+def load_merged():
+    return _cached('merged', ['versorgungsbilanz-fleisch.csv', 'alt-protein-founded.csv'], _prepare_merged)
+
+
+def load_country():
+    return _cached('country', ['alt-protein-country.csv'], _read)
+
+
+def load_overall():
+    # one row per plant-based company (company explorer page)
+    return _cached('overall', ['alt-protein-overall.csv'], _read)
+
+
+LOADERS = {
+    'food': load_food,
+    'consumption': load_consumption,
+    'streamlit': load_streamlit,
+    'weight': load_weight,
+    'nu': load_nu,
+    'catalogue': load_catalogue,
+    'distribution': load_distribution,
+    'founded': load_founded,
+    'merged': load_merged,
+    'country': load_country,
+    'overall': load_overall,
+}
+
+
+def content_hash(name):
+    # content hash of the csv file(s) of a frame, e.g. to key derived caches
+    LOADERS[name]()
+    with _lock:
+        return _cache[name]['hash']
+
+
+def cached_hash(name):
+    # content hash of the frame as loaded now, without checking the files (None if not loaded)
+    with _lock:
+        entry = _cache.get(name)
+        return None if entry is None else entry['hash']
+
+
+def stale():
+    # name -> new signature, of the loaded frames whose files changed on disk
+    # (mtime/size only, nothing is read; live_reload.py)
+    with _lock:
+        loaded = {name: (entry.get('files'), entry['signature']) for name, entry in _cache.items()}
+    result = {}
+    for name, (files, signature) in loaded.items():
+        if files is None:
+            continue
+        try:
+            _, current = _current(files)
+        except FileNotFoundError:
+            # replaced right now, seen again at the next check
+            continue
+        if current != signature:
+            result[name] = current
+    return result
+
+
+# ---------------------------------------------------- #
+# snapshot (snapshot.py)
+
+def frames():
+    # name -> frame, of the frames loaded so far
+    with _lock:
+        return {name: entry['frame'] for name, entry in _cache.items()}
+
+
+def cache_entries():
+    # name -> cache entry of every frame, loaded if needed
+    for loader in LOADERS.values():
+        loader()
+    with _lock:
+        return {name: dict(entry) for name, entry in _cache.items()}
+
+
+def restore(entries):
+    # frames of a snapshot; _cached() still checks them against the files
+    # (mtime/size, else content hash) before it serves them
+    with _lock:
+        for name, entry in entries.items():
+            _cache.setdefault(name, dict(entry))
+
+
+# ---------------------------------------------------- #
+# cache statistics
+
+def cache_stats():
+    # hits: served from memory, misses: frame (re)built, reads: files parsed
+    with _lock:
+        return dict(_stats)
+
+
+def clear_cache():
+    with _lock:
+        _cache.clear()
+        for key in _stats:
+            _stats[key] = 0
+
+
+# ---------------------------------------------------- #
+# load time and memory, csv vs. feather
+
+def _cold_load(loader, typed, compacted=True):
+    global _prefer_typed, _compact
+    prefer_typed, _prefer_typed = _prefer_typed, typed
+    compacted, _compact = _compact, compacted
+    try:
+        clear_cache()
+        start = time.perf_counter()
+        frame = loader()
+        seconds = time.perf_counter() - start
+    finally:
+        _prefer_typed, _compact = prefer_typed, compacted
+        clear_cache()
+    return seconds, frame.memory_usage(deep=True).sum()
+
+
+def report():
+    # kB as read vs. after compact() (from the feather copy if there is pyarrow)
+    print(f"{'frame':<12} {'csv ms':>8} {'csv kB':>8} {'feather ms':>11} {'feather kB':>11} {'compact kB':>11}")
+    for name, loader in LOADERS.items():
+        csv_seconds, csv_bytes = _cold_load(loader, typed=False, compacted=False)
+        _, compact_bytes = _cold_load(loader, typed=feather is not None)
+        if feather is None:
+            print(f"{name:<12} {csv_seconds * 1000:8.1f} {csv_bytes / 1024:8.1f} {'(no pyarrow)':>23}"
+                  f" {compact_bytes / 1024:11.1f}")
+            continue
+        typed_seconds, typed_bytes = _cold_load(loader, typed=True, compacted=False)
+        print(f"{name:<12} {csv_seconds * 1000:8.1f} {csv_bytes / 1024:8.1f}"
+              f" {typed_seconds * 1000:11.1f} {typed_bytes / 1024:11.1f} {compact_bytes / 1024:11.1f}")
+
+
+if __name__ == '__main__':
+    report()
@@ -0,0 +1,215 @@
+# Chart definitions of the Quarto deck (praesi.qmd)
+#
+# The deck shows the charts of the app step by step: an empty skeleton first,
+# then the data, then highlights. Every slide is built by one function call
+# (SLIDES), so export.py can render each slide once into exports/deck instead
+# of praesi.qmd running Python on every render. Pie chart and map are the same
+# as in the app (charts.py), the time series come from chart_library.
+
+import altair as alt
+
+import chart_library
+import charts
+import data_loader
+from chart_library import blue_highlight, dark_grey, dark_red, sage_green
+
+# Order of the Products
+product_order = ['Bovine Meat (beef herd)', 'Bovine Meat (dairy herd)', 'Cheese',
+                 'Pig Meat', 'Poultry Meat', 'Rice', 'Tofu', 'Milk',  'Soymilk', 'Potatoes']
+
+
+# -----------------------------------------------------------------------------------#
+# Environmental Impact of Food: Emissions and Land Use per weight
+
+def impact_slide(step):
+    # step: 'skeleton' (axes only), 'chart', 'highlighted' (plants opaque)
+    df_weight2 = data_loader.load_weight()
+
+    IMPACT_TYPE = df_weight2['Impact Type'].cat.categories.to_list()
+
+    impact_colors = alt.Scale(
+        domain=IMPACT_TYPE,
+        range=[dark_red, sage_green,]
+    )
+
+    PRODUCT_TYPE = df_weight2['Product Type'].cat.categories.to_list()
+
+    product_opacity = alt.Scale(
+        domain=PRODUCT_TYPE,
+        range=[0.25, 1]
+    )
+
+    row = alt.Row('Product:N', sort=product_order, title=None, header=alt.Header(
+        labelAngle=0, labelAlign='left'))
+
+    if step == 'skeleton':
+        return alt.Chart(df_weight2).mark_bar().encode(
+            x=alt.X(scale=alt.Scale(domain=[df_weight2['Impact'].min(), 180])).sort('-y').axis(   # - ist descending
+                labelAngle=0,
+                titleAnchor='start'),
+            opacity=alt.value(0),
+            y=alt.Y('Impact Type:N', title=None).axis(
+                labels=False,
+                titleAnchor='end',
+                grid=False,
+                ticks=False),
+            color=alt.Color('Impact Type:N', scale=impact_colors)
+        ).properties(
+            width=750
+        ).facet(
+            row=row,
+            spacing=5,
+        )
+
+    encoding = dict(
+        x=alt.X('Impact:Q', scale=alt.Scale(domain=[df_weight2['Impact'].min(), 180])).sort('-y').axis(   # - ist descending
+            labelAngle=0,
+            titleAnchor='start',
+            grid=False,
+            title='Median Impact per 1kg/ 1l'),
+        y=alt.Y('Impact Type:N', title=None).axis(
+            labels=False,
+            titleAnchor='end',
+            grid=False,
+            ticks=False,
+            domain=False),
+        color=alt.Color('Impact Type:N', scale=impact_colors)
+    )
+    # using the opacity scale for highlighted chart
+    if step == 'highlighted':
+        encoding['opacity'] = alt.Opacity('Product Type:N', scale=product_opacity, legend=None)
+
+    return alt.Chart(df_weight2).mark_bar(cornerRadiusTopRight=10, cornerRadiusBottomRight=10).encode(
+        **encoding
+    ).properties(
+        width=750
+    ).facet(
+        row=row,
+        spacing=5,
+    )
+
+
+# ----------------------------------------------------------------------------------#
+# Environmental Impact of Food: Emissions per 100g Protein
+
+def nu_slide(step):
+    # step: 'grey', 'highlighted' (colors per product type), 'final' (+ comparison)
+    df_nu = data_loader.load_nu()
+
+    # defining color and opacity ranges
+    PRODUCT_TYPE_NU = df_nu['Product Type'].cat.categories.to_list()
+
+    product_colors = alt.Scale(
+        domain=PRODUCT_TYPE_NU,
+        range=[dark_red, sage_green]
+    )
+
+    # New opaticity range for the comparison, using Column Compare
+    COMPARE = df_nu['Compare'].cat.categories.to_list()
+
+    product_opacity2 = alt.Scale(
+        domain=COMPARE,
+        range=[0.2, 1]
+    )
+
+    # points for mean value
+    median_points = alt.Chart(df_nu).mark_point(filled=False, color='black', size=200).encode(
+        x=alt.X('Median:Q'),
+        y=alt.Y('Product:N'),
+        tooltip=['Median:Q', 'Product:N']
+    )
+
+    # plotting range bar chart
+    encoding = dict(
+        x=alt.X('5th pctl:Q').scale(domain=[0, 140]).title(
+            'GHG Emissions (kg CO2eq)'),
+        x2='95th pctl:Q',
+        y=alt.Y('Product:N', axis=alt.Axis(
+            title='Per 100g protein...', titleAngle=0, titleY=-5)),
+    )
+
+    # base -> bars are grey
+    if step == 'grey':
+        bar_nu = alt.Chart(df_nu).mark_bar(cornerRadius=10, height=20, color=dark_grey).encode(
+            **encoding
+        ).properties(
+            width=720,
+            height=500
+        )
+        return bar_nu + median_points
+
+    # highlighted -> product_colors are applied
+    encoding['color'] = alt.Color('Product Type:N', scale=product_colors)
+    if step == 'highlighted':
+        bar_nu_highlighted = alt.Chart(df_nu).mark_bar(cornerRadius=10, height=20).encode(
+            **encoding
+        ).properties(
+            width=720,
+            height=500
+        )
+        return bar_nu_highlighted + median_points
+
+    # final -> product_colors and opacity are applied
+    encoding['opacity'] = alt.Opacity('Compare:N', scale=product_opacity2, legend=None)
+    bar_nu_final = alt.Chart(df_nu).mark_bar(cornerRadius=10, height=20).encode(
+        **encoding
+    ).properties(
+        width=720,
+        height=500
+    )
+
+    # points for mean value - highlighted for comparison
+    median_points_highlighted = median_points.encode(
+        opacity=alt.Opacity('Compare:N', scale=product_opacity2, legend=None))
+
+    # Get the '5th pctl' value of 'Bovine Meat (dairy herd)'
+    bovine_dairy_5th = df_nu.loc[df_nu['Product'] ==
+                                 'Bovine Meat (dairy herd)', '5th pctl'].values[0]
+
+    # Create a new chart for vertical line
+    vline = alt.Chart().mark_rule(color='black', strokeDash=[12, 6]).encode(
+        x='a:Q'
+    ).transform_calculate(
+        a=str(bovine_dairy_5th)
+    )
+
+    return bar_nu_final + median_points_highlighted + vline
+
+
+# ---------------------------------------- #
+# Meat Consumption in Germany and Alternative Protein Companies
+# (same charts as in the app, see chart_library)
+
+def meat_slide(step):
+    return chart_library.consumption_chart(data_loader.load_consumption(), step)
+
+
+def founded_slide(step):
+    return chart_library.founded_chart(data_loader.load_founded(), step)
+
+
+def merged_slide():
+    return chart_library.trend_chart(data_loader.load_merged(), dark_red, blue_highlight)
+
+
+# ---------------------------------------------------- #
+# registry: slide name -> (builder, arguments, datasets it depends on), in deck order
+
+SLIDES = {
+    'pie': (charts.pie_chart, (), ['food']),
+    'impact-skeleton': (impact_slide, ('skeleton',), ['weight']),
+    'impact': (impact_slide, ('chart',), ['weight']),
+    'impact-highlighted': (impact_slide, ('highlighted',), ['weight']),
+    'nu': (nu_slide, ('grey',), ['nu']),
+    'nu-highlighted': (nu_slide, ('highlighted',), ['nu']),
+    'nu-final': (nu_slide, ('final',), ['nu']),
+    **{f'meat-{step}': (meat_slide, (step,), ['consumption']) for step in range(7)},
+    'map': (charts.map_chart, (), ['country']),
+    'founded-1': (founded_slide, (1,), ['founded']),
+    'founded-2': (founded_slide, (2,), ['founded']),
+    'merged': (merged_slide, (), ['merged']),
+}
+
+# slides with the look of chart_library.DECK_THEME, the others have altair's default theme
+THEMES = {name: chart_library.DECK_THEME for name in SLIDES
+          if name.startswith(('meat-', 'founded-', 'merged'))}
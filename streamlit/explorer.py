@@ -0,0 +1,278 @@
+# Filter-aware aggregation for the company explorer (pages/1_Unternehmens-Explorer.py)
+#
+# The explorer filters alt-protein-overall.csv by category, focus, region and
+# year founded and shows a map, a timeline and top-N tables of the result. A
+# filter change does not group the table again:
+#
+#   - the bitmap index of the pipeline (code/pipeline/company_index.py) is
+#     built once per content hash of the csv
+#   - every filter dimension has its own cached mask (one bit per company),
+#     so changing the region only builds the region mask; the masks of the
+#     other filters come from the cache and are ANDed with it
+#   - the counts per country / year / value are popcounts and bincounts over
+#     the combined mask, the result is cached per combination of filters
+#
+# The charts are built and validated with Altair once; a rerun only puts the
+# new counts into the named datasets of that spec.
+#
+#     python explorer.py 100     # filter latency with 100x the companies
+
+import functools
+import sys
+import threading
+import time
+from collections import namedtuple
+from pathlib import Path
+
+import numpy as np
+
+import chart_cache
+import data_loader
+import geometry
+import reference_data
+
+# the bitmap index lives in the pipeline package (code/pipeline)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'code'))
+from pipeline import company_index
+
+# filter dimensions: name in the filter -> column of alt-protein-overall.csv
+DIMENSIONS = {
+    'category': 'Protein Category',
+    'focus': 'Company Focus',
+    'region': 'Operating Regions',
+}
+YEAR = company_index.YEAR
+
+# values of the filters, as hashable tuples (empty = no filter)
+# years: (first, last) or None
+Filters = namedtuple('Filters', ['category', 'focus', 'region', 'years'], defaults=[(), (), (), None])
+
+MAX_SUMMARIES = 256
+
+_lock = threading.Lock()
+_tables = {}        # content hash -> (frame, bitmap index), only the current table
+
+
+# ---------------------------------------------------- #
+# index and masks
+
+def _table(content_hash):
+    with _lock:
+        if content_hash not in _tables:
+            frame = data_loader.load_overall()
+            _tables.clear()
+            _tables[content_hash] = (frame, company_index.build(frame))
+        return _tables[content_hash]
+
+
+def _index(content_hash):
+    return _table(content_hash)[1]
+
+
+def current():
+    # content hash of the company table; part of every cache key below
+    return data_loader.content_hash('overall')
+
+
+def options(column):
+    # the single values of a column, e.g. 'Europe', 'Global', ... for the regions
+    return list(_index(current()).bitmaps[column])
+
+
+def year_range():
+    # first and last known year founded (0 = unknown)
+    years = _index(current()).years
+    known = years[years > 0]
+    return int(known.min()), int(known.max())
+
+
+def _frozen(mask):
+    # cached masks are shared by all sessions
+    mask.setflags(write=False)
+    return mask
+
+
+@functools.lru_cache(maxsize=128)
+def _dimension_mask(content_hash, column, values):
+    index = _index(content_hash)
+    return _frozen(company_index.select(index, where={column: list(values)}))
+
+
+@functools.lru_cache(maxsize=64)
+def _year_mask(content_hash, years):
+    index = _index(content_hash)
+    return _frozen(company_index.select(index, years=years))
+
+
+def mask(content_hash, filters):
+    # AND of the cached masks of the active filters
+    index = _index(content_hash)
+    masks = [_dimension_mask(content_hash, column, getattr(filters, name))
+             for name, column in DIMENSIONS.items() if getattr(filters, name)]
+    if filters.years is not None:
+        masks.append(_year_mask(content_hash, filters.years))
+    if not masks:
+        return _frozen(company_index.all_companies(index))
+    return _frozen(np.bitwise_and.reduce(masks))
+
+
+# ---------------------------------------------------- #
+# aggregates of the selected companies
+
+def _top(counts, title):
+    counts = counts[counts > 0].sort_values(ascending=False, kind='stable')
+    return counts.rename_axis(title).rename('Unternehmen').reset_index()
+
+
+@functools.lru_cache(maxsize=MAX_SUMMARIES)
+def _summary(content_hash, filters):
+    index = _index(content_hash)
+    selected = mask(content_hash, filters)
+
+    by_country = company_index.count_by(index, 'Country/Region', selected)
+    df_country = by_country[by_country > 0].rename_axis('name').rename('Number of Companies per Country').reset_index()
+
+    timeline = company_index.count_by(index, YEAR, selected)
+    timeline = timeline[timeline.index > 0]
+
+    return {
+        'table': content_hash,
+        'count': company_index.count(index, selected),
+        'positions': company_index.positions(index, selected),
+        'map': reference_data.company_counts_by_code(df_country),
+        'timeline': timeline.rename('Number of Companies Founded').reset_index(),
+        'countries': _top(by_country, 'Land'),
+        'products': _top(company_index.count_by(index, 'Product Type', selected), 'Produktart'),
+        'technology': _top(company_index.count_by(index, 'Technology Focus', selected), 'Technologie'),
+    }
+
+
+def summary(filters):
+    # dict with the number of companies, their row positions in
+    # load_overall(), the map / timeline data and the top-N tables
+    return _summary(current(), filters)
+
+
+def companies(summary, n):
+    # the n most recently founded of the selected companies (same year: table order);
+    # sorted on the year array of the index, only n rows are taken from the frame
+    frame, index = _table(summary['table'])
+    positions = summary['positions']
+    newest = positions[np.argsort(-index.years[positions], kind='stable')[:n]]
+    df = frame.iloc[newest]
+    return df[['Company', 'Country/Region', YEAR, 'Company Focus', 'Product Type']].reset_index(drop=True)
+
+
+# ---------------------------------------------------- #
+# chart specs: validated once, the data is put in per rerun
+
+MAP_DATA = 'explorer-countries'
+TIMELINE_DATA = 'explorer-timeline'
+
+
+@functools.lru_cache(maxsize=None)
+def _map_template():
+    # like charts.map_chart: one layer, the shapes of the view from geometry.py
+    import altair as alt
+
+    countries, projection = geometry.countries()
+    chart = (
+        alt.Chart(countries)
+        .mark_geoshape(invalid=None)
+        .transform_lookup(
+            lookup="id",
+            from_=alt.LookupData(data=alt.NamedData(name=MAP_DATA), key="id", fields=[
+                                 "name", "Number of Companies per Country"]),
+        )
+        .encode(
+            fill=alt.condition(
+                "!isValid(datum['Number of Companies per Country'])",
+                alt.value("lightgray"),
+                alt.Color(
+                    "Number of Companies per Country:Q",
+                    scale=alt.Scale(range=['#F9CEDB', '#C55979',  '#81072B']),
+                    title="Number of Companies"
+                )
+            ),
+            tooltip=[alt.Tooltip('name:N', title='Country'), alt.Tooltip(
+                'Number of Companies per Country:Q', title='Number of Companies')]
+        )
+        .properties(width=geometry.VIEW.width, height=geometry.VIEW.height)
+        .project(**projection)
+    )
+    return chart_cache.to_spec(chart)
+
+
+@functools.lru_cache(maxsize=None)
+def _timeline_template():
+    import altair as alt
+
+    chart = alt.Chart(alt.NamedData(name=TIMELINE_DATA)).mark_bar(color='#81072B').encode(
+        x=alt.X('Year Founded:O', title='Year Founded'),
+        y=alt.Y('Number of Companies Founded:Q', title='Number of Companies Founded'),
+        tooltip=['Year Founded:O', 'Number of Companies Founded:Q'],
+    ).properties(height=300)
+    return chart_cache.to_spec(chart)
+
+
+def map_spec(summary):
+    return chart_cache.with_data(_map_template(), MAP_DATA, summary['map'])
+
+
+def timeline_spec(summary):
+    return chart_cache.with_data(_timeline_template(), TIMELINE_DATA, summary['timeline'])
+
+
+def tables():
+    # content hash -> (frame, bitmap index) of the loaded company table (memory.py)
+    with _lock:
+        return dict(_tables)
+
+
+def clear_cache():
+    with _lock:
+        _tables.clear()
+    for func in [_dimension_mask, _year_mask, _summary]:
+        func.cache_clear()
+
+
+# ---------------------------------------------------- #
+# latency of a filter change
+
+def report(scale=1):
+    # scale x the companies, from the benchmark data (benchmarks/synthetic.py)
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'benchmarks'))
+    import synthetic
+    df = synthetic.overall(scale, np.random.default_rng(0))
+    start = time.perf_counter()
+    index = company_index.build(df)
+    print(f'{len(df)} companies, index built in {(time.perf_counter() - start) * 1000:.0f} ms')
+
+    # the synthetic table instead of the csv
+    key = f'synthetic x{scale}'
+    with _lock:
+        _tables[key] = (df, index)
+    _map_template(), _timeline_template()
+    try:
+        known = index.years[index.years > 0]
+        first, last = int(known.min()), int(known.max())
+        steps = [Filters(),
+                 Filters(region=('Europe',)),
+                 Filters(region=('Europe', 'U.S. and Canada')),
+                 Filters(focus=('Meat',), region=('Europe', 'U.S. and Canada')),
+                 Filters(focus=('Meat', 'Dairy'), region=('Europe', 'U.S. and Canada')),
+                 Filters(focus=('Meat', 'Dairy'), region=('Europe', 'U.S. and Canada'), years=(2010, last)),
+                 Filters(focus=('Meat', 'Dairy'), region=('Europe', 'U.S. and Canada'), years=(2015, last)),
+                 Filters(focus=('Meat', 'Dairy'), region=('Europe',), years=(2015, last)),
+                 Filters(years=(first, last))]
+        for filters in steps:
+            start = time.perf_counter()
+            result = _summary(key, filters)
+            map_spec(result), timeline_spec(result), companies(result, 10)
+            print(f'{(time.perf_counter() - start) * 1000:7.1f} ms  {result["count"]:>7} companies  {filters}')
+    finally:
+        clear_cache()
+
+
+if __name__ == '__main__':
+    report(int(sys.argv[1]) if len(sys.argv) > 1 else 1)
@@ -0,0 +1,212 @@
+# Static export of every chart state of the app and every chart slide of the deck
+#
+# Renders each chart exactly once into exports/:
+#
+#     exports/app/<chart>-<state>.vl.json     Vega-Lite spec as the app shows it
+#     exports/deck/<slide>.vl.json            Vega-Lite spec as the deck shows it
+#     exports/deck/<slide>.md                 html block for praesi.qmd ({{< include >}})
+#     exports/*/*.svg, *.png                  images (needs vl-convert-python)
+#     exports/index.html                      viewer for all charts, no Python needed
+#     exports/manifest.json                   key + sha256 of every file in git
+#
+# The key of an entry is a hash of the chart code, the Altair version and the
+# content of the datasets it uses (chart_cache.export_key). Entries with an
+# unchanged key are skipped, so after a text edit in praesi.qmd nothing is
+# rebuilt, and after a data change only the charts of that dataset. The app
+# reads the app specs through chart_cache instead of building them.
+#
+# The images are not in git (exports/.gitignore) and not in the manifest: an
+# image that is missing, e.g. in a fresh clone, is drawn from the spec of its
+# entry, the chart itself is not built again.
+#
+#     python export.py                # json + svg of everything that changed
+#     python export.py --png          # also png (2x)
+#     python export.py --force        # rebuild everything
+#
+# Afterwards `python snapshot.py` writes the startup snapshot (frames + specs).
+
+import argparse
+import hashlib
+import json
+import time
+
+import altair as alt
+from altair.utils.html import spec_to_html
+
+import chart_cache
+import charts
+import deck_charts
+
+try:
+    import vl_convert as vlc
+except ImportError:
+    vlc = None
+
+EXPORTS = chart_cache.EXPORTS
+MANIFEST = EXPORTS / 'manifest.json'
+
+
+def entries():
+    # (entry, builder, arguments, datasets, theme) of all app states and deck slides;
+    # the app has no theme by default (like st.altair_chart), the deck the default theme (like Jupyter)
+    for name, (builder, datasets) in charts.CHARTS.items():
+        for state in charts.states(name):
+            yield 'app/' + chart_cache.export_name(name, state), builder, state, datasets, charts.THEMES.get(name, 'none')
+    for name, (builder, args, datasets) in deck_charts.SLIDES.items():
+        yield 'deck/' + name, builder, args, datasets, deck_charts.THEMES.get(name, 'default')
+
+
+def _sha256(content):
+    return hashlib.sha256(content).hexdigest()
+
+
+def _div_id(entry):
+    return 'chart-' + entry.replace('/', '-').replace('.', '_')
+
+
+def fragment(entry, spec):
+    # vega-embed snippet, works with and without require.js (Quarto loads it)
+    return spec_to_html(spec, 'vega-lite', alt.VEGA_VERSION, alt.VEGAEMBED_VERSION, alt.VEGALITE_VERSION,
+                        output_div=_div_id(entry), fullhtml=False, template='universal')
+
+
+def _render(entry, spec):
+    # file suffix -> content, of the files in the manifest
+    files = {'.vl.json': json.dumps(spec).encode()}
+    if entry.startswith('deck/'):
+        files['.md'] = ('```{=html}\n' + fragment(entry, spec) + '\n```\n').encode()
+    return files
+
+
+def _render_images(entry, spec, formats):
+    # file suffix -> content, of the images
+    files = {}
+    for fmt in formats:
+        if vlc is None:
+            print(f'  {entry}: no {fmt} (vl-convert-python is not installed)')
+            break
+        try:
+            if fmt == 'svg':
+                files['.svg'] = vlc.vegalite_to_svg(spec).encode()
+            else:
+                files['.png'] = vlc.vegalite_to_png(spec, scale=2)
+        except Exception as e:
+            # e.g. the world map without network access (data by url)
+            print(f'  {entry}: no {fmt} ({str(e).splitlines()[0]})')
+    return files
+
+
+def _write(entry, files):
+    for suffix, content in files.items():
+        path = EXPORTS / (entry + suffix)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if not path.exists() or path.read_bytes() != content:
+            path.write_bytes(content)
+
+
+def _up_to_date(exported, key):
+    if exported is None or exported['key'] != key:
+        return False
+    for file, sha in exported['files'].items():
+        path = EXPORTS / file
+        if not path.exists() or _sha256(path.read_bytes()) != sha:
+            return False
+    return True
+
+
+def export_entry(entry, builder, args, datasets, theme, formats, exported=None, force=False):
+    # returns the manifest entry, None if it is up to date
+    key = chart_cache.export_key(entry, datasets)
+    if not force and _up_to_date(exported, key):
+        return None
+
+    chart = builder(*args)
+    if chart is None:
+        return {'key': key, 'spec': None, 'files': {}}
+    spec = chart_cache.to_spec(chart, theme)
+
+    files = _render(entry, spec)
+    _write(entry, files)
+    _write(entry, _render_images(entry, spec, formats))
+    return {'key': key, 'spec': entry + '.vl.json',
+            'files': {entry + suffix: _sha256(content) for suffix, content in files.items()}}
+
+
+def export_images(entry, exported, formats):
+    # draws the missing images of an up-to-date entry from its spec;
+    # returns the number of images drawn
+    missing = [fmt for fmt in formats if not (EXPORTS / f'{entry}.{fmt}').exists()]
+    if exported['spec'] is None or not missing:
+        return 0
+    with open(EXPORTS / exported['spec']) as f:
+        files = _render_images(entry, json.load(f), missing)
+    _write(entry, files)
+    return len(files)
+
+
+def write_viewer(manifest):
+    # one page with all charts; the specs are inlined, so it also works from file://
+    sections = {'deck': [], 'app': []}
+    for entry, exported in manifest.items():
+        if exported['spec'] is None:
+            continue
+        with open(EXPORTS / exported['spec']) as f:
+            spec = json.load(f)
+        sections[entry.split('/')[0]].append(f'<h3>{entry}</h3>\n' + fragment(entry, spec))
+
+    html = ['<!DOCTYPE html>', '<html lang="de">', '<head>', '<meta charset="utf-8">',
+            '<title>Urban Butcher Stuttgart - Charts</title>',
+            '<style>body { font-family: Arial, sans-serif; margin: 2em; } h3 { color: grey; }</style>',
+            '</head>', '<body>', '<h1>Urban Butcher Stuttgart - Charts</h1>']
+    for title, name in [('Präsentation', 'deck'), ('Streamlit App', 'app')]:
+        html += [f'<h2>{title}</h2>', *sections[name]]
+    html += ['</body>', '</html>', '']
+    (EXPORTS / 'index.html').write_text('\n'.join(html))
+
+
+def export(formats=('svg',), force=False):
+    formats = list(formats)
+    start = time.perf_counter()
+    old = json.loads(MANIFEST.read_text()) if MANIFEST.exists() else {}
+    manifest, built, drawn = {}, 0, 0
+
+    for entry, builder, args, datasets, theme in entries():
+        exported = export_entry(entry, builder, args, datasets, theme, formats, old.get(entry), force)
+        if exported is None:
+            manifest[entry] = old[entry]
+            drawn += export_images(entry, old[entry], formats)
+            continue
+        manifest[entry] = exported
+        built += 1
+        print(f'{entry}: built')
+
+    # files of entries that no longer exist
+    current = {file for exported in manifest.values() for file in exported['files']}
+    for entry, exported in old.items():
+        for file in exported['files']:
+            if file not in current and (EXPORTS / file).exists():
+                (EXPORTS / file).unlink()
+        if entry not in manifest:
+            for fmt in ('svg', 'png'):
+                (EXPORTS / f'{entry}.{fmt}').unlink(missing_ok=True)
+
+    if built or manifest != old or not (EXPORTS / 'index.html').exists():
+        EXPORTS.mkdir(exist_ok=True)
+        MANIFEST.write_text(json.dumps(manifest, indent=2) + '\n')
+        write_viewer(manifest)
+    print(f'{built} of {len(manifest)} charts built, {drawn} missing images drawn'
+          f' in {time.perf_counter() - start:.2f}s')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Prerender all chart states of the app and the deck.')
+    parser.add_argument('--png', action='store_true', help='also render png images')
+    parser.add_argument('--no-svg', dest='svg', action='store_false', help='no svg images')
+    parser.add_argument('--force', action='store_true', help='rebuild every chart')
+    args = parser.parse_args()
+    formats = (['svg'] if args.svg else []) + (['png'] if args.png else [])
+    export(formats, args.force)
+
+
+if __name__ == '__main__':
+    main()
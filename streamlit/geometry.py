@@ -0,0 +1,299 @@
+# Country shapes of the company map, projected, clipped and simplified in advance
+#
+# The map (charts.map_chart, explorer.py) shows Europe: an equalEarth
+# projection with scale 800 and translate [200, 1000] in a 700x500 view. Sent
+# as it is, the browser gets the whole world-110m TopoJSON and projects every
+# country, also the ones far outside the view. Instead, for a view (VIEW):
+#
+#   - every arc is projected to screen pixels once, here (numpy, same formula
+#     as d3.geoEqualEarth) and simplified to the screen resolution
+#     (Douglas-Peucker, TOLERANCE px); the arcs are simplified before they are
+#     put together, so neighbouring countries keep a common border
+#   - every ring is clipped to the view plus MARGIN px (Sutherland-Hodgman),
+#     countries outside the view are dropped
+#   - the pixel coordinates are quantized to 1/PRECISION px and delta-encoded
+#     as TopoJSON arcs (one arc per ring)
+#
+# The chart then draws the shapes with the identity projection (no projection
+# in the browser). The result is cached on disk per source file, view and code
+# of this file (reference_data.CACHE_DIR / 'geometry'), so it is computed once
+# per machine. The same works for other TopoJSON files (world-50m, world-10m,
+# German Bundesländer): load(path, feature, view).
+#
+# Without code/reference-data/world-110m.json the map falls back to the file
+# on the CDN, projected in the browser like before.
+#
+#     python geometry.py                       # size and time per view of world-110m
+#     python geometry.py world-10m.json        # the same for another TopoJSON file
+
+import functools
+import hashlib
+import json
+import sys
+import threading
+import time
+from collections import namedtuple
+from pathlib import Path
+
+import numpy as np
+
+import reference_data
+
+# scale and translate of the d3 projection, size of the chart in px
+View = namedtuple('View', ['projection', 'scale', 'translate', 'width', 'height'])
+
+# Europe, the view of the app
+VIEW = View('equalEarth', 800, (200, 1000), 700, 500)
+
+TOLERANCE = 0.5     # px, a line closer to the simplified line than that is not visible
+PRECISION = 4       # quantization steps per px
+MARGIN = 10         # px around the view, the clipped edges are not visible
+
+CACHE = reference_data.CACHE_DIR / 'geometry'
+
+_lock = threading.Lock()
+
+
+# ---------------------------------------------------- #
+# TopoJSON arcs -> screen pixels
+
+def decode_arcs(topology):
+    # absolute lon/lat of every arc, (n, 2) arrays
+    arcs = [np.asarray(arc, dtype=float)[:, :2] for arc in topology['arcs']]
+    transform = topology.get('transform')
+    if transform is None:
+        return arcs
+    scale, translate = np.asarray(transform['scale']), np.asarray(transform['translate'])
+    return [arc.cumsum(axis=0) * scale + translate for arc in arcs]
+
+
+def equal_earth(lonlat, view):
+    # d3.geoEqualEarth with the scale and translate of the view; y grows downwards
+    a1, a2, a3, a4 = 1.340264, -0.081106, 0.000893, 0.003796
+    m = np.sqrt(3) / 2
+    lon, lat = np.radians(lonlat[:, 0]), np.radians(lonlat[:, 1])
+    theta = np.arcsin(m * np.sin(lat))
+    theta2 = theta * theta
+    theta6 = theta2 * theta2 * theta2
+    x = lon * np.cos(theta) / (m * (a1 + 3 * a2 * theta2 + theta6 * (7 * a3 + 9 * a4 * theta2)))
+    y = theta * (a1 + a2 * theta2 + theta6 * (a3 + a4 * theta2))
+    return np.column_stack([view.translate[0] + view.scale * x, view.translate[1] - view.scale * y])
+
+
+PROJECTIONS = {'equalEarth': equal_earth}
+
+
+def simplify(points, tolerance):
+    # Douglas-Peucker; first and last point are kept (the ends of a shared arc)
+    if len(points) < 3:
+        return points
+    keep = np.zeros(len(points), dtype=bool)
+    keep[[0, -1]] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        start, end = points[first], points[last]
+        inner = points[first + 1:last]
+        direction = end - start
+        length = np.hypot(*direction)
+        if length == 0:
+            # a closed arc (island): distance to the point
+            distance = np.hypot(*(inner - start).T)
+        else:
+            distance = np.abs(direction[0] * (inner[:, 1] - start[1]) - direction[1] * (inner[:, 0] - start[0])) / length
+        farthest = int(distance.argmax())
+        if distance[farthest] > tolerance:
+            middle = first + 1 + farthest
+            keep[middle] = True
+            stack += [(first, middle), (middle, last)]
+    return points[keep]
+
+
+# ---------------------------------------------------- #
+# rings
+
+def _ring(arcs, indices):
+    # points of a ring from its arc indices (~i: arc i reversed), without the closing point
+    parts = [arcs[i] if i >= 0 else arcs[~i][::-1] for i in indices]
+    return np.vstack([part[:-1] for part in parts])
+
+
+def _outside(low, high, box):
+    return high[0] < box[0] or high[1] < box[1] or low[0] > box[2] or low[1] > box[3]
+
+
+def clip_ring(ring, box):
+    # Sutherland-Hodgman against the rectangle box = (x0, y0, x1, y1); the window
+    # is convex, so the result is one ring (possibly with edges along the box)
+    for axis, limit, below in [(0, box[0], False), (0, box[2], True), (1, box[1], False), (1, box[3], True)]:
+        if len(ring) == 0:
+            break
+        following = np.roll(ring, -1, axis=0)
+        inside = ring[:, axis] <= limit if below else ring[:, axis] >= limit
+        inside_next = np.roll(inside, -1)
+        if inside.all():
+            continue
+        # the crossing of every edge with the line axis=limit
+        # (edges that do not cross are dropped below, their nan with them)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            t = (limit - ring[:, axis]) / (following[:, axis] - ring[:, axis])
+            crossing = ring + (following - ring) * t[:, None]
+        # per edge: the crossing (if it leaves or enters), then its end (if inside)
+        points = np.stack([crossing, following], axis=1).reshape(-1, 2)
+        mask = np.stack([inside != inside_next, inside_next], axis=1).reshape(-1)
+        ring = points[mask]
+    return ring
+
+
+def _quantized(ring):
+    # integer steps of 1/PRECISION px, without repeated points; None if nothing is left
+    steps = np.round(ring * PRECISION).astype(np.int64)
+    steps = steps[np.any(steps != np.roll(steps, 1, axis=0), axis=1)]
+    if len(steps) < 3:
+        return None
+    closed = np.vstack([steps, steps[:1]])
+    # no area left, e.g. a sliver along the edge of the window
+    x, y = closed[:, 0], closed[:, 1]
+    if np.dot(x[:-1], y[1:]) - np.dot(x[1:], y[:-1]) == 0:
+        return None
+    return closed
+
+
+def _polygons(geometry):
+    if geometry.get('type') == 'Polygon':
+        return [geometry['arcs']]
+    if geometry.get('type') == 'MultiPolygon':
+        return geometry['arcs']
+    return []
+
+
+# ---------------------------------------------------- #
+# topology for a view
+
+def preprocess(topology, feature, view=VIEW):
+    # TopoJSON of `feature` in screen pixels of the view, for the identity projection
+    project = PROJECTIONS[view.projection]
+    arcs = decode_arcs(topology)
+    # all arcs projected at once, then split again
+    lengths = np.cumsum([len(arc) for arc in arcs])[:-1]
+    projected = np.split(project(np.vstack(arcs), view), lengths) if arcs else []
+    lows = [arc.min(axis=0) for arc in projected]
+    highs = [arc.max(axis=0) for arc in projected]
+    # only the arcs of rings in the view are simplified, once per arc
+    simplified = {}
+
+    def arc(i):
+        if i not in simplified:
+            simplified[i] = simplify(projected[i], TOLERANCE)
+        return simplified[i]
+
+    box = (-MARGIN, -MARGIN, view.width + MARGIN, view.height + MARGIN)
+    geometries, out = [], []
+    for geometry in topology['objects'][feature]['geometries']:
+        polygons = []
+        for polygon in _polygons(geometry):
+            rings = []
+            for indices in polygon:
+                used = [i if i >= 0 else ~i for i in indices]
+                low, high = np.min([lows[i] for i in used], axis=0), np.max([highs[i] for i in used], axis=0)
+                if _outside(low, high, box):
+                    ring = None
+                else:
+                    ring = _ring({i: arc(i) for i in used}, indices)
+                    if low[0] < box[0] or low[1] < box[1] or high[0] > box[2] or high[1] > box[3]:
+                        ring = clip_ring(ring, box)
+                    ring = _quantized(ring) if len(ring) else None
+                if ring is None:
+                    if not rings:
+                        # the outer ring is outside the view, so are its holes
+                        break
+                    continue
+                rings.append([len(out)])
+                out.append(np.vstack([ring[:1], np.diff(ring, axis=0)]).tolist())
+            if rings:
+                polygons.append(rings)
+        if polygons:
+            shape = {key: value for key, value in geometry.items() if key in ('id', 'properties')}
+            geometries.append({'type': 'MultiPolygon', 'arcs': polygons, **shape})
+
+    return {'type': 'Topology',
+            'transform': {'scale': [1 / PRECISION, 1 / PRECISION], 'translate': [0, 0]},
+            'objects': {feature: {'type': 'GeometryCollection', 'geometries': geometries}},
+            'arcs': out}
+
+
+def _cache_key(content, feature, view):
+    sha = hashlib.sha256(content)
+    sha.update(Path(__file__).read_bytes())
+    sha.update(json.dumps([feature, list(view), TOLERANCE, PRECISION, MARGIN]).encode())
+    return sha.hexdigest()[:32]
+
+
+@functools.lru_cache(maxsize=8)
+def _load(path, feature, view):
+    path = Path(path)
+    if not path.exists():
+        return None
+    content = path.read_bytes()
+    cached = CACHE / f'{_cache_key(content, feature, view)}.json'
+    if cached.exists():
+        with open(cached) as f:
+            return json.load(f)
+    topology = preprocess(json.loads(content), feature, view)
+    reference_data._write(cached, json.dumps(topology, separators=(',', ':')).encode())
+    return topology
+
+
+def load(path=reference_data.WORLD_110M_FILE, feature='countries', view=VIEW):
+    # preprocessed TopoJSON of the file (from the disk cache), None without the file;
+    # computed once, also if the startup loader and a section ask at the same time
+    with _lock:
+        return _load(path, feature, view)
+
+
+def countries(view=VIEW):
+    # (source for mark_geoshape, arguments of .project()) of the map
+    import altair as alt
+
+    topology = load(view=view)
+    if topology is None:
+        return reference_data.countries(), {'type': view.projection, 'scale': view.scale,
+                                            'translate': list(view.translate)}
+    data = alt.InlineData(values=topology, format=alt.DataFormat(type='topojson', feature='countries'))
+    # scale and translate given, otherwise vega-lite fits the shapes into the view
+    return data, {'type': 'identity', 'scale': 1, 'translate': [0, 0]}
+
+
+# ---------------------------------------------------- #
+# size and time per view
+
+def report(path=reference_data.WORLD_110M_FILE, feature='countries'):
+    path = Path(path)
+    if path.exists():
+        content = path.read_bytes()
+        topology = json.loads(content)
+    else:
+        # a grid of 40x20 countries with 200 points per border (benchmarks/synthetic.py)
+        sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'benchmarks'))
+        import synthetic
+        print(f'{path.name} not found, using a synthetic topology')
+        topology = synthetic.topology(40, 20, 200, np.random.default_rng(0))
+        content = json.dumps(topology, separators=(',', ':')).encode()
+
+    points = sum(len(arc) for arc in topology['arcs'])
+    shapes = len(topology['objects'][feature]['geometries'])
+    print(f'{"source":<24} {len(content) / 1024:9.1f} kB {points:>9} points {shapes:>5} shapes')
+    for name, view in [('europe (app)', VIEW), ('world', View('equalEarth', 110, (350, 250), 700, 500))]:
+        start = time.perf_counter()
+        result = preprocess(topology, feature, view)
+        seconds = time.perf_counter() - start
+        size = len(json.dumps(result, separators=(',', ':')).encode())
+        points = sum(len(arc) for arc in result['arcs'])
+        shapes = len(result['objects'][feature]['geometries'])
+        print(f'{name:<24} {size / 1024:9.1f} kB {points:>9} points {shapes:>5} shapes {seconds * 1000:8.0f} ms')
+
+
+if __name__ == '__main__':
+    report(*sys.argv[1:2])
@@ -0,0 +1,156 @@
+# Live reload of the data while the app is running
+#
+# When the pipeline writes a new file to code/cleaned-data, a running app used
+# to notice it only in the next rerun of some session, which then reloaded
+# the frame and rebuilt the charts while its user waited (and every other
+# session waited for the same chart or built it a second time). Instead, one
+# watcher thread per process checks the files every INTERVAL seconds:
+#
+#   - data_loader.stale(): the loaded frames whose files changed (mtime/size,
+#     nothing is read). A change is only taken once the files are unchanged
+#     for one more check, so the csv and the feather copy the pipeline writes
+#     one after the other are reloaded once, together
+#   - only these frames are reloaded; a file that was only touched (same
+#     content hash) changes nothing. E.g. versorgungsbilanz-fleisch.csv is
+#     read by the frames 'consumption' and 'merged'. A frame that a rerun
+#     reloaded before the watcher came to it counts as changed as well
+#   - only the charts that use a changed frame (charts.CHARTS) are rebuilt, in
+#     the states some session has shown so far (chart_cache.refresh): the four
+#     slides of the meat chart and the merged chart, not the impact or map charts
+#   - the new frame replaces the old one in one step (data_loader._cache); a
+#     rerun that still holds the old frame finishes with it. The specs of the
+#     old data are dropped once the new ones are built
+#   - then the change is published as a new generation. Every session checks
+#     the generation in a small fragment (urban-butcher.py) and reruns only if
+#     a frame of its open tab changed; the specs are already built, so the
+#     rerun is a lookup and only the changed charts are drawn again
+#
+# URBAN_BUTCHER_RELOAD_SECONDS=0 switches the watcher off (the files are still
+# checked in every rerun, like before).
+#
+#     python live_reload.py      # which frames and charts depend on which file
+
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+import chart_cache
+import charts
+import data_loader
+
+INTERVAL = float(os.environ.get('URBAN_BUTCHER_RELOAD_SECONDS', '2'))
+HISTORY = 100          # generations kept for changed_since
+
+_log = logging.getLogger(__name__)
+_lock = threading.Lock()
+_thread = None
+_pending = {}           # frame name -> signature seen at the last check, not yet reloaded
+_hashes = {}            # frame name -> content hash at the last check
+_generation = 0
+_changes = deque(maxlen=HISTORY)     # (generation, names of the frames changed)
+
+
+# ---------------------------------------------------- #
+# dependencies
+
+def dependents(names):
+    # names of the charts that use one of the frames
+    names = set(names)
+    return [chart for chart, (_, datasets) in charts.CHARTS.items() if names & set(datasets)]
+
+
+def files():
+    # file -> names of the frames read from it, of the frames loaded so far
+    result = {}
+    for name, entry in data_loader.cache_entries().items():
+        for file in entry.get('files', ()):
+            result.setdefault(file, []).append(name)
+    return result
+
+
+# ---------------------------------------------------- #
+# reload
+
+def publish():
+    # the frames whose content changed since the last check (reloaded by the
+    # watcher, or already by a rerun in between): their charts are rebuilt,
+    # then the change is published; returns the names of the frames
+    global _generation
+    current = {name: data_loader.cached_hash(name) for name in data_loader.frames()}
+    changed = [name for name, content_hash in current.items() if _hashes.get(name, content_hash) != content_hash]
+    _hashes.update(current)
+    if not changed:
+        return changed
+
+    rebuilt = chart_cache.refresh(changed)
+    with _lock:
+        _generation += 1
+        _changes.append((_generation, set(changed)))
+    _log.info('live reload: %s changed, rebuilt %s', ', '.join(changed), ', '.join(rebuilt) or 'no charts')
+    return changed
+
+
+def check():
+    # one check of the files; returns the names of the frames that changed
+    global _pending
+    stale = data_loader.stale()
+    # unchanged since the last check -> the writer is done with them
+    settled = [name for name, signature in stale.items() if _pending.get(name) == signature]
+    _pending = {name: signature for name, signature in stale.items() if name not in settled}
+    for name in settled:
+        # same content (only touched) -> only the signature is updated
+        data_loader.LOADERS[name]()
+    return publish()
+
+
+def _watch():
+    while True:
+        time.sleep(INTERVAL)
+        try:
+            check()
+        except Exception:           # noqa: BLE001 (the watcher must keep running)
+            _log.exception('live reload failed')
+
+
+def start():
+    # starts the watcher once per process
+    global _thread
+    if INTERVAL <= 0:
+        return
+    with _lock:
+        if _thread is None:
+            _thread = threading.Thread(target=_watch, name='live-reload', daemon=True)
+            _thread.start()
+
+
+# ---------------------------------------------------- #
+# sessions
+
+def generation():
+    with _lock:
+        return _generation
+
+
+def changed_since(seen):
+    # names of the frames changed after generation `seen`; all frames if the
+    # changes right after `seen` are no longer kept (a session idle for more
+    # than HISTORY generations)
+    with _lock:
+        if _changes and seen < _changes[0][0] - 1:
+            return set(data_loader.frames())
+        return set().union(*[names for number, names in _changes if number > seen])
+
+
+# ---------------------------------------------------- #
+# dependencies per file
+
+def report():
+    print(f"{'file':<40} {'frames':<22} charts")
+    for file, names in sorted(files().items()):
+        print(f"{file:<40} {', '.join(names):<22} {', '.join(dependents(names)) or '-'}")
+
+
+if __name__ == '__main__':
+    report()
@@ -0,0 +1,142 @@
+# Memory per process and per session
+#
+# With hundreds of viewers, what matters is what a session adds on top of the
+# process. The app keeps everything heavy once per process: the frames
+# (data_loader), the chart specs (chart_cache), the ISO code table
+# (reference_data), the map shapes (geometry) and the company table with its
+# bitmap index (explorer).
+# A session only has its widget values in st.session_state (keys of the
+# multiselect, the slider, the open tab, ...), a few hundred bytes.
+#
+# shared() and session_bytes() count the bytes of these objects: frames with
+# memory_usage(deep=True), numpy arrays with nbytes, dicts/lists/strings
+# recursively. An object used by several caches (e.g. the company table of
+# data_loader and explorer) is counted once.
+#
+#     python memory.py      # shared bytes, one session, projection for 100/500 sessions
+
+import sys
+
+import numpy as np
+import pandas as pd
+
+import chart_cache
+import data_loader
+import geometry
+import reference_data
+
+SESSIONS = [100, 500]       # viewers of the projection in report()
+
+
+def deep_size(obj, seen=None):
+    # bytes of obj and everything it references (objects in `seen` are skipped)
+    seen = set() if seen is None else seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    if isinstance(obj, pd.DataFrame):
+        return int(obj.memory_usage(deep=True).sum())
+    if isinstance(obj, pd.Series):
+        return int(obj.memory_usage(deep=True))
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_size(key, seen) + deep_size(value, seen) for key, value in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(deep_size(item, seen) for item in obj)
+    return size
+
+
+# ---------------------------------------------------- #
+# shared by all sessions
+
+def frame_bytes():
+    # frame name -> bytes, of the frames loaded so far
+    return {name: deep_size(frame) for name, frame in data_loader.frames().items()}
+
+
+def shared():
+    # part -> bytes of everything the process holds once
+    seen = set()
+    parts = {'frames': sum(deep_size(frame, seen) for frame in data_loader.frames().values()),
+             'chart specs': deep_size(chart_cache.cached(), seen)}
+    if geometry._load.cache_info().currsize:
+        parts['map geometry'] = deep_size(geometry.load(), seen)
+    if reference_data._country_codes.cache_info().currsize:
+        parts['country codes'] = deep_size(reference_data.load_country_codes(), seen)
+    explorer = sys.modules.get('explorer')
+    if explorer is not None:
+        # the table itself is the 'overall' frame, already counted above
+        parts['explorer index'] = deep_size(explorer.tables(), seen)
+    return parts
+
+
+# ---------------------------------------------------- #
+# per session
+
+def session_bytes(state):
+    # bytes of the values in one session state (a dict of key -> value)
+    return deep_size(dict(state))
+
+
+def sessions():
+    # session id -> bytes of its session state, of the sessions of this server;
+    # empty outside `streamlit run` (the session manager is not a public API)
+    try:
+        from streamlit import runtime
+        infos = runtime.get_instance()._session_mgr.list_active_sessions()
+        return {info.session.id: session_bytes(info.session.session_state.filtered_state) for info in infos}
+    except Exception:
+        return {}
+
+
+def panel():
+    # shared bytes and the bytes of the sessions, in a sidebar expander
+    import streamlit as st
+
+    with st.sidebar.expander('Debug: Speicher'):
+        st.dataframe(pd.DataFrame({'kB': {**shared(), 'diese Session': session_bytes(st.session_state.to_dict())}})
+                     .div(1024).round(1))
+        active = sessions()
+        if active:
+            st.caption(f'{len(active)} Sessions, zusammen {sum(active.values()) / 1024:.1f} kB')
+
+
+# ---------------------------------------------------- #
+# report: one session of the app, projected to many viewers
+
+def _one_session():
+    # bytes of the session state after a run of the app with every widget used
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file('urban-butcher.py', default_timeout=120)
+    for section, widgets in [('Impact der Lebensmittel', {'impact_types': ['Land Use']}),
+                             ('Fleischkonsum', {'slide': 3})]:
+        at.session_state['section'] = section
+        for key, value in widgets.items():
+            at.session_state[key] = value
+        at.run()
+        if at.exception:
+            raise SystemExit(at.exception[0].message)
+    return session_bytes(at.session_state._state.filtered_state)
+
+
+def report():
+    state_bytes = _one_session()
+    chart_cache.warm_up()
+    for name, size in frame_bytes().items():
+        print(f'{name:<16} {size / 1024:10.1f} kB')
+    parts = shared()
+    for part, size in parts.items():
+        print(f'{part:<16} {size / 1024:10.1f} kB')
+    total = sum(parts.values())
+    print(f'shared           {total / 1024:10.1f} kB')
+    print(f'per session      {state_bytes / 1024:10.1f} kB')
+    for n in SESSIONS:
+        print(f'{n} sessions     {(total + n * state_bytes) / 1024:10.1f} kB'
+              f' (instead of {n * (total + state_bytes) / 1024:.1f} kB with a copy per session)')
+
+
+if __name__ == '__main__':
+    report()
@@ -0,0 +1,234 @@
+# Live timings of the app: which section / data load makes a rerun slow
+#
+# urban-butcher.py marks every rerun (start_rerun/finish_rerun) and wraps each
+# section in `with metrics.section(...)`. Inside a section, data_loader and
+# chart_cache add `with metrics.part(...)` timers, so the time of a section is
+# split into pandas (reading/preparing frames), altair (building the chart
+# objects), validation (to_dict = schema validation + serialization) and the
+# rest (streamlit calls, cache lookups). Parts are exclusive: the pandas time
+# of a data load inside a chart build is not counted as altair time too.
+#
+# The first chart of a rerun marks its 'first paint' (seconds since the start).
+# A widget inside an st.fragment only reruns its fragment; `with
+# metrics.fragment(...)` times such a rerun like a full one, tagged with the
+# name of the fragment.
+#
+# Environment variables:
+#
+#     URBAN_BUTCHER_METRICS=metrics.jsonl   # one json line per rerun
+#     URBAN_BUTCHER_METRICS=metrics.prom    # Prometheus text format (totals)
+#     URBAN_BUTCHER_TRACEMALLOC=1           # also record allocated bytes per section
+#     URBAN_BUTCHER_DEBUG=1                 # debug panel in the sidebar (or ?debug=1)
+#
+# Allocation numbers come from tracemalloc, which is process wide: with several
+# sessions running at the same time they are only a rough guide.
+
+import json
+import os
+import threading
+import time
+import tracemalloc
+from collections import deque
+from contextlib import contextmanager
+
+HISTORY = 20        # reruns kept for the debug panel
+
+METRICS_FILE = os.environ.get('URBAN_BUTCHER_METRICS')
+
+if os.environ.get('URBAN_BUTCHER_TRACEMALLOC') == '1' and not tracemalloc.is_tracing():
+    tracemalloc.start()
+
+_lock = threading.Lock()
+_history = deque(maxlen=HISTORY)
+_totals = {'reruns': 0, 'seconds': 0.0, 'sections': {}}     # for the Prometheus export
+_local = threading.local()      # every session reruns the script in its own thread
+
+
+# ---------------------------------------------------- #
+# probes
+
+def start_rerun(session=None):
+    _local.rerun = {'session': session, 'start': time.time(), 'sections': {}}
+    _local.timer = time.perf_counter()
+    _local.stack = []
+
+
+def _current():
+    return getattr(_local, 'rerun', None)
+
+
+class _Probe:
+    # times a block; the time of nested probes is subtracted (exclusive time)
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.rerun = _current()
+        if self.rerun is None:
+            return self
+        self.children = 0.0
+        _local.stack.append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        if self.rerun is None:
+            return False
+        seconds = time.perf_counter() - self.start
+        _local.stack.pop()
+        if _local.stack:
+            _local.stack[-1].children += seconds
+        self.record(seconds - self.children, seconds)
+        return False
+
+    def record(self, own_seconds, seconds):
+        # the innermost section is the one the time belongs to
+        section = next((p for p in reversed(_local.stack) if isinstance(p, _Section)), None)
+        if section is not None:
+            parts = section.entry['parts']
+            parts[self.name] = parts.get(self.name, 0.0) + own_seconds
+
+
+class _Section(_Probe):
+
+    def __enter__(self):
+        super().__enter__()
+        if self.rerun is None:
+            return self
+        self.entry = self.rerun['sections'].setdefault(self.name, {'seconds': 0.0, 'parts': {}})
+        if tracemalloc.is_tracing():
+            self.memory = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        return self
+
+    def record(self, own_seconds, seconds):
+        self.entry['seconds'] += seconds
+        parts = self.entry['parts']
+        parts['other'] = parts.get('other', 0.0) + own_seconds
+        if tracemalloc.is_tracing():
+            # how much memory the section needed on top of what was there before
+            peak = tracemalloc.get_traced_memory()[1]
+            self.entry['alloc bytes'] = self.entry.get('alloc bytes', 0) + max(peak - self.memory, 0)
+
+
+def section(name):
+    # a logical section of the app, e.g. 'Meat Consumption'
+    return _Section(name)
+
+
+def part(name):
+    # what the time inside a section is spent on: 'pandas', 'altair', 'validation', ...
+    return _Probe(name)
+
+
+def first_paint():
+    # called when a chart is sent; only the first one of a rerun counts
+    rerun = _current()
+    if rerun is not None and 'first paint' not in rerun:
+        rerun['first paint'] = time.perf_counter() - _local.timer
+
+
+@contextmanager
+def fragment(name, session=None):
+    # inside a full rerun the fragment is part of it, else it is its own rerun
+    if _current() is not None:
+        yield
+        return
+    start_rerun(session)
+    _local.rerun['fragment'] = name
+    try:
+        yield
+    finally:
+        finish_rerun()
+
+
+def finish_rerun():
+    rerun = _current()
+    if rerun is None:
+        return None
+    rerun['seconds'] = time.perf_counter() - _local.timer
+    _local.rerun = None
+
+    with _lock:
+        _history.append(rerun)
+        _totals['reruns'] += 1
+        _totals['seconds'] += rerun['seconds']
+        for name, entry in rerun['sections'].items():
+            total = _totals['sections'].setdefault(name, {'seconds': 0.0, 'alloc bytes': 0, 'parts': {}})
+            total['seconds'] += entry['seconds']
+            total['alloc bytes'] += entry.get('alloc bytes', 0)
+            for part_name, seconds in entry['parts'].items():
+                total['parts'][part_name] = total['parts'].get(part_name, 0.0) + seconds
+        if METRICS_FILE:
+            export(rerun, METRICS_FILE)
+    return rerun
+
+
+# ---------------------------------------------------- #
+# sink
+
+def history(session=None):
+    # the last reruns, newest first; session: only the reruns of this session
+    with _lock:
+        return [r for r in reversed(_history) if session is None or r['session'] == session]
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"')
+
+
+def prometheus_text():
+    lines = ['# HELP urban_butcher_reruns_total Reruns of the app script.',
+             '# TYPE urban_butcher_reruns_total counter',
+             f'urban_butcher_reruns_total {_totals["reruns"]}',
+             '# HELP urban_butcher_rerun_seconds_total Time spent in reruns.',
+             '# TYPE urban_butcher_rerun_seconds_total counter',
+             f'urban_butcher_rerun_seconds_total {_totals["seconds"]:.6f}',
+             '# HELP urban_butcher_section_seconds_total Time per section and part (pandas, altair, validation, other).',
+             '# TYPE urban_butcher_section_seconds_total counter']
+    for name, total in _totals['sections'].items():
+        for part_name, seconds in total['parts'].items():
+            lines.append(f'urban_butcher_section_seconds_total{{section="{_escape(name)}",part="{_escape(part_name)}"}} {seconds:.6f}')
+    if tracemalloc.is_tracing():
+        lines += ['# HELP urban_butcher_section_alloc_bytes_total Memory allocated on top per section (tracemalloc).',
+                  '# TYPE urban_butcher_section_alloc_bytes_total counter']
+        for name, total in _totals['sections'].items():
+            lines.append(f'urban_butcher_section_alloc_bytes_total{{section="{_escape(name)}"}} {total["alloc bytes"]}')
+    return '\n'.join(lines) + '\n'
+
+
+def export(rerun, path):
+    # *.prom: the totals are rewritten (textfile collector), else one json line is appended
+    if path.endswith('.prom'):
+        tmp = path + '.tmp'
+        with open(tmp, 'w') as f:
+            f.write(prometheus_text())
+        os.replace(tmp, path)
+    else:
+        with open(path, 'a') as f:
+            f.write(json.dumps(rerun) + '\n')
+
+
+# ---------------------------------------------------- #
+# debug panel
+
+def debug_panel(session=None, n=10):
+    # breakdown of the last n reruns of this session, in a sidebar expander
+    import pandas as pd
+    import streamlit as st
+
+    reruns = history(session)[:n]
+    with st.sidebar.expander('Debug: Laufzeiten der letzten Reruns'):
+        if not reruns:
+            st.write('Noch keine Messungen.')
+            return
+        st.dataframe(pd.DataFrame(
+            [{'rerun': time.strftime('%H:%M:%S', time.localtime(r['start'])), 'fragment': r.get('fragment', ''),
+              'total ms': r['seconds'] * 1000, 'first paint ms': r.get('first paint', float('nan')) * 1000,
+              **{name: entry['seconds'] * 1000 for name, entry in r['sections'].items()}} for r in reruns]
+        ).set_index('rerun').round(1))
+
+        st.caption('Letzter Rerun nach Anteil (ms)')
+        last = reruns[0]['sections']
+        st.dataframe(pd.DataFrame({name: entry['parts'] for name, entry in last.items()}).T.fillna(0).mul(1000).round(1))
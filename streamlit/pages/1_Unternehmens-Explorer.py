@@ -0,0 +1,72 @@
+# Company explorer: filter the plant-based companies of the GFI database
+#
+# The aggregation behind the page is in explorer.py (cached masks per filter,
+# counts from the bitmap index), so a filter change does not group the table again.
+
+import os
+import uuid
+
+import streamlit as st
+
+import explorer
+import metrics
+import startup
+
+session_id = st.session_state.setdefault('metrics_session', uuid.uuid4().hex[:8])
+metrics.start_rerun(session_id)
+
+# all data sources load in the background, a section only waits for its own (startup.py)
+startup.start()
+
+st.title("Unternehmens-Explorer")
+st.markdown("Alle Unternehmen mit pflanzlichen Alternativprodukten aus der Datenbank des Good Food Institute. Wähle links Kategorie, Fokus, Region und Gründungsjahr.")
+
+# # SIDEBAR
+with metrics.section('Explorer Filter'):
+    st.sidebar.subheader("Filter")
+    category = st.sidebar.multiselect("Kategorie", explorer.options('Protein Category'))
+    focus = st.sidebar.multiselect("Fokus", explorer.options('Company Focus'))
+    region = st.sidebar.multiselect("Region", explorer.options('Operating Regions'))
+    first, last = explorer.year_range()
+    years = st.sidebar.slider("Gründungsjahr", min_value=first, max_value=last, value=(first, last))
+    top_n = st.sidebar.slider("Top N", min_value=5, max_value=25, value=10, step=5)
+
+    # the full year range also keeps the companies without a known year
+    filters = explorer.Filters(tuple(sorted(category)), tuple(sorted(focus)), tuple(sorted(region)),
+                               None if years == (first, last) else years)
+    result = explorer.summary(filters)
+
+st.metric("Unternehmen", result['count'])
+
+if result['count'] == 0:
+    st.info("Keine Unternehmen für diese Filter.")
+else:
+    with metrics.section('Explorer Map'):
+        st.subheader("Unternehmen pro Land")
+        with metrics.part('streamlit'):
+            st.vega_lite_chart(explorer.map_spec(result), use_container_width=True)
+
+    with metrics.section('Explorer Timeline'):
+        st.subheader("Gründungen pro Jahr")
+        with metrics.part('streamlit'):
+            st.vega_lite_chart(explorer.timeline_spec(result), use_container_width=True)
+
+    with metrics.section('Explorer Top N'):
+        st.subheader(f"Top {top_n}")
+        left, middle, right = st.columns(3)
+        left.dataframe(result['countries'].head(top_n), hide_index=True)
+        middle.dataframe(result['products'].head(top_n), hide_index=True)
+        right.dataframe(result['technology'].head(top_n), hide_index=True)
+
+        st.subheader("Zuletzt gegründet")
+        st.dataframe(explorer.companies(result, top_n), hide_index=True)
+
+
+# --------------------------------------------------------------#
+# Debug panel with the timings of the last reruns and the memory (?debug=1 or URBAN_BUTCHER_DEBUG=1)
+
+metrics.finish_rerun()
+if st.query_params.get('debug') == '1' or os.environ.get('URBAN_BUTCHER_DEBUG') == '1':
+    import memory
+    metrics.debug_panel(session_id)
+    memory.panel()
@@ -0,0 +1,169 @@
+# Reference data for the company map (ISO 3166 country codes + world-110m TopoJSON)
+#
+# Both files are vendored into code/reference-data so the app and the
+# presentation render without network access. Run this file once on a machine
+# with internet access to (re)build the store:
+#
+#     python reference_data.py
+#
+# The copies in the repository were built without network access: the ISO
+# table from pycountry 26.2.16 (the ISO 3166-1 list of Debian's iso-codes, in
+# the columns of the file above; the region columns are empty, the app does
+# not use them), world-110m from bqplot 0.13.1 (bqplot/map_data/WorldMap.json,
+# the same world-atlas 110m topology with the object 'subunits' renamed to
+# 'countries'; Kosovo, N. Cyprus and Somaliland have the ids -1..-3 instead of
+# -99). Running the build step replaces them with the downloads.
+#
+# At runtime the files are only read from disk and kept in memory. Without the
+# store the ISO codes are downloaded (timeout URBAN_BUTCHER_REMOTE_TIMEOUT,
+# default 5s); if that fails, the copy of the last successful download is used.
+# URBAN_BUTCHER_OFFLINE=1 skips the download and only uses that copy.
+
+import functools
+import json
+import os
+import sys
+import threading
+import urllib.request
+import warnings
+from pathlib import Path
+
+import pandas as pd
+
+# the country resolver lives in the pipeline package (code/pipeline)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'code'))
+from pipeline import country_resolver
+
+REFERENCE_DATA = Path(__file__).resolve().parent.parent / 'code' / 'reference-data'
+
+# https://en.wikipedia.org/wiki/ISO_3166-1_numeric
+COUNTRY_CODES_URL = 'https://raw.githubusercontent.com/lukes/ISO-3166-Countries-with-Regional-Codes/master/all/all.csv'
+# same file as vega_datasets' data.world_110m.url
+WORLD_110M_URL = 'https://cdn.jsdelivr.net/npm/vega-datasets@v1.29.0/data/world-110m.json'
+
+COUNTRY_CODES_FILE = REFERENCE_DATA / 'iso-3166-countries.csv'
+WORLD_110M_FILE = REFERENCE_DATA / 'world-110m.json'
+
+REMOTE_TIMEOUT = float(os.environ.get('URBAN_BUTCHER_REMOTE_TIMEOUT', '5'))
+OFFLINE = os.environ.get('URBAN_BUTCHER_OFFLINE') == '1'
+# copies of the last successful downloads
+CACHE_DIR = Path(os.environ.get('URBAN_BUTCHER_CACHE') or Path.home() / '.cache' / 'urban-butcher')
+
+_lock = threading.Lock()
+
+
+def _write(target, content):
+    # write to a temp file first, so a failed download never leaves a broken file behind
+    target.parent.mkdir(parents=True, exist_ok=True)
+    tmp = target.with_suffix(target.suffix + '.tmp')
+    tmp.write_bytes(content)
+    tmp.replace(target)
+
+
+# ---------------------------------------------------- #
+# one-time build step
+
+def build():
+    for url, target in [(COUNTRY_CODES_URL, COUNTRY_CODES_FILE), (WORLD_110M_URL, WORLD_110M_FILE)]:
+        with urllib.request.urlopen(url, timeout=30) as response:
+            content = response.read()
+        _write(target, content)
+        print(f'{target.name}: {len(content)} bytes')
+
+    # reset the in-memory cache, otherwise a running process keeps the old version
+    _country_codes.cache_clear()
+    _resolver.cache_clear()
+    load_world_110m.cache_clear()
+
+
+# ---------------------------------------------------- #
+# remote fallback
+
+def _remote(url, name):
+    # path of the downloaded file; the cached copy if the download fails or times out
+    cached = CACHE_DIR / name
+    if OFFLINE:
+        if not cached.exists():
+            raise FileNotFoundError(f'{name} is neither in {REFERENCE_DATA} nor in {CACHE_DIR} (offline)')
+        return cached
+    try:
+        with urllib.request.urlopen(url, timeout=REMOTE_TIMEOUT) as response:
+            content = response.read()
+    except OSError as e:
+        if not cached.exists():
+            raise
+        warnings.warn(f'{url} not reachable ({e}), using the copy from {cached}')
+        return cached
+    _write(cached, content)
+    return cached
+
+
+# ---------------------------------------------------- #
+# in-memory cache
+
+@functools.lru_cache(maxsize=None)
+def _country_codes():
+    # falls back to the remote file only if the store was never built
+    source = COUNTRY_CODES_FILE if COUNTRY_CODES_FILE.exists() else _remote(COUNTRY_CODES_URL, COUNTRY_CODES_FILE.name)
+    # keep_default_na=False: 'NA' is the alpha-2 code of Namibia
+    return pd.read_csv(source, usecols=country_resolver.COLUMNS, keep_default_na=False)
+
+
+def load_country_codes():
+    # loaded once, also if the startup loader and a section ask at the same time
+    with _lock:
+        return _country_codes()
+
+
+@functools.lru_cache(maxsize=None)
+def load_world_110m():
+    # returns the parsed TopoJSON, or None if the store was never built
+    if not WORLD_110M_FILE.exists():
+        return None
+    with open(WORLD_110M_FILE) as f:
+        return json.load(f)
+
+
+def countries():
+    # source for mark_geoshape; inlined, so the browser does not fetch anything
+    import altair as alt
+
+    topology = load_world_110m()
+    if topology is None:
+        return alt.topo_feature(WORLD_110M_URL, 'countries')
+    return alt.InlineData(values=topology, format=alt.DataFormat(type='topojson', feature='countries'))
+
+
+# ---------------------------------------------------- #
+# precomputed join: country name -> ISO numeric -> number of companies
+
+@functools.lru_cache(maxsize=None)
+def _resolver():
+    # under _lock (resolver()), so the ISO table is read with _country_codes directly
+    return country_resolver.build(_country_codes(), country_resolver.read_aliases())
+
+
+def resolver():
+    # country names -> ISO codes (code/pipeline/country_resolver.py), built once
+    with _lock:
+        return _resolver()
+
+
+def company_counts_by_code(df_country):
+    # done once in pandas instead of two chained transform_lookups in the browser;
+    # the names are resolved to ISO codes (aliases like 'Mainland China', regions
+    # like 'Scotland' are summed up per country). Only resolved countries are kept,
+    # the map does not draw (or show a tooltip for) countries without a count anyway
+    codes = country_resolver.resolve(resolver(), df_country['name'])
+    missed = codes['country-code'].isna()
+    if missed.any():
+        warnings.warn('no ISO code for ' + ', '.join(map(repr, df_country['name'][missed].unique()))
+                      + f' (add them to {country_resolver.ALIASES.name})')
+    df = pd.DataFrame({'id': codes['country-code'], 'name': codes['name'],
+                       'Number of Companies per Country': df_country['Number of Companies per Country']})[~missed]
+    df = df.groupby(['id', 'name'], sort=False, as_index=False)['Number of Companies per Country'].sum()
+    return df.astype({'id': int})
+
+
+if __name__ == '__main__':
+    build()
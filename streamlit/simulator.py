@@ -0,0 +1,279 @@
+# Monte Carlo simulator: weekly GHG, land use and freshwater withdrawals of a shop assortment
+#
+# Poore & Nemecek give the 5th, 10th, 50th, 90th and 95th percentile of every
+# product over the producers of the world (environmental-impact-distribution.csv).
+# The simulator fits a distribution to them and draws DRAWS possible weeks of
+# an assortment (kg per product and week):
+#
+#   - fit: an inverse CDF through the percentiles that also has the mean of
+#     the sheet. The percentiles alone say little about where the mass is: the
+#     water use of peas is 0 l up to the median and 3100 l at the 90th
+#     percentile (rain-fed or irrigated), the mean of 397 l says that only a
+#     few producers are close to the 90th. Between two percentiles the values
+#     follow a power curve t^k (k=1: linear), with one k per product and
+#     category such that the mean is met; the outer segments are extended to 0
+#     and 1. If even k=1 gives a smaller mean (the mass is above the 95th
+#     percentile, e.g. water of dark chocolate), the top segment is raised.
+#     A lognormal through the percentiles missed the mean by up to 10x here.
+#   - bank: the inverse CDF of every fit at LEVELS equally likely levels, built
+#     once per content hash of the data. A draw of a product is a random level,
+#     an index into the bank; GHG, land and water use of a product share the
+#     index (a producer with high emissions tends to use more land, too).
+#   - a week is the sum of kg x bank value over the products, computed in
+#     batches of BATCH draws (float32), so a million draws need a few MB.
+#
+# Only the summary and a histogram are kept, cached per mix (MAX_RESULTS).
+# submit() runs a simulation in a background thread; the app waits at most
+# BUDGET seconds for it and otherwise polls until it is done (urban-butcher.py).
+#
+#     python simulator.py      # fit per product and time per simulation
+
+import functools
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import numpy as np
+import pandas as pd
+
+import chart_cache
+import data_loader
+
+DRAWS = int(os.environ.get('URBAN_BUTCHER_DRAWS', '1000000'))
+BATCH = 1 << 18
+LEVELS = 4096
+BINS = 60
+MAX_RESULTS = 64
+
+# seconds a rerun waits for a simulation before it shows the old result
+BUDGET = 0.08
+
+# steepest power curve between two percentiles (if even that gives a larger mean)
+K_MAX = 100
+
+PERCENTILES = {'5th pctl': 0.05, '10th pctl': 0.10, 'Median': 0.50, '90th pctl': 0.90, '95th pctl': 0.95}
+
+# the default assortment of the app (kg per week)
+DEFAULT_MIX = {'Bovine Meat (beef herd)': 40, 'Pig Meat': 60, 'Poultry Meat': 50, 'Cheese': 20,
+               'Tofu': 10, 'Peas': 10}
+
+_lock = threading.Lock()
+_results = OrderedDict()     # (content hash, mix, draws) -> future of the result
+_pool = None
+
+
+def current():
+    return data_loader.content_hash('distribution')
+
+
+def products():
+    # product -> 'Animal Products' / 'Plants', in the order of the sheet
+    df = data_loader.load_distribution()
+    return dict(zip(df['Product'].astype(str), df['Product Type'].astype(str)))
+
+
+# ---------------------------------------------------- #
+# fitted distributions
+
+def inverse_cdf(percentiles, mean, levels):
+    # (values at `levels`, k) for the percentiles in PERCENTILES order and the mean
+    percentiles = np.maximum.accumulate(np.asarray(percentiles, dtype=float))
+    probabilities = np.array(list(PERCENTILES.values()))
+
+    # the outer segments extended to p=0 and p=1, no negative land or water use
+    low = percentiles[0] - (percentiles[1] - percentiles[0]) * probabilities[0] / (probabilities[1] - probabilities[0])
+    if percentiles[0] >= 0:
+        low = max(low, 0)
+    high = percentiles[-1] + (percentiles[-1] - percentiles[-2]) * (1 - probabilities[-1]) / (probabilities[-1] - probabilities[-2])
+    knots = np.concatenate([[0], probabilities, [1]])
+    values = np.concatenate([[low], percentiles, [high]])
+
+    # mean of the curve = first + rise / (k + 1), per segment weighted by its probability
+    weights = np.diff(knots)
+    first = weights @ values[:-1]
+    rise = weights @ np.diff(values)
+    if rise <= 0 or not np.isfinite(mean):
+        k = 1.0
+    elif mean >= first + rise / 2:
+        # more mass than the straight lines hold: the top segment carries the rest
+        k = 1.0
+        values[-1] = 2 * (mean - first - rise / 2) / weights[-1] + values[-1]
+    else:
+        k = min(rise / max(mean - first, 0) - 1 if mean > first else K_MAX, K_MAX)
+
+    segment = np.clip(np.searchsorted(knots, levels, side='right') - 1, 0, len(weights) - 1)
+    t = (levels - knots[segment]) / weights[segment]
+    return values[segment] + (values[segment + 1] - values[segment]) * t ** k, k
+
+
+@functools.lru_cache(maxsize=2)
+def _bank(content_hash):
+    df = data_loader.load_distribution()
+    names = list(dict.fromkeys(df['Product'].astype(str)))
+    categories = list(dict.fromkeys(df['Impact Category'].astype(str)))
+    levels = (np.arange(LEVELS) + 0.5) / LEVELS
+
+    values = np.zeros((len(names), len(categories), LEVELS), dtype=np.float32)
+    fits = []
+    rows = zip(df['Product'].astype(str), df['Impact Category'].astype(str), df[list(PERCENTILES)].to_numpy(),
+               df['Mean'])
+    for product, category, percentiles, mean in rows:
+        i, j = names.index(product), categories.index(category)
+        values[i, j], k = inverse_cdf(percentiles, mean, levels)
+        fits.append({'Product': product, 'Impact Category': category, 'k': k,
+                     'Mean': mean, 'fitted mean': float(values[i, j].mean())})
+
+    values.setflags(write=False)
+    units = dict(zip(df['Impact Category'].astype(str), df['Unit'].astype(str)))
+    return {'products': names, 'categories': categories, 'units': units, 'values': values,
+            'fits': pd.DataFrame(fits)}
+
+
+# ---------------------------------------------------- #
+# simulation
+
+def simulate(mix, draws=DRAWS, seed=0):
+    # mix: ((product, kg per week), ...); returns {'summary': ..., 'histogram': ..., 'seconds': ...}
+    start = time.perf_counter()
+    bank = _bank(current())
+    rng = np.random.default_rng(seed)
+    # the bank of every product times its kg: a draw is a lookup and an addition
+    scaled = [bank['values'][bank['products'].index(product)] * np.float32(kg) for product, kg in mix if kg > 0]
+
+    totals = np.zeros((len(bank['categories']), draws), dtype=np.float32)
+    for first in range(0, draws, BATCH):
+        week = totals[:, first:first + BATCH]
+        for values in scaled:
+            levels = rng.integers(0, LEVELS, size=week.shape[1], dtype=np.uint16)
+            for category, category_values in enumerate(values):
+                week[category] += category_values[levels]
+
+    summary, histogram = [], []
+    for category, values in zip(bank['categories'], totals):
+        p5, median, p95, low, high = np.percentile(values, [5, 50, 95, 0.5, 99.5])
+        summary.append({'Impact Category': category, 'Unit': bank['units'][category], 'Mean': float(values.mean()),
+                        '5th pctl': p5, 'Median': median, '95th pctl': p95})
+        # the histogram without the outermost 1%, the tails would squeeze it
+        counts, edges = np.histogram(values, bins=BINS, range=(low, high))
+        histogram.append(pd.DataFrame({'Impact Category': category, 'start': edges[:-1], 'end': edges[1:],
+                                       'share': counts / draws}))
+    return {'summary': pd.DataFrame(summary), 'histogram': pd.concat(histogram, ignore_index=True),
+            'draws': draws, 'seconds': time.perf_counter() - start}
+
+
+def half_vegan(mix):
+    # half of the animal products (kg) replaced by the plant products of the mix,
+    # in proportion to their kg (by tofu if the mix has none)
+    types = products()
+    animal = sum(kg for product, kg in mix if types[product] == 'Animal Products')
+    plants = {product: kg for product, kg in mix if types[product] == 'Plants' and kg > 0} or {'Tofu': 1}
+    total = sum(plants.values())
+    result = {product: kg / 2 if types[product] == 'Animal Products' else kg for product, kg in mix}
+    for product, kg in plants.items():
+        result[product] = result.get(product, 0) + animal / 2 * kg / total
+    return tuple(sorted(result.items()))
+
+
+def submit(mix, draws=DRAWS):
+    # future of the result, one simulation per mix in a background thread
+    global _pool
+    key = (current(), tuple(sorted(mix)), draws)
+    with _lock:
+        if key in _results:
+            _results.move_to_end(key)
+            return _results[key]
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='simulator')
+        future = _results[key] = _pool.submit(simulate, key[1], draws)
+        while len(_results) > MAX_RESULTS:
+            _results.popitem(last=False)
+        return future
+
+
+def results(mixes, timeout=BUDGET, draws=DRAWS):
+    # the results of the mixes, None if one of them is not done after `timeout` seconds
+    futures = [submit(mix, draws) for mix in mixes]
+    _, pending = wait(futures, timeout)
+    if pending:
+        return None
+    return [future.result() for future in futures]
+
+
+# ---------------------------------------------------- #
+# chart: validated once, the histograms are put in per rerun
+
+DATA = 'simulation'
+
+
+@functools.lru_cache(maxsize=None)
+def _template(categories):
+    import altair as alt
+    from chart_library import blue_highlight, dark_red
+
+    chart = alt.Chart(alt.NamedData(name=DATA)).mark_rect(opacity=0.6).encode(
+        x=alt.X('start:Q', title=None).axis(grid=False, format='~s'),
+        x2='end:Q',
+        y=alt.Y('share:Q', title='Anteil der Wochen', stack=None).axis(format='%', grid=False),
+        color=alt.Color('Sortiment:N', scale=alt.Scale(range=[dark_red, blue_highlight]),
+                        legend=alt.Legend(orient='top', title=None)),
+    ).properties(
+        width=220,
+        height=180
+    ).facet(
+        column=alt.Column('Impact Category:N', sort=list(categories), title=None),
+    ).resolve_scale(
+        x='independent',
+        y='independent'
+    )
+    return chart_cache.to_spec(chart)
+
+
+def spec(scenarios):
+    # histograms of the scenarios, {name: result of simulate()}, one chart per category
+    histogram = pd.concat([result['histogram'].assign(Sortiment=name) for name, result in scenarios.items()],
+                          ignore_index=True)
+    return chart_cache.with_data(_template(tuple(histogram['Impact Category'].unique())), DATA, histogram)
+
+
+def summary(scenarios):
+    # median and 90% range of every scenario per category
+    def german(values):
+        return values.map(lambda value: f'{value:,.0f}'.replace(',', '.'))
+
+    columns = {}
+    for name, result in scenarios.items():
+        df = result['summary'].set_index('Impact Category')
+        columns[('Einheit', '')] = df['Unit']
+        columns[(name, 'Median')] = df['Median']
+        columns[(name, '5.–95. Perzentil')] = german(df['5th pctl']) + ' – ' + german(df['95th pctl'])
+    return pd.DataFrame(columns)
+
+
+def clear_cache():
+    with _lock:
+        _results.clear()
+    _bank.cache_clear()
+
+
+# ---------------------------------------------------- #
+# fit and time per simulation
+
+def report():
+    fits = _bank(current())['fits']
+    print('power k of the fits per category:')
+    print(fits.groupby('Impact Category', sort=False)['k'].describe()[['min', '50%', 'max']].round(2).to_string(), '\n')
+    print('mean of the fit / mean of the sheet per category:')
+    ratio = (fits['fitted mean'] / fits['Mean']).groupby(fits['Impact Category'], sort=False)
+    print(ratio.agg(['min', 'median', 'max']).round(3).to_string(), '\n')
+
+    mix = tuple(DEFAULT_MIX.items())
+    for name, assortment in [('default mix', mix), ('half vegan', half_vegan(mix))]:
+        simulated = simulate(assortment)
+        print(f"{name}: {simulated['draws']:,} draws in {simulated['seconds'] * 1000:.0f} ms")
+        print(simulated['summary'].round(1).to_string(index=False), '\n')
+
+
+if __name__ == '__main__':
+    report()
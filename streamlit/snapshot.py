@@ -0,0 +1,74 @@
+# Startup snapshot: the prepared frames and the specs of all app chart states in one file
+#
+# A fresh process (e.g. a new replica) reads and prepares every csv and reads
+# or builds every chart spec before it can show a chart. The snapshot has all
+# of it, written once at build time after export.py:
+#
+#     python snapshot.py      # writes exports/snapshot.pickle
+#
+# startup.start() restores it into data_loader and chart_cache. Nothing in it is
+# trusted blindly: the frames are still checked against the files (mtime/size,
+# else content hash), the specs are keyed by the content hash of their data,
+# and the whole snapshot is ignored if the chart code, the Altair version or
+# the preparation of the frames (data_loader.py) changed. URBAN_BUTCHER_SNAPSHOT=0
+# to skip it.
+#
+# The file is a pickle: only load snapshots you built yourself.
+
+import hashlib
+import os
+import pickle
+import time
+import warnings
+from pathlib import Path
+
+import chart_cache
+import data_loader
+
+SNAPSHOT = chart_cache.EXPORTS / 'snapshot.pickle'
+ENABLED = os.environ.get('URBAN_BUTCHER_SNAPSHOT', '1') != '0'
+
+
+def fingerprint():
+    # the chart code (chart_cache.code_fingerprint) and how the frames are prepared
+    sha = hashlib.sha256(chart_cache.code_fingerprint().encode())
+    sha.update(Path(data_loader.__file__).read_bytes())
+    return sha.hexdigest()
+
+
+def write(path=SNAPSHOT):
+    snapshot = {
+        'fingerprint': fingerprint(),
+        'frames': data_loader.cache_entries(),
+        'specs': chart_cache.cache_entries(),
+    }
+    tmp = path.with_suffix('.tmp')
+    with open(tmp, 'wb') as f:
+        pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+    tmp.replace(path)
+    return snapshot
+
+
+def load(path=SNAPSHOT):
+    # True if the snapshot was restored
+    if not ENABLED or not path.exists():
+        return False
+    try:
+        with open(path, 'rb') as f:
+            snapshot = pickle.load(f)
+    except Exception as e:
+        # e.g. written with another pandas version
+        warnings.warn(f'{path.name} not loaded ({e}), starting without it')
+        return False
+    if snapshot['fingerprint'] != fingerprint():
+        return False
+    data_loader.restore(snapshot['frames'])
+    chart_cache.restore(snapshot['specs'])
+    return True
+
+
+if __name__ == '__main__':
+    start = time.perf_counter()
+    snapshot = write()
+    print(f'{SNAPSHOT.name}: {len(snapshot["frames"])} frames, {len(snapshot["specs"])} chart states,'
+          f' {SNAPSHOT.stat().st_size / 1024:.0f} kB in {time.perf_counter() - start:.2f}s')
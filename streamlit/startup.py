@@ -0,0 +1,132 @@
+# Parallel loading of the data sources at startup
+#
+# A cold start used to read the frames one after the other, and the ISO code
+# table (downloaded if code/reference-data was never built) blocked everything
+# behind it. start() submits every source to a thread pool at once and returns
+# the futures. The download is submitted first, so it never waits behind the
+# local files; pandas parses csv and feather files mostly without the GIL, so
+# with enough cores the reads overlap too. A cold start takes about as long as
+# the slowest source instead of the sum of all of them (on one core: the
+# slower of the download and the local files together).
+#
+# The sections do not wait for the whole startup: before a section is drawn,
+# urban-butcher.py waits (wait(name), at most TIMEOUT seconds) for the futures
+# of the sources it shows (SECTION_SOURCES), so a failed or hanging load shows
+# up there and not somewhere inside a chart. The futures are only submitted
+# once per process; a source whose load failed is loaded again in the next wait.
+#
+# If there is a startup snapshot (snapshot.py), it is restored first; the loads
+# then only check the files and find the frames in the cache.
+#
+#     python startup.py      # cold start, sequential vs. parallel
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import data_loader
+import geometry
+import reference_data
+import snapshot
+
+# source name -> loader, the (possibly remote) reference data of the map first
+SOURCES = {
+    'country codes': reference_data.load_country_codes,
+    'world-110m': reference_data.load_world_110m,
+    'map geometry': geometry.load,
+    **data_loader.LOADERS,
+}
+
+# one thread per core for the local files, one more for the download;
+# more threads would only take turns on the GIL
+WORKERS = min(len(SOURCES), (os.cpu_count() or 1) + 1)
+
+# seconds a section waits for a source before it gives up (the remote download
+# has its own, shorter timeout and falls back to the cached copy)
+TIMEOUT = 60
+
+_lock = threading.Lock()
+_futures = {}
+_seconds = {}      # source name -> load time in the pool
+
+
+def _timed(name, loader):
+    start = time.perf_counter()
+    try:
+        return loader()
+    finally:
+        _seconds[name] = time.perf_counter() - start
+
+
+def start():
+    # submits all sources once per process, later calls return the same futures
+    with _lock:
+        if not _futures:
+            snapshot.load()
+            pool = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix='startup')
+            for name, loader in SOURCES.items():
+                _futures[name] = pool.submit(_timed, name, loader)
+            # the threads exit when the loads are done
+            pool.shutdown(wait=False)
+        return dict(_futures)
+
+
+def wait(name, timeout=TIMEOUT):
+    # the loaded source; raises the error of the load, or TimeoutError. A load
+    # that failed in the pool is done again by the caller (the loaders cache
+    # their result), so a section recovers once the file can be read again
+    future = start()[name]
+    if future.done() and future.exception() is not None:
+        return SOURCES[name]()
+    return future.result(timeout)
+
+
+def timings():
+    # source name -> seconds, of the loads that are done
+    return dict(_seconds)
+
+
+def reset():
+    with _lock:
+        _futures.clear()
+        _seconds.clear()
+
+
+# ---------------------------------------------------- #
+# cold start, sequential vs. parallel
+
+def _cold(load):
+    data_loader.clear_cache()
+    reference_data._country_codes.cache_clear()
+    reference_data.load_world_110m.cache_clear()
+    geometry._load.cache_clear()
+    start_time = time.perf_counter()
+    load()
+    return time.perf_counter() - start_time
+
+
+def _parallel():
+    reset()
+    for future in start().values():
+        future.result(TIMEOUT)
+
+
+def report():
+    enabled, snapshot.ENABLED = snapshot.ENABLED, False
+    try:
+        sequential = _cold(lambda: [loader() for loader in SOURCES.values()])
+        seconds = _cold(_parallel)
+    finally:
+        snapshot.ENABLED = enabled
+
+    for name, source_seconds in sorted(timings().items(), key=lambda item: -item[1]):
+        print(f'{name:<14} {source_seconds * 1000:8.1f} ms')
+    print(f'sequential {sequential * 1000:.1f} ms, parallel {seconds * 1000:.1f} ms'
+          f' (slowest source {max(timings().values()) * 1000:.1f} ms)')
+    if snapshot.ENABLED and snapshot.SNAPSHOT.exists():
+        print(f'parallel with {snapshot.SNAPSHOT.name} {_cold(_parallel) * 1000:.1f} ms')
+
+
+if __name__ == '__main__':
+    report()